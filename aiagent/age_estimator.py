@@ -0,0 +1,180 @@
+# aiagent/age_estimator.py
+# 学歴の卒業年から年齢と年齢スコアをローカルで算出（v2評価基準の年齢評価と同じ計算）
+
+import os
+import re
+import sys
+
+# ==============================
+# 設定
+# ==============================
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
+INPUT_FILE = os.path.join(DATA_DIR, "profile_details.csv")
+
+MAX_AGE = int(os.getenv("MAX_AGE", 40))
+GRADUATION_AGE = 22  # 大学卒業時の年齢（評価基準と同じ仮定）
+AGE_BASE_YEAR = int(os.getenv("AGE_BASE_YEAR", 2025))  # 年齢計算の基準年（評価基準の計算式にも同じ値を使う）
+
+# 年齢帯 → 年齢スコア（評価基準「1. 年齢評価」）
+AGE_SCORE_BANDS = [
+    (25, 30, 25),
+    (31, 35, 20),
+    (36, 40, 15),
+]
+
+# 学歴1行は「学校名 - 学位 (期間)」。期間は「2012年 - 2016年」「2012 – 2016」「2012年4月 - 2016年3月」
+# 「Apr 2012 - Mar 2016」「2016」などで表示されるため、期間部分の最後の西暦を卒業年とする
+# 「2012年 - 現在」「2012 - Present」のように終了していない学歴は卒業年なしとする
+DATE_PART_PATTERN = r"\(([^()]*)\)\s*$"
+LAST_YEAR_PATTERN = r".*((?:19|20)\d{2})"
+OPEN_END_PATTERN = r"(?:現在|在学中|[Pp]resent|[Cc]urrent)\s*$"
+HIGH_SCHOOL_PATTERN = r"高校|高等学校|[Hh]igh [Ss]chool"
+
+DATE_PART = re.compile(DATE_PART_PATTERN)
+LAST_YEAR = re.compile(LAST_YEAR_PATTERN)
+OPEN_END = re.compile(OPEN_END_PATTERN)
+HIGH_SCHOOL = re.compile(HIGH_SCHOOL_PATTERN)
+
+# ==============================
+# 1件ずつの算出
+# ==============================
+def _end_year(line):
+    """学歴1行から終了年を取り出す（なければ、または在学中ならNone）"""
+    match = DATE_PART.search(line)
+    date_part = match.group(1) if match else line
+    if OPEN_END.search(date_part):
+        return None
+    year = LAST_YEAR.match(date_part)
+    return int(year.group(1)) if year else None
+
+
+def extract_graduation_year(education):
+    """
+    学歴文字列から大学の卒業年を推定
+
+    高校を除いた学歴の終了年のうち最も早いものを使う
+    （大学院の修了年ではなく学部の卒業年を拾うため）。
+
+    Args:
+        education: get_profile_details が出力する改行区切りの学歴文字列
+
+    Returns:
+        int or None: 卒業年
+    """
+    years = []
+    for line in str(education or "").splitlines():
+        if not line.strip() or HIGH_SCHOOL.search(line):
+            continue
+        year = _end_year(line)
+        if year is not None:
+            years.append(year)
+    return min(years) if years else None
+
+
+def age_score(age):
+    """年齢から年齢スコアを返す（41歳以上は0、25歳未満など評価基準外はNone）"""
+    if age is None:
+        return None
+    if age > MAX_AGE:
+        return 0
+    for low, high, score in AGE_SCORE_BANDS:
+        if low <= age <= high:
+            return score
+    return None
+
+
+def estimate_age(education, base_year=None):
+    """学歴から推定年齢を返す（卒業年が分からなければNone）"""
+    return age_facts(education, base_year)["estimated_age"]
+
+
+def age_facts(education, base_year=None):
+    """
+    年齢評価に必要な値をまとめて算出
+
+    Returns:
+        dict: graduation_year, estimated_age, age_score, excluded（41歳以上か）
+    """
+    graduation_year = extract_graduation_year(education)
+    age = None
+    if graduation_year is not None:
+        age = (base_year or AGE_BASE_YEAR) - graduation_year + GRADUATION_AGE
+    return {
+        "graduation_year": graduation_year,
+        "estimated_age": age,
+        "age_score": age_score(age),
+        "excluded": age is not None and age > MAX_AGE
+    }
+
+# ==============================
+# DataFrame一括算出（大量データ向け）
+# ==============================
+def estimate_ages_frame(df, education_column="education", base_year=None):
+    """
+    DataFrameの全行について卒業年・推定年齢・年齢スコアをまとめて算出
+
+    行ごとのPythonループを使わず、pandasの文字列演算とgroupbyで処理する。
+    結果は extract_graduation_year / age_score と一致する。
+
+    Args:
+        df: 学歴列を持つ pandas.DataFrame
+        education_column: 学歴の列名
+        base_year: 年齢計算の基準年
+
+    Returns:
+        pandas.DataFrame: graduation_year, estimated_age, age_score 列を追加したコピー
+    """
+    import numpy as np
+    import pandas as pd
+
+    base_year = base_year or AGE_BASE_YEAR
+    education = df[education_column].fillna("").astype(str).reset_index(drop=True)
+
+    # 学歴を1行ずつに展開（元の行番号をindexに保持）
+    lines = education.str.split("\n").explode()
+    lines = lines[(lines.str.strip() != "") & ~lines.str.contains(HIGH_SCHOOL_PATTERN, regex=True)]
+
+    date_part = lines.str.extract(DATE_PART_PATTERN, expand=False).fillna(lines)
+    end_year = pd.to_numeric(date_part.str.extract(LAST_YEAR_PATTERN, expand=False), errors="coerce")
+    end_year = end_year.mask(date_part.str.contains(OPEN_END_PATTERN, regex=True))
+
+    graduation_year = end_year.groupby(level=0).min().reindex(range(len(education)))
+    age = base_year - graduation_year + GRADUATION_AGE
+
+    score = np.select(
+        [age > MAX_AGE] + [(age >= low) & (age <= high) for low, high, _ in AGE_SCORE_BANDS],
+        [0] + [score for _, _, score in AGE_SCORE_BANDS],
+        default=np.nan
+    )
+
+    result = df.copy()
+    result["graduation_year"] = graduation_year.astype("Int64").to_numpy()
+    result["estimated_age"] = age.astype("Int64").to_numpy()
+    result["age_score"] = pd.array(np.where(age.isna(), np.nan, score), dtype="Int64")
+    return result
+
+# ==============================
+# エントリポイント（プロフィールCSVの年齢分布を確認）
+# ==============================
+if __name__ == "__main__":
+    import pandas as pd
+
+    input_file = sys.argv[1] if len(sys.argv) > 1 else INPUT_FILE
+    if not os.path.exists(input_file):
+        print(f"❌ エラー: プロフィール詳細ファイルが見つかりません: {input_file}")
+        sys.exit(1)
+
+    frame = estimate_ages_frame(pd.read_csv(input_file, dtype=str))
+    total = len(frame)
+    known = frame["estimated_age"].notna().sum()
+    excluded = (frame["estimated_age"] > MAX_AGE).sum()
+
+    print(f"\n{'='*70}")
+    print(f"🎂 年齢推定（基準年: {AGE_BASE_YEAR}年）")
+    print(f"{'='*70}")
+    print(f"候補者数: {total} 件")
+    print(f"年齢推定できた件数: {known} 件")
+    print(f"❌ {MAX_AGE + 1}歳以上（API不要で除外）: {excluded} 件")
+    print(f"{'='*70}")
+    print(frame["age_score"].value_counts(dropna=False).sort_index().to_string())
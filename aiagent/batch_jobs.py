@@ -0,0 +1,141 @@
+# aiagent/batch_jobs.py
+# OpenAI Batch API の共通処理（リクエストファイル作成・投入・ポーリング・結果取得・ジョブ状態の保存）
+
+import os
+import json
+import time
+from datetime import datetime
+
+# ==============================
+# 設定
+# ==============================
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_POLL_INTERVAL = int(os.getenv("BATCH_POLL_INTERVAL", 60))  # ポーリング間隔（秒）
+
+# これ以上状態が変わらないステータス
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+# ==============================
+# ジョブ状態（再開用にディスクへ保存）
+# ==============================
+def load_job(state_file):
+    """保存済みのジョブ状態を読み込む（なければNone）"""
+    if not os.path.exists(state_file):
+        return None
+    with open(state_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_job(state_file, state):
+    """ジョブ状態を保存（書き込み途中で落ちても壊れないよう置き換えで保存）"""
+    os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    tmp_file = state_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, state_file)
+
+
+def archive_job(state_file):
+    """結果を取り込んだジョブ状態を退避（次のジョブを投入できるようにする）"""
+    if os.path.exists(state_file):
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        os.replace(state_file, f"{state_file}.{stamp}.done")
+
+# ==============================
+# 投入
+# ==============================
+def write_requests(path, requests):
+    """
+    Batch API 用のJSONLファイルを作成
+
+    Args:
+        path: 出力先
+        requests: (custom_id, body) のイテラブル
+
+    Returns:
+        int: 書き込んだリクエスト数
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for custom_id, body in requests:
+            f.write(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": body
+            }, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def submit(client, path, metadata=None):
+    """JSONLファイルをアップロードしてバッチを作成"""
+    with open(path, "rb") as f:
+        input_file = client.files.create(file=f, purpose="batch")
+    return client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=BATCH_COMPLETION_WINDOW,
+        metadata=metadata
+    )
+
+# ==============================
+# ポーリング
+# ==============================
+def describe(batch):
+    """バッチの状態を1行で表示用に整形"""
+    counts = getattr(batch, "request_counts", None)
+    progress = ""
+    if counts is not None:
+        progress = f"（完了 {counts.completed} / 失敗 {counts.failed} / 全 {counts.total}）"
+    return f"{batch.id}: {batch.status}{progress}"
+
+
+def poll(client, batch_id, interval=BATCH_POLL_INTERVAL, timeout=None):
+    """
+    バッチが終了状態になるまで待機
+
+    Args:
+        client: OpenAIクライアント
+        batch_id: バッチID
+        interval: ポーリング間隔（秒）
+        timeout: 最大待機時間（秒、Noneなら無制限）
+
+    Returns:
+        Batch: 最後に取得したバッチ（timeout時は終了状態でない場合がある）
+    """
+    started = time.monotonic()
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        print(f"   ⏳ {describe(batch)}")
+        if batch.status in TERMINAL_STATUSES:
+            return batch
+        if timeout is not None and time.monotonic() - started + interval > timeout:
+            return batch
+        time.sleep(interval)
+
+# ==============================
+# 結果取得
+# ==============================
+def iter_results(client, batch):
+    """
+    完了したバッチの結果を読み出す
+
+    Yields:
+        tuple: (custom_id, レスポンスbody または None, エラー内容 または None)
+    """
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        content = client.files.content(file_id).text
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                yield record["custom_id"], None, record.get("error") or response.get("body")
+            else:
+                yield record["custom_id"], response.get("body"), None
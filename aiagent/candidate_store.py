@@ -0,0 +1,468 @@
+# aiagent/candidate_store.py
+# 候補者データの一元管理（SQLite・WALモード）。各工程が逐次upsertし、従来のCSVはエクスポートで出力する
+
+import os
+import sys
+import csv
+import sqlite3
+import threading
+from datetime import datetime
+
+# aiagent をモジュールとして読み込めるようにする
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aiagent.profile_identity import canonical_profile_url, identity_index, url_for
+from aiagent.snapshots import snapshot_writer
+
+# ==============================
+# 設定
+# ==============================
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
+STORE_FILE = os.path.join(DATA_DIR, "candidates.sqlite3")
+
+os.makedirs(DATA_DIR, exist_ok=True)
+
+CANDIDATE_STORE_ENABLED = os.getenv("CANDIDATE_STORE", "on").lower() not in ("off", "0", "false", "no")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS candidates (
+    profile_url TEXT PRIMARY KEY,
+    name TEXT,
+    headline TEXT,
+    company TEXT,
+    location TEXT,
+    connected_date TEXT,
+    searched_at TEXT,
+    connected_at TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_candidates_searched ON candidates (searched_at);
+CREATE INDEX IF NOT EXISTS idx_candidates_connected ON candidates (connected_date);
+
+CREATE TABLE IF NOT EXISTS profiles (
+    profile_url TEXT PRIMARY KEY,
+    name TEXT,
+    headline TEXT,
+    location TEXT,
+    is_premium INTEGER,
+    experiences TEXT,
+    education TEXT,
+    skills TEXT,
+    fetched_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS scores (
+    profile_url TEXT NOT NULL,
+    name TEXT,
+    scorer TEXT NOT NULL,
+    estimated_age INTEGER,
+    age_reasoning TEXT,
+    age_score INTEGER,
+    it_experience_score INTEGER,
+    position_score INTEGER,
+    total_score INTEGER,
+    decision TEXT,
+    reason TEXT,
+    fingerprint TEXT,
+    scored_at TEXT NOT NULL,
+    PRIMARY KEY (profile_url, scorer)
+);
+CREATE INDEX IF NOT EXISTS idx_scores_decision ON scores (scorer, decision, total_score DESC);
+
+CREATE TABLE IF NOT EXISTS connection_requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    profile_url TEXT,
+    name TEXT,
+    result TEXT NOT NULL,
+    error TEXT,
+    details TEXT,
+    requested_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_connection_requests_url ON connection_requests (profile_url, result);
+CREATE INDEX IF NOT EXISTS idx_connection_requests_name ON connection_requests (name, result);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    profile_url TEXT,
+    name TEXT,
+    result TEXT NOT NULL,
+    error TEXT,
+    details TEXT,
+    sent_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_url ON messages (profile_url, result);
+
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# 後方互換のCSVエクスポート（ファイル名 → SQL）。列名は従来のCSVと同じ
+EXPORTS = {
+    "candidates_raw.csv": """
+        SELECT name, profile_url AS url, headline, company, location
+        FROM candidates WHERE searched_at IS NOT NULL ORDER BY searched_at, rowid""",
+    "new_connections.csv": """
+        SELECT name, profile_url, connected_date AS connection_date
+        FROM candidates WHERE connected_at IS NOT NULL ORDER BY connected_at, rowid""",
+    "profile_details.csv": """
+        SELECT name, profile_url, headline, location,
+               CASE is_premium WHEN 1 THEN 'True' ELSE 'False' END AS is_premium,
+               experiences, education, skills
+        FROM profiles ORDER BY fetched_at, rowid""",
+    "candidates_scored_v2.csv": """
+        SELECT s.name, s.profile_url, p.headline, p.location, s.estimated_age, s.age_reasoning,
+               s.age_score, s.it_experience_score, s.position_score, s.total_score,
+               s.decision, s.reason, s.fingerprint
+        FROM scores s LEFT JOIN profiles p ON p.profile_url = s.profile_url
+        WHERE s.scorer = 'v2' ORDER BY s.scored_at, s.rowid""",
+    "messages_v2.csv": """
+        SELECT name, profile_url, total_score
+        FROM scores WHERE scorer = 'v2' AND decision = 'send' ORDER BY total_score DESC, scored_at""",
+    "candidates_scored.csv": """
+        SELECT s.name, s.profile_url AS url, c.headline, c.company, c.location, s.estimated_age,
+               s.age_reasoning, s.total_score AS score, s.decision, s.reason
+        FROM scores s LEFT JOIN candidates c ON c.profile_url = s.profile_url
+        WHERE s.scorer = 'v1' ORDER BY s.scored_at, s.rowid""",
+    "connection_logs.csv": """
+        SELECT requested_at AS date, name, profile_url, result, error, details
+        FROM connection_requests ORDER BY id""",
+    "message_logs.csv": """
+        SELECT sent_at AS date, name, profile_url, result, error, details
+        FROM messages ORDER BY id""",
+}
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _url(value):
+    """プロフィールURLを正規化（同一人物の別の表記を同じ行にまとめる）"""
+    return canonical_profile_url(value) if value else None
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+# ==============================
+# ストア本体
+# ==============================
+class CandidateStore:
+    """
+    候補者・プロフィール・スコア・つながり申請・メッセージを保持するSQLiteストア
+
+    - WALモードのため、スコアリング中でもダッシュボード等から読み込める
+    - 各工程は1件ごとにupsertする（ファイル全体を書き直さない）
+    - 「送信済みか」などの確認はインデックス検索で行う
+    - profile_url は別名表で正規化したURLで保存・検索する（検索結果・つながり・プロフィール・ログを同じキーで結合できる）
+    - 別名表で正規IDがまとめられたら、旧IDのURLで保存済みの行を新しいURLに付け替える（起動時と統合時）
+    - 書き込んだ行は分析用のParquetスナップショット（snapshots.py）にも追記する
+    """
+
+    def __init__(self, path=STORE_FILE, enabled=CANDIDATE_STORE_ENABLED):
+        self.path = path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if self.enabled:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._migrate_scores()
+            self._conn.commit()
+            row = self._conn.execute("SELECT value FROM store_meta WHERE key = 'merge_cursor'").fetchone()
+            self._merge_cursor = int(row[0]) if row else 0
+            self.apply_merges()
+            identity_index.on_merge(self.apply_merges)
+
+    def _migrate_scores(self):
+        """
+        旧形式（profile_url のみが主キー）の scores テーブルを (profile_url, scorer) 主キーに作り直す
+
+        旧形式では同じURLの v1 と v2 の結果が上書きし合っていた。既存の行はそのまま移す。
+        """
+        pk = [row[1] for row in sorted(self._conn.execute("PRAGMA table_info(scores)"), key=lambda r: r[5]) if row[5]]
+        if pk != ["profile_url"]:
+            return
+        print("🗄️  scores テーブルを (profile_url, scorer) 主キーに移行します")
+        self._conn.executescript("""
+            BEGIN;
+            DROP INDEX IF EXISTS idx_scores_decision;
+            ALTER TABLE scores RENAME TO scores_old;
+        """ + SCHEMA + """
+            INSERT INTO scores SELECT profile_url, name, scorer, estimated_age, age_reasoning, age_score,
+                                      it_experience_score, position_score, total_score, decision, reason,
+                                      fingerprint, scored_at FROM scores_old;
+            DROP TABLE scores_old;
+            COMMIT;
+        """)
+
+    def _write(self, sql, params=(), many=False):
+        if not self.enabled:
+            return
+        with self._lock:
+            if many:
+                self._conn.executemany(sql, params)
+            else:
+                self._conn.execute(sql, params)
+            self._conn.commit()
+
+    def _exists(self, sql, params):
+        if not self.enabled:
+            return False
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone() is not None
+
+    # ------------------------------
+    # 書き込み
+    # ------------------------------
+    def upsert_candidates(self, rows, source):
+        """
+        検索結果（source="search"）・つながり（source="connection"）をまとめてupsert
+
+        既存の値は空でない新しい値でのみ上書きする。
+        """
+        now = _now()
+        searched_at = now if source == "search" else None
+        connected_at = now if source == "connection" else None
+        params = [
+            (
+                _url(row.get("profile_url") or row.get("url")), row.get("name"), row.get("headline"),
+                row.get("company"), row.get("location"),
+                row.get("connection_date") or row.get("connected_date"),
+                searched_at, connected_at, now
+            )
+            for row in rows if row.get("profile_url") or row.get("url")
+        ]
+        self._write("""
+            INSERT INTO candidates (profile_url, name, headline, company, location, connected_date,
+                                    searched_at, connected_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(profile_url) DO UPDATE SET
+                name = COALESCE(NULLIF(excluded.name, ''), name),
+                headline = COALESCE(NULLIF(excluded.headline, ''), headline),
+                company = COALESCE(NULLIF(excluded.company, ''), company),
+                location = COALESCE(NULLIF(excluded.location, ''), location),
+                connected_date = COALESCE(NULLIF(excluded.connected_date, ''), connected_date),
+                searched_at = COALESCE(searched_at, excluded.searched_at),
+                connected_at = COALESCE(connected_at, excluded.connected_at),
+                updated_at = excluded.updated_at
+        """, params, many=True)
+        snapshot_writer.extend("candidates", [
+            {"profile_url": p[0], "name": p[1], "headline": p[2], "company": p[3], "location": p[4],
+             "connected_date": p[5], "source": source, "observed_at": now}
+            for p in params
+        ])
+
+    def upsert_profile(self, profile):
+        """プロフィール詳細を1件upsert"""
+        if not profile.get("profile_url"):
+            return
+        is_premium = 1 if str(profile.get("is_premium", "")).lower() in ("true", "yes", "1") else 0
+        self._write("""
+            INSERT OR REPLACE INTO profiles (profile_url, name, headline, location, is_premium,
+                                             experiences, education, skills, fetched_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            _url(profile["profile_url"]), profile.get("name"), profile.get("headline"), profile.get("location"),
+            is_premium, profile.get("experiences"), profile.get("education"), profile.get("skills"), _now()
+        ))
+        snapshot_writer.append("profiles", dict(profile, profile_url=_url(profile["profile_url"]), fetched_at=_now()))
+
+    def upsert_score(self, record, scorer="v2"):
+        """スコアリング結果を1件upsert（v1 の score は total_score として保存。v1 と v2 は別の行）"""
+        profile_url = record.get("profile_url") or record.get("url")
+        if not profile_url:
+            return
+        self._write("""
+            INSERT OR REPLACE INTO scores (profile_url, name, scorer, estimated_age, age_reasoning, age_score,
+                                           it_experience_score, position_score, total_score, decision, reason,
+                                           fingerprint, scored_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            _url(profile_url), record.get("name"), scorer, _int(record.get("estimated_age")), record.get("age_reasoning"),
+            _int(record.get("age_score")), _int(record.get("it_experience_score")), _int(record.get("position_score")),
+            _int(record.get("total_score", record.get("score"))), record.get("decision"), record.get("reason"),
+            record.get("fingerprint"), _now()
+        ))
+        snapshot_writer.append("scores", dict(
+            record, profile_url=_url(profile_url), scorer=scorer,
+            total_score=record.get("total_score", record.get("score")), scored_at=_now()
+        ))
+
+    def add_connection_request(self, name, profile_url, result, error="", details=""):
+        """つながり申請の結果を1件追加"""
+        self._write("""
+            INSERT INTO connection_requests (profile_url, name, result, error, details, requested_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (_url(profile_url), name, result, error, details, _now()))
+        snapshot_writer.append("connection_requests", {
+            "date": _now(), "name": name, "profile_url": _url(profile_url),
+            "result": result, "error": error, "details": details
+        })
+
+    def add_message(self, name, profile_url, result, error="", details=""):
+        """メッセージ送信の結果を1件追加"""
+        self._write("""
+            INSERT INTO messages (profile_url, name, result, error, details, sent_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (_url(profile_url), name, result, error, details, _now()))
+        snapshot_writer.append("messages", {
+            "date": _now(), "name": name, "profile_url": _url(profile_url),
+            "result": result, "error": error, "details": details
+        })
+
+    # ------------------------------
+    # 別名の統合
+    # ------------------------------
+    def apply_merges(self):
+        """別名表で記録された正規IDの統合を反映（未反映の分だけ、記録順に付け替える）"""
+        if not self.enabled:
+            return
+        merges = identity_index.merges(self._merge_cursor)
+        if not merges:
+            return
+        with self._lock:
+            for merge_id, old, new in merges:
+                if merge_id > self._merge_cursor:
+                    self._rekey(url_for(old), url_for(new))
+                    self._merge_cursor = merge_id
+            self._conn.execute(
+                "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('merge_cursor', ?)", (str(self._merge_cursor),)
+            )
+            self._conn.commit()
+
+    def _rekey(self, old_url, new_url):
+        """old_url の行を new_url に付け替える（両方ある場合はまとめる）"""
+        conn = self._conn
+        # 候補者: 新しい行の空欄を古い行の値で埋め、初回の検索・つながり日時は早い方を残す
+        if conn.execute("SELECT 1 FROM candidates WHERE profile_url = ?", (new_url,)).fetchone():
+            conn.execute("""
+                UPDATE candidates SET
+                    name = COALESCE(NULLIF(candidates.name, ''), old.name),
+                    headline = COALESCE(NULLIF(candidates.headline, ''), old.headline),
+                    company = COALESCE(NULLIF(candidates.company, ''), old.company),
+                    location = COALESCE(NULLIF(candidates.location, ''), old.location),
+                    connected_date = COALESCE(NULLIF(candidates.connected_date, ''), old.connected_date),
+                    searched_at = COALESCE(MIN(candidates.searched_at, old.searched_at), candidates.searched_at, old.searched_at),
+                    connected_at = COALESCE(MIN(candidates.connected_at, old.connected_at), candidates.connected_at, old.connected_at),
+                    updated_at = MAX(candidates.updated_at, old.updated_at)
+                FROM (SELECT * FROM candidates WHERE profile_url = ?) AS old
+                WHERE candidates.profile_url = ?
+            """, (old_url, new_url))
+            conn.execute("DELETE FROM candidates WHERE profile_url = ?", (old_url,))
+        else:
+            conn.execute("UPDATE candidates SET profile_url = ? WHERE profile_url = ?", (new_url, old_url))
+
+        # プロフィール・スコア: 取得・評価日時が新しい方を残す（スコアは v1 / v2 ごとに比べる）
+        for table, time_column, keys in (("profiles", "fetched_at", ()), ("scores", "scored_at", ("scorer",))):
+            same = "".join(f" AND other.{key} = {table}.{key}" for key in keys)
+            conn.execute(
+                f"DELETE FROM {table} WHERE profile_url = ? AND {time_column} < "
+                f"(SELECT other.{time_column} FROM {table} AS other WHERE other.profile_url = ?{same})", (new_url, old_url)
+            )
+            conn.execute(
+                f"DELETE FROM {table} WHERE profile_url = ? AND EXISTS "
+                f"(SELECT 1 FROM {table} AS other WHERE other.profile_url = ?{same})",
+                (old_url, new_url)
+            )
+            conn.execute(f"UPDATE {table} SET profile_url = ? WHERE profile_url = ?", (new_url, old_url))
+
+        # 申請・送信の記録はすべて付け替える
+        for table in ("connection_requests", "messages"):
+            conn.execute(f"UPDATE {table} SET profile_url = ? WHERE profile_url = ?", (new_url, old_url))
+
+    # ------------------------------
+    # 参照
+    # ------------------------------
+    def is_messaged(self, profile_url):
+        """メッセージを送信済みか"""
+        return self._exists(
+            "SELECT 1 FROM messages WHERE profile_url = ? AND result = 'success' LIMIT 1", (_url(profile_url),)
+        )
+
+    def is_connection_requested(self, profile_url=None, name=None):
+        """つながり申請を送信済みか（URLがない検索結果カードは名前で確認）"""
+        if profile_url:
+            return self._exists(
+                "SELECT 1 FROM connection_requests WHERE profile_url = ? AND result = 'success' LIMIT 1", (_url(profile_url),)
+            )
+        return self._exists(
+            "SELECT 1 FROM connection_requests WHERE name = ? AND result = 'success' LIMIT 1", (name,)
+        )
+
+    def counts(self):
+        """テーブルごとの件数"""
+        if not self.enabled:
+            return {}
+        with self._lock:
+            return {
+                table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("candidates", "profiles", "scores", "connection_requests", "messages")
+            }
+
+    # ------------------------------
+    # エクスポート
+    # ------------------------------
+    def export_csv(self, filename, out_dir=DATA_DIR):
+        """従来形式のCSVを書き出し、件数を返す"""
+        if not self.enabled:
+            return 0
+        path = os.path.join(out_dir, filename)
+        with self._lock:
+            cursor = self._conn.execute(EXPORTS[filename])
+            fieldnames = [column[0] for column in cursor.description]
+            count = 0
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(fieldnames)
+                for row in cursor:
+                    writer.writerow(row)
+                    count += 1
+        return count
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# プロセス内で共有するストア
+candidate_store = CandidateStore()
+
+# ==============================
+# エントリポイント（従来のCSVをエクスポート）
+# ==============================
+if __name__ == "__main__":
+    # 例: python3 aiagent/candidate_store.py export [ファイル名 ...] [--out ディレクトリ]
+    args = sys.argv[1:]
+    if not args or args[0] != "export":
+        print(f"使い方: python3 aiagent/candidate_store.py export [{' / '.join(EXPORTS)}] [--out ディレクトリ]")
+        sys.exit(1)
+
+    out_dir = DATA_DIR
+    if "--out" in args:
+        index = args.index("--out")
+        out_dir = args[index + 1]
+        del args[index:index + 2]
+        os.makedirs(out_dir, exist_ok=True)
+
+    if not candidate_store.enabled:
+        print("❌ エラー: CANDIDATE_STORE=off のためエクスポートできません")
+        sys.exit(1)
+
+    names = args[1:] or list(EXPORTS)
+    for name in names:
+        if name not in EXPORTS:
+            print(f"⚠️ 不明なエクスポート: {name}（{', '.join(EXPORTS)}）")
+            continue
+        count = candidate_store.export_csv(name, out_dir)
+        print(f"✅ {os.path.join(out_dir, name)}: {count} 件")
+    print(f"🗄️  {STORE_FILE}: {candidate_store.counts()}")
@@ -0,0 +1,92 @@
+# aiagent/checkpoint.py
+# スコアリング結果の逐次チェックポイント（追記型JSONL、fsyncはまとめて実行）
+
+import os
+import json
+import time
+
+# ==============================
+# 設定
+# ==============================
+CHECKPOINT_FSYNC_EVERY = int(os.getenv("CHECKPOINT_FSYNC_EVERY", 20))  # fsyncするまでの件数
+CHECKPOINT_FSYNC_INTERVAL = float(os.getenv("CHECKPOINT_FSYNC_INTERVAL", 5))  # fsyncするまでの秒数
+
+# ==============================
+# 書き込み
+# ==============================
+class CheckpointWriter:
+    """
+    1件ごとにJSONLへ追記するチェックポイント
+
+    - 追記のたびにflushするため、プロセスが落ちても書き込み済みの行は残る
+    - fsync（OSクラッシュ対策）は件数または経過時間ごとにまとめて行う
+    """
+
+    def __init__(self, path, resume=False, fsync_every=CHECKPOINT_FSYNC_EVERY,
+                 fsync_interval=CHECKPOINT_FSYNC_INTERVAL):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        if resume:
+            _truncate_partial_line(path)
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def append(self, record):
+        """1件追記"""
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._pending += 1
+        if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        """書き込み済みの内容をディスクへ確定"""
+        if self._pending:
+            os.fsync(self._file.fileno())
+            self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _truncate_partial_line(path):
+    """書き込み途中で落ちた末尾の不完全な行を削除（追記再開時に行が連結しないように）"""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+# ==============================
+# 読み込み
+# ==============================
+def read_checkpoint(path):
+    """チェックポイントを1件ずつ読み出す（壊れた行は読み飛ばす）"""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def completed_urls(path):
+    """チェックポイントに記録済みのプロフィールURL"""
+    return {record.get("profile_url") for record in read_checkpoint(path) if record.get("profile_url")}
@@ -2,6 +2,7 @@
 # つながりリストを取得し、日付でフィルタリング
 
 import os
+import sys
 import time
 import csv
 import pickle
@@ -14,11 +15,16 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.keys import Keys
 from webdriver_manager.chrome import ChromeDriverManager
 
+# aiagent をモジュールとして読み込めるようにする
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aiagent.candidate_store import candidate_store
+from aiagent.profile_identity import canonical_profile_url
+
 # ==============================
 # 設定
 # ==============================
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATA_DIR = os.path.join(BASE_DIR, "data")
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
 OUTPUT_FILE = os.path.join(DATA_DIR, "new_connections.csv")
 COOKIE_FILE = os.path.join(DATA_DIR, "cookies.pkl")
 
@@ -238,12 +244,18 @@ def get_connections(driver, start_date=None):
 
     # 日付でフィルタリング
     filtered_connections = []
+    seen_urls = set()
 
     for conn in connections:
         name = conn['name']
-        profile_url = conn['profileUrl']
+        # 同一人物の別の表記（エンコード・メンバーID・クエリ付き）を同じURLにまとめる
+        profile_url = canonical_profile_url(conn['profileUrl'])
         date_text = conn['dateText']
 
+        if profile_url in seen_urls:
+            continue
+        seen_urls.add(profile_url)
+
         # 日付をパース
         connection_date = parse_connection_date(date_text)
 
@@ -314,6 +326,7 @@ def main():
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
         writer.writerows(connections)
+    candidate_store.upsert_candidates(connections, "connection")
 
     print(f"✅ 保存完了: {OUTPUT_FILE}")
 
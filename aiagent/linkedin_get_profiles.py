@@ -2,6 +2,7 @@
 # つながりリストからプロフィール詳細を取得
 
 import os
+import sys
 import time
 import csv
 import pickle
@@ -14,11 +15,17 @@ from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import NoSuchElementException
 from webdriver_manager.chrome import ChromeDriverManager
 
+# aiagent をモジュールとして読み込めるようにする
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aiagent.candidate_store import candidate_store
+from aiagent.suppression import suppression_index, PROFILE_REASONS
+from aiagent.profile_identity import canonical_profile_url
+
 # ==============================
 # 設定
 # ==============================
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATA_DIR = os.path.join(BASE_DIR, "data")
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
 INPUT_FILE = os.path.join(DATA_DIR, "new_connections.csv")
 OUTPUT_FILE = os.path.join(DATA_DIR, "profile_details.csv")
 COOKIE_FILE = os.path.join(DATA_DIR, "cookies.pkl")
@@ -310,17 +317,24 @@ def main():
 
     for idx, conn in enumerate(connections, start=1):
         name = conn.get('name', '不明')
-        profile_url = conn.get('profile_url', '')
+        # 古いCSVのURL（クエリ付き・エンコード違い）も正規化してから照合する
+        profile_url = canonical_profile_url(conn.get('profile_url', ''))
 
         if not profile_url:
             print(f"[{idx}/{total}] ⚠️ {name} - URLなし、スキップ")
             continue
 
+        suppressed = suppression_index.reason(profile_url, PROFILE_REASONS)
+        if suppressed:
+            print(f"[{idx}/{total}] ⏭️  {name} - 除外リスト該当（{suppressed}）、スキップ")
+            continue
+
         print(f"[{idx}/{total}] 🔍 {name} のプロフィールを取得中...")
 
         # プロフィール詳細取得
         details = get_profile_details(driver, profile_url, name)
         results.append(details)
+        candidate_store.upsert_profile(details)
 
         # 簡易表示
         premium_badge = "🔶 Premium会員" if details.get('is_premium') else ""
@@ -355,6 +369,7 @@ def main():
     print(f"🎯 完了サマリー")
     print(f"{'='*70}")
     print(f"取得件数: {len(results)} 件")
+    print(f"🚫 {suppression_index.summary()}")
     print(f"保存先: {OUTPUT_FILE}")
     print(f"{'='*70}\n")
 
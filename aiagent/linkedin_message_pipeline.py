@@ -10,7 +10,6 @@ import pickle
 import random
 from datetime import datetime
 from dotenv import load_dotenv
-from openai import OpenAI
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
@@ -21,26 +20,40 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
 from webdriver_manager.chrome import ChromeDriverManager
 
+# aiagent をモジュールとして読み込めるようにする
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aiagent.linkedin_scorer_v2 import score_candidate as score_profile, score_cache, cascade_summary, fingerprint_version
+from aiagent.checkpoint import CheckpointWriter, read_checkpoint, completed_urls
+from aiagent.llm_client import llm_metrics, require_api_key
+from aiagent.message_variants import MessageVariantPool
+from aiagent.message_queue import ApprovedMessageStore, prefetch
+from aiagent.similarity_rank import rank_profiles
+from aiagent.candidate_store import candidate_store
+from aiagent.suppression import suppression_index, MESSAGE_REASONS, MESSAGED, PROFILE_REASONS, SCORING_REASONS
+from aiagent.profile_identity import canonical_profile_url
+from aiagent.log_writer import BufferedLogWriter
+from aiagent.profile_diff import INCREMENTAL_SCORING, fingerprint, load_previous_json, diff_profiles, diff_summary
+
 # ==============================
 # 設定
 # ==============================
 load_dotenv()
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATA_DIR = os.path.join(BASE_DIR, "data")
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
 
 # ファイルパス
 COOKIE_FILE = os.path.join(DATA_DIR, "cookies.pkl")
 CONNECTIONS_FILE = os.path.join(DATA_DIR, "connections_list.csv")
 PROFILES_FILE = os.path.join(DATA_DIR, "profiles_detailed.csv")
 SCORED_FILE = os.path.join(DATA_DIR, "scored_connections.json")
+SCORED_CHECKPOINT_FILE = os.path.join(DATA_DIR, "scored_connections.checkpoint.jsonl")  # 1件ごとの途中結果（--resume用）
 MESSAGES_FILE = os.path.join(DATA_DIR, "messages_v2.csv")
 MESSAGE_LOG_FILE = os.path.join(DATA_DIR, "message_logs.csv")
 
 os.makedirs(DATA_DIR, exist_ok=True)
 
 # OpenAI設定
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
 # メッセージテンプレート（絵文字なし）
@@ -57,85 +70,11 @@ KPMGコンサルティングの依田と申します。
 
 もしご関心あれば、カジュアルにオンラインでお話できると嬉しいです！よろしくお願いします！"""
 
-# スコアリングプロンプト
-SCORING_PROMPT = """
-あなたはIT業界のリクルーターです。以下の候補者の詳細プロフィールを分析して、スコアリングしてください。
-
-【候補者情報】
-名前: {name}
-ヘッドライン: {headline}
-場所: {location}
-LinkedIn Premium会員: {is_premium}
-職歴:
-{experiences}
-
-学歴:
-{education}
-
-スキル: {skills}
-
-【評価基準】
-
-1. 年齢評価（0-25点）
-   - 学歴の卒業年から年齢を推定（大学卒業を22歳と仮定）
-   - 計算式: 現在年齢 = 2025年 - 卒業年 + 22歳
-   - 25-30歳: 25点
-   - 31-35歳: 20点
-   - 36-40歳: 15点
-   - 41歳以上: **即座に除外（スコア0、decision: "skip"）**
-
-2. IT業界経験評価（0-40点）
-   - キーワード: SIer, ITコンサルタント, エンジニア, DXエンジニア, システム開発, クラウド, AI, データサイエンス
-   - 現在のIT業界経験が3年以上: 40点
-   - 現在のIT業界経験が1-3年: 30点
-   - 過去にIT業界経験あり: 20点
-   - IT業界経験なし: 0点
-
-3. ポジション評価（-30 〜 +20点）
-   - エンジニア・開発者: +20点
-   - ITコンサルタント: +15点
-   - プロジェクトマネージャー: +10点
-   - 以下は**即座に除外（スコア0、decision: "skip"）**:
-     - 経営層: 社長, CEO, CIO, CTO, CFO, 代表取締役, 執行役員, 取締役
-     - HR・人材関係: 人材紹介, 人材派遣, リクルーター, 採用担当, ヘッドハンター, キャリアアドバイザー, 人事コンサルタント
-
-4. その他の除外条件（即座にスコア0、decision: "skip"）
-   - LinkedIn Premium会員（is_premium: "True"または"yes"の場合）
-   - 学生（在学中）
-   - IT業界と無関係（飲食、販売、製造、小売など）
-   - 現在以下の企業に勤務している者:
-     * フューチャー株式会社
-     * フューチャーアーキテクト株式会社
-
-【出力形式】
-以下のJSON形式で出力してください。他の説明は一切不要です。
-
-{{
-  "estimated_age": 推定年齢（数値、不明な場合はnull）,
-  "age_reasoning": "年齢推定の根拠",
-  "age_score": 年齢スコア（0-25）,
-  "it_experience_score": IT経験スコア（0-40）,
-  "position_score": ポジションスコア（-30 〜 +20）,
-  "total_score": 合計スコア（age_score + it_experience_score + position_score）,
-  "decision": "send" または "skip",
-  "reason": "スコアリングの理由（簡潔に1-2文）"
-}}
-
-【重要な注意事項】
-- LinkedIn Premium会員（is_premium: "True"または"yes"）は必ず除外（decision: "skip"、total_score: 0）
-- 41歳以上は必ず除外（decision: "skip"、total_score: 0）
-- 経営層（社長、CEO、取締役等）は必ず除外（decision: "skip"、total_score: 0）
-- HR・人材関係（リクルーター、採用担当等）は必ず除外（decision: "skip"、total_score: 0）
-- フューチャー株式会社またはフューチャーアーキテクト株式会社に現在勤務している者は必ず除外（decision: "skip"、total_score: 0）
-- 合計スコアが60点以上の場合は "send"、それ未満は "skip"
-"""
-
-# OpenAIクライアント
-if not OPENAI_API_KEY:
-    print("❌ エラー: OPENAI_API_KEYが設定されていません")
-    exit(1)
-
-client = OpenAI(api_key=OPENAI_API_KEY)
+# メッセージのバリエーションプール（data/message_variants.json）
+variant_pool = MessageVariantPool(MESSAGE_TEMPLATE)
+
+# 承認済みメッセージと送信状態（data/approved_messages.jsonl）
+approved_store = ApprovedMessageStore()
 
 # ==============================
 # ログイン
@@ -293,7 +232,13 @@ def get_connections(driver, start_date):
     start_date_obj = datetime.strptime(start_date, "%Y-%m-%d")
 
     filtered_connections = []
+    seen_urls = set()
     for conn in connections:
+        # 同一人物の別の表記（エンコード・メンバーID・クエリ付き）を同じURLにまとめる
+        profile_url = canonical_profile_url(conn['profileUrl'])
+        if profile_url in seen_urls:
+            continue
+        seen_urls.add(profile_url)
         date_text = conn['dateText']
         match = __import__('re').search(r'(\d{4})年(\d{1,2})月(\d{1,2})日', date_text)
         if match:
@@ -303,7 +248,7 @@ def get_connections(driver, start_date):
             if conn_date >= start_date_obj:
                 filtered_connections.append({
                     'name': conn['name'],
-                    'profile_url': conn['profileUrl'],
+                    'profile_url': profile_url,
                     'connected_date': f"{year}-{month:02d}-{day:02d}"
                 })
 
@@ -314,6 +259,7 @@ def get_connections(driver, start_date):
         writer = csv.DictWriter(f, fieldnames=["name", "profile_url", "connected_date"])
         writer.writeheader()
         writer.writerows(filtered_connections)
+    candidate_store.upsert_candidates(filtered_connections, "connection")
 
     print(f"💾 保存完了: {CONNECTIONS_FILE}\n")
 
@@ -497,16 +443,22 @@ def get_all_profiles(driver, connections):
 
     for idx, conn in enumerate(connections, start=1):
         name = conn.get('name', '不明')
-        profile_url = conn.get('profile_url', '')
+        profile_url = canonical_profile_url(conn.get('profile_url', ''))
 
         if not profile_url:
             print(f"[{idx}/{len(connections)}] ⚠️ {name} - URLなし、スキップ\n")
             continue
 
+        suppressed = suppression_index.reason(profile_url, PROFILE_REASONS)
+        if suppressed:
+            print(f"[{idx}/{len(connections)}] ⏭️  {name} - 除外リスト該当（{suppressed}）、スキップ\n")
+            continue
+
         print(f"[{idx}/{len(connections)}] 🔍 {name} のプロフィールを取得中...")
 
         details = get_profile_details(driver, profile_url, name)
         results.append(details)
+        candidate_store.upsert_profile(details)
 
         if details.get('is_premium'):
             print(f"   🔶 LinkedIn Premium会員")
@@ -530,108 +482,125 @@ def get_all_profiles(driver, connections):
 # ==============================
 # Step 4: AIスコアリング
 # ==============================
+# スコアリング結果のうち、保存しない制御用の項目
+SCORE_META_FIELDS = ("latency_ms", "cached", "error", "escalated")
+
+
 def score_candidate(candidate):
-    """OpenAI APIで候補者をスコアリング"""
-
-    name = candidate.get("name", "不明")
-    headline = candidate.get("headline", "情報なし")
-    location = candidate.get("location", "情報なし")
-    is_premium = candidate.get("is_premium", False)
-    is_premium_str = "yes" if str(is_premium).lower() in ['true', 'yes', '1'] else "no"
-    experiences = candidate.get("experiences", "情報なし")
-    education = candidate.get("education", "情報なし")
-    skills = candidate.get("skills", "情報なし")
-
-    prompt = SCORING_PROMPT.format(
-        name=name,
-        headline=headline,
-        location=location,
-        is_premium=is_premium_str,
-        experiences=experiences,
-        education=education,
-        skills=skills
-    )
+    """
+    候補者をスコアリング（linkedin_scorer_v2 と同じ評価基準・キャッシュ・ルール除外を使用）
 
-    try:
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": "あなたはIT業界のリクルーターです。"},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=500
-        )
-
-        result_text = response.choices[0].message.content.strip()
-
-        # JSONを抽出
-        import re
-        json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
-        if json_match:
-            result = json.loads(json_match.group(0))
-        else:
-            result = json.loads(result_text)
+    Returns:
+        dict: プロフィールにスコアとフィンガープリント（失敗時は空）を統合したdict
+    """
+    result = score_profile(candidate)
+    return {
+        **candidate,
+        **{k: v for k, v in result.items() if k not in SCORE_META_FIELDS},
+        "fingerprint": "" if result.get("error") else fingerprint(candidate, fingerprint_version())
+    }
 
-        return {
-            **candidate,
-            **result
-        }
 
-    except Exception as e:
-        print(f"   ⚠️ APIエラー ({name}): {e}")
-        return {
-            **candidate,
-            "estimated_age": None,
-            "age_reasoning": "",
-            "age_score": 0,
-            "it_experience_score": 0,
-            "position_score": 0,
-            "total_score": 0,
-            "decision": "skip",
-            "reason": f"APIエラー: {e}"
-        }
+def save_scored(records, min_score):
+    """
+    チェックポイントから1件ずつ読みながら scored_connections.json を書き出す
+
+    Returns:
+        list: 送信対象（decision が send かつ min_score 以上）
+    """
+    send_targets = []
+    with open(SCORED_FILE, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i, record in enumerate(records):
+            f.write(",\n" if i else "\n")
+            f.write(json.dumps(record, ensure_ascii=False, indent=2))
+            if record.get('decision') == 'send' and record.get('total_score', 0) >= min_score:
+                send_targets.append(record)
+        f.write("\n]\n")
+    return send_targets
+
+
+def score_all_candidates(profiles, min_score, resume=False):
+    """
+    全候補者をスコアリング
+
+    結果は1件ごとにチェックポイントへ追記し、scored_connections.json はチェックポイントから生成する。
+    resume=True なら記録済みの候補者（プロフィールURL）を飛ばして続きから実行する。
+    前回の scored_connections.json とプロフィール内容が変わっていない候補者は、再スコアリングせず結果を引き継ぐ。
+    """
+
+    done_urls = completed_urls(SCORED_CHECKPOINT_FILE) if resume else set()
+    pending = [p for p in profiles if p.get('profile_url') not in done_urls]
+    resumed_count = len(profiles) - len(pending)
+
+    # メッセージ送信済み・配信停止の候補者はスコアリングしない
+    pending = [p for p in pending if not suppression_index.contains(p.get('profile_url'), SCORING_REASONS)]
+    suppressed_count = len(profiles) - resumed_count - len(pending)
 
-def score_all_candidates(profiles, min_score):
-    """全候補者をスコアリング"""
+    carried = []
+    diff_counts = None
+    if INCREMENTAL_SCORING:
+        pending, carried, diff_counts = diff_profiles(pending, load_previous_json(SCORED_FILE), fingerprint_version())
 
     print(f"{'='*70}")
     print(f"🧠 Step 4: AIスコアリング")
     print(f"{'='*70}")
     print(f"候補者数: {len(profiles)} 件")
     print(f"最低スコア: {min_score} 点")
+    if resume:
+        print(f"再開: チェックポイント記録済み {resumed_count} 件をスキップ")
+    if suppressed_count:
+        print(f"除外リスト該当: {suppressed_count} 件をスキップ（送信済み・配信停止）")
+    if diff_counts:
+        print(diff_summary(diff_counts))
     print(f"{'='*70}\n")
 
-    results = []
+    prefiltered_count = 0
 
-    for idx, profile in enumerate(profiles, start=1):
-        name = profile.get('name', '不明')
-        print(f"[{idx}/{len(profiles)}] 📊 {name} をスコアリング中...")
+    with CheckpointWriter(SCORED_CHECKPOINT_FILE, resume=resume) as checkpoint:
+        for profile, record in carried:
+            checkpoint.append({**record, **profile})
+            candidate_store.upsert_score(record)
+            suppression_index.record_score(record['profile_url'], record['decision'])
 
-        scored = score_candidate(profile)
-        results.append(scored)
+        for idx, profile in enumerate(pending, start=len(profiles) - len(pending) + 1):
+            name = profile.get('name', '不明')
+            print(f"[{idx}/{len(profiles)}] 📊 {name} をスコアリング中...")
 
-        decision = scored.get('decision', 'skip')
-        total_score = scored.get('total_score', 0)
-        reason = scored.get('reason', '')
+            scored = score_candidate(profile)
+            if scored.get('prefiltered'):
+                prefiltered_count += 1
+            checkpoint.append(scored)
+            candidate_store.upsert_score(scored)
+            if scored.get('fingerprint'):  # 失敗した結果（フィンガープリントなし）は反映しない
+                suppression_index.record_score(scored['profile_url'], scored['decision'])
 
-        if decision == "send":
-            print(f"   ✅ 送信対象: {total_score}点")
-        else:
-            print(f"   ⚪ スキップ: {total_score}点")
-        print(f"   理由: {reason}\n")
-
-        time.sleep(1)
-
-    # JSON保存
-    with open(SCORED_FILE, "w", encoding="utf-8") as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
-
-    print(f"💾 保存完了: {SCORED_FILE}\n")
-
-    # 送信対象を抽出してCSV保存
-    send_targets = [r for r in results if r.get('decision') == 'send' and r.get('total_score', 0) >= min_score]
+            decision = scored.get('decision', 'skip')
+            total_score = scored.get('total_score', 0)
+            reason = scored.get('reason', '')
 
+            if decision == "send":
+                print(f"   ✅ 送信対象: {total_score}点")
+            else:
+                print(f"   ⚪ スキップ: {total_score}点")
+            print(f"   理由: {reason}\n")
+
+    # JSON保存（チェックポイントから生成）
+    send_targets = save_scored(read_checkpoint(SCORED_CHECKPOINT_FILE), min_score)
+
+    print(f"💾 保存完了: {SCORED_FILE}")
+    print(f"🚫 ルール除外: {prefiltered_count} 件（API呼び出し {prefiltered_count} 回を削減）")
+    if diff_counts:
+        print(f"♻️  前回の結果を引き継ぎ: {len(carried)} 件（プロフィール変更なし）")
+    print(f"🗃️  {score_cache.summary()}")
+    print(f"🚫 {suppression_index.summary()}")
+    print(f"💰 {llm_metrics.summary('scoring')}")
+    cascade = cascade_summary()
+    if cascade:
+        print(f"🪜 {cascade}")
+    print()
+
+    # 送信対象をCSV保存
     if send_targets:
         with open(MESSAGES_FILE, "w", newline="", encoding="utf-8") as f:
             fieldnames = ["name", "profile_url", "total_score"]
@@ -654,42 +623,8 @@ def score_all_candidates(profiles, min_score):
 # Step 5-6: メッセージ生成・送信
 # ==============================
 def generate_message(name):
-    """メッセージを生成"""
-    base_message = MESSAGE_TEMPLATE.format(name=name)
-
-    prompt = f"""
-以下のメッセージテンプレートを元に、自然で親しみやすいメッセージを生成してください。
-大幅な変更は不要です。語尾や表現を少しだけ変えてください。
-
-【テンプレート】
-{base_message}
-
-【要件】
-- 名前は必ず「{name}さん」で始める
-- 内容の構造は基本的にテンプレート通り
-- 語尾や接続詞を少しだけ自然にバリエーションを付ける
-- 箇条書き（・）はそのまま維持
-- 全体の長さはテンプレートと同程度
-- 他の説明は一切不要、メッセージ本文のみ出力
-"""
-
-    try:
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": "あなたはメッセージ生成アシスタントです。"},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.5,
-            max_tokens=400
-        )
-
-        message = response.choices[0].message.content.strip()
-        return message
-
-    except Exception as e:
-        print(f"   ⚠️ メッセージ生成エラー: {e}")
-        return base_message
+    """メッセージを生成（事前に生成したバリエーションに名前を差し込む。APIは不足分の生成時のみ）"""
+    return variant_pool.render(name)
 
 def send_message(driver, profile_url, name, message):
     """メッセージを送信"""
@@ -843,73 +778,70 @@ def send_message(driver, profile_url, name, message):
     except Exception as e:
         return "error", f"予期しないエラー: {e}", "unexpected_error"
 
+# 送信ログ（ファイルを開いたまま行をバッファし、まとめて書き出す）
+message_log = BufferedLogWriter(MESSAGE_LOG_FILE, ["date", "name", "profile_url", "result", "error", "details"])
+
 def log_message(name, profile_url, result, error="", details=""):
     """送信結果をログに記録"""
-    file_exists = os.path.exists(MESSAGE_LOG_FILE)
-
-    with open(MESSAGE_LOG_FILE, "a", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=["date", "name", "profile_url", "result", "error", "details"])
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow({
-            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "name": name,
-            "profile_url": profile_url,
-            "result": result,
-            "error": error,
-            "details": details
-        })
+    message_log.write({
+        "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "name": name,
+        "profile_url": profile_url,
+        "result": result,
+        "error": error,
+        "details": details
+    })
+
+    candidate_store.add_message(name, profile_url, result, error, details)
+    if result == "success":
+        suppression_index.add(profile_url, MESSAGED)
 
 def send_all_messages(driver, targets, max_messages):
-    """全メッセージを送信"""
+    """
+    全メッセージを送信
+
+    確認は最初の1回のみ。メッセージ生成はワーカーで先行して進め、ブラウザでの送信と並行させる。
+    生成したメッセージは承認済みとして保存し、再実行時は送信済みを除外・未送信分を再利用する。
+    """
+
+    # 送信済みを除外して上限件数まで絞り込み
+    targets = [
+        t for t in targets
+        if t.get('profile_url')
+        and not approved_store.is_sent(t['profile_url'])
+        and not suppression_index.contains(t['profile_url'], MESSAGE_REASONS)
+    ]
+    targets = targets[:max_messages]
+    reused = sum(1 for t in targets if approved_store.get(t['profile_url']))
 
     print(f"{'='*70}")
     print(f"📨 Step 5-6: メッセージ生成・送信")
     print(f"{'='*70}")
-    print(f"送信対象: {len(targets)} 件")
+    print(f"送信対象: {len(targets)} 件（送信済みを除く）")
     print(f"上限: {max_messages} 件")
+    print(f"承認済みメッセージの再利用: {reused} 件")
     print(f"{'='*70}\n")
 
-    # 上限件数まで絞り込み
-    targets = targets[:max_messages]
-
-    # メッセージを生成
-    print("💬 メッセージを生成中...\n")
-
-    messages_to_send = []
-
-    for idx, target in enumerate(targets, start=1):
-        name = target.get('name', '不明')
-        profile_url = target.get('profile_url', '')
-        score = target.get('total_score', 0)
-
-        if not profile_url:
-            print(f"[{idx}/{len(targets)}] ⚠️ {name} - URLなし、スキップ\n")
-            continue
-
-        print(f"[{idx}/{len(targets)}] 💬 {name} (スコア: {score}点) のメッセージを生成中...")
-        message = generate_message(name)
-        print(f"   ✅ 生成完了\n")
-
-        messages_to_send.append({
-            'name': name,
-            'profile_url': profile_url,
-            'score': score,
-            'message': message
-        })
+    if not targets:
+        print("⚠️ 送信対象が0件です\n")
+        return
 
-    # 生成したメッセージを全て表示
+    # 送信する文面（宛名はそれぞれの名前に置き換え）
+    variants = variant_pool.ensure()
     print(f"{'='*70}")
-    print(f"📋 生成されたメッセージ一覧")
+    print(f"📋 送信する文面（{len(variants) or 1} パターン、宛名は各候補者の名前に置き換え）")
     print(f"{'='*70}\n")
-
-    for idx, msg_data in enumerate(messages_to_send, start=1):
-        print(f"--- [{idx}/{len(messages_to_send)}] {msg_data['name']} (スコア: {msg_data['score']}点) ---")
-        print(f"{msg_data['message']}")
+    for idx, variant in enumerate(variants or [{"text": MESSAGE_TEMPLATE}], start=1):
+        print(f"--- パターン{idx} ---")
+        print(variant["text"])
         print()
 
-    # ユーザーに確認
-    print(f"{'='*70}")
+    print(f"--- 送信先 ---")
+    for idx, target in enumerate(targets, start=1):
+        print(f"[{idx}/{len(targets)}] {target.get('name', '不明')} (スコア: {target.get('total_score', 0)}点)")
+
+    # ユーザーに確認（1回のみ）
+    print(f"\n{'='*70}")
     print(f"これらのメッセージを送信しますか？")
     print(f"{'='*70}")
     confirm = input("送信する場合は 'yes' と入力してください: ").strip().lower()
@@ -918,7 +850,15 @@ def send_all_messages(driver, targets, max_messages):
         print("\n❌ 送信をキャンセルしました\n")
         return
 
-    # メッセージ送信
+    def prepare(target):
+        """メッセージを用意（承認済みがあれば再利用、なければ生成して保存）"""
+        approved = approved_store.get(target['profile_url'])
+        if approved:
+            return approved
+        name = target.get('name', '不明')
+        return approved_store.approve(name, target['profile_url'], target.get('total_score', 0), generate_message(name))
+
+    # メッセージ送信（生成はバックグラウンドで先行）
     print(f"\n{'='*70}")
     print(f"📨 メッセージ送信開始")
     print(f"{'='*70}\n")
@@ -926,17 +866,18 @@ def send_all_messages(driver, targets, max_messages):
     success_count = 0
     error_count = 0
 
-    for idx, msg_data in enumerate(messages_to_send, start=1):
+    for idx, msg_data in enumerate(prefetch(targets, prepare), start=1):
         name = msg_data['name']
         profile_url = msg_data['profile_url']
         score = msg_data['score']
         message = msg_data['message']
 
-        print(f"[{idx}/{len(messages_to_send)}] 📤 {name} (スコア: {score}点) へ送信中...")
+        print(f"[{idx}/{len(targets)}] 📤 {name} (スコア: {score}点) へ送信中...")
 
         result, error, details = send_message(driver, profile_url, name, message)
 
         log_message(name, profile_url, result, error, details)
+        approved_store.mark(profile_url, "sent" if result == "success" else "failed")
 
         if result == "success":
             success_count += 1
@@ -946,7 +887,7 @@ def send_all_messages(driver, targets, max_messages):
             print(f"   ❌ 送信失敗: {error}\n")
 
         # 遅延
-        if idx < len(messages_to_send):
+        if idx < len(targets):
             delay = random.uniform(3, 6)
             time.sleep(delay)
 
@@ -956,14 +897,15 @@ def send_all_messages(driver, targets, max_messages):
     print(f"{'='*70}")
     print(f"✅ 送信成功: {success_count} 件")
     print(f"❌ 送信失敗: {error_count} 件")
-    print(f"📝 ログ: {MESSAGE_LOG_FILE}")
+    print(f"📝 ログ: {message_log.path}")
+    print(f"💰 {llm_metrics.summary('message')}")
     print(f"{'='*70}\n")
 
 # ==============================
 # メイン処理
 # ==============================
-def main(start_date, min_score, max_messages):
-    """メイン処理"""
+def main(start_date, min_score, max_messages, resume=False):
+    """メイン処理（resume=True ならスコアリングをチェックポイントから再開）"""
 
     print(f"\n{'='*70}")
     print(f"🚀 LinkedIn メッセージ送信パイプライン")
@@ -989,8 +931,11 @@ def main(start_date, min_score, max_messages):
             print("⚠️ プロフィールが取得できませんでした。処理を終了します。\n")
             return
 
+        # 理想の候補者像との類似度で並べ替え・絞り込み（ローカル計算、API呼び出しなし）
+        profiles = rank_profiles(profiles)
+
         # Step 4: AIスコアリング
-        send_targets = score_all_candidates(profiles, min_score)
+        send_targets = score_all_candidates(profiles, min_score, resume)
 
         if not send_targets:
             print("⚠️ 送信対象が0件です。処理を終了します。\n")
@@ -1010,6 +955,8 @@ def main(start_date, min_score, max_messages):
         print(f"🏁 パイプライン完了")
         print(f"{'='*70}")
         print(f"終了日時: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"💰 {llm_metrics.summary()}")
+        print(f"📈 API使用量の記録: {llm_metrics.path}")
         print(f"{'='*70}\n")
 
         input("\nEnterキーを押してブラウザを閉じます...")
@@ -1019,6 +966,10 @@ def main(start_date, min_score, max_messages):
 # エントリポイント
 # ==============================
 if __name__ == "__main__":
+    # 前回中断したスコアリングを再開する場合は --resume を付けて実行
+    resume = "--resume" in sys.argv[1:]
+    require_api_key()
+
     print(f"\n{'='*70}")
     print(f"🚀 LinkedIn メッセージ送信パイプライン")
     print(f"{'='*70}\n")
@@ -1076,6 +1027,8 @@ if __name__ == "__main__":
     print(f"つながり取得開始日: {start_date}")
     print(f"最低スコア: {min_score}点")
     print(f"最大メッセージ送信数: {max_messages}件")
+    if resume:
+        print(f"スコアリング: 前回のチェックポイントから再開")
     print(f"{'='*70}\n")
 
     confirm = input("この設定で実行しますか？ (yes/no): ").strip().lower()
@@ -1083,4 +1036,4 @@ if __name__ == "__main__":
         print("\n❌ 処理をキャンセルしました\n")
         exit(0)
 
-    main(start_date, min_score, max_messages)
+    main(start_date, min_score, max_messages, resume)
@@ -2,6 +2,7 @@
 # 改善版：「つながりを申請」ボタン検出の複数戦略 + 詳細ログ + エラーハンドリング強化
 
 import os
+import sys
 import time
 import csv
 import random
@@ -17,11 +18,17 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from webdriver_manager.chrome import ChromeDriverManager
 
+# aiagent をモジュールとして読み込めるようにする
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aiagent.candidate_store import candidate_store
+from aiagent.suppression import suppression_index, CONTACT_REASONS, CONNECTION_REQUESTED
+from aiagent.log_writer import BufferedLogWriter
+
 # ==============================
 # 定数
 # ==============================
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATA_DIR = os.path.join(BASE_DIR, "data")
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
 DEBUG_DIR = os.path.join(BASE_DIR, "debug_output")
 TARGET_CSV = os.path.join(DATA_DIR, "messages.csv")
 LOG_CSV = os.path.join(DATA_DIR, "logs.csv")
@@ -35,22 +42,23 @@ DELAY_RANGE = (5, 10)  # 送信間隔（秒）
 # ==============================
 # ログ記録関数
 # ==============================
+# 申請ログ（ファイルを開いたまま行をバッファし、まとめて書き出す）
+request_log = BufferedLogWriter(LOG_CSV, ["date", "name", "url", "result", "error", "details"])
+
 def append_log(name, url, result, error="", details=""):
     """送信結果をCSVに記録"""
-    file_exists = os.path.exists(LOG_CSV)
-
-    with open(LOG_CSV, "a", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=["date", "name", "url", "result", "error", "details"])
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow({
-            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "name": name,
-            "url": url,
-            "result": result,
-            "error": error,
-            "details": details
-        })
+    request_log.write({
+        "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "name": name,
+        "url": url,
+        "result": result,
+        "error": error,
+        "details": details
+    })
+
+    candidate_store.add_connection_request(name, url, result, error, details)
+    if result == "success":
+        suppression_index.add(url, CONNECTION_REQUESTED)
 
 def save_debug_screenshot(driver, name, reason):
     """デバッグ用スクリーンショット保存"""
@@ -369,6 +377,12 @@ def send_requests(driver):
             skip += 1
             continue
 
+        suppressed = suppression_index.reason(url, CONTACT_REASONS)
+        if suppressed:
+            print(f"ℹ️ {name}: 除外リスト該当（{suppressed}）。スキップします。")
+            skip += 1
+            continue
+
         try:
             # プロフィールページへ遷移
             print(f"🌐 プロフィールページに遷移中...")
@@ -465,7 +479,7 @@ def send_requests(driver):
     print(f"✅ 成功: {success} 件")
     print(f"⚪ スキップ: {skip} 件")
     print(f"❌ エラー: {error} 件")
-    print(f"📝 ログ保存先: {LOG_CSV}")
+    print(f"📝 ログ保存先: {request_log.path}")
     print(f"📸 デバッグファイル: {DEBUG_DIR}")
     print(f"{'='*70}")
     print("🪄 全処理完了。ブラウザを閉じてもOKです。")
@@ -2,10 +2,18 @@
 # OpenAI APIを使った候補者スコアリング（年齢推定を含む）
 
 import os
+import sys
 import csv
 import json
 from dotenv import load_dotenv
-from openai import OpenAI
+
+# aiagent をモジュールとして読み込めるようにする
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aiagent.score_cache import ScoreCache, make_key
+from aiagent.llm_client import chat, llm_metrics, require_api_key
+from aiagent.streaming import iter_csv, CSVStreamWriter, TopK
+from aiagent.candidate_store import candidate_store
+from aiagent.suppression import suppression_index, SCORING_REASONS
 
 # ==============================
 # 設定
@@ -13,13 +21,12 @@ from openai import OpenAI
 load_dotenv()
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATA_DIR = os.path.join(BASE_DIR, "data")
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
 INPUT_FILE = os.path.join(DATA_DIR, "candidates_raw.csv")
 OUTPUT_FILE = os.path.join(DATA_DIR, "candidates_scored.csv")
 MESSAGES_FILE = os.path.join(DATA_DIR, "messages.csv")
 
 # OpenAI設定
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
 # スコアリング基準
@@ -27,19 +34,16 @@ MAX_AGE = int(os.getenv("MAX_AGE", 40))
 MIN_SCORE = int(os.getenv("MIN_SCORE", 60))
 MAX_SEND_COUNT = int(os.getenv("MAX_SEND_COUNT", 30))  # 1回あたりの最大送信数
 
-# ==============================
-# OpenAIクライアント
-# ==============================
-if not OPENAI_API_KEY:
-    print("❌ エラー: OPENAI_API_KEYが設定されていません")
-    print("💡 .envファイルにOPENAI_API_KEYを設定してください")
-    exit(1)
-
-client = OpenAI(api_key=OPENAI_API_KEY)
+# スコアリング結果キャッシュ
+score_cache = ScoreCache()
 
 # ==============================
 # スコアリングプロンプト
 # ==============================
+# プロンプトや出力項目を変更したら更新する（キャッシュキーに含まれる）
+SCORING_PROMPT_VERSION = "v1-2025-10-25"
+SCORING_FIELDS = ["name", "headline", "company", "location"]
+
 SCORING_PROMPT = """
 あなたはIT業界のリクルーターです。以下の候補者情報を分析して、スコアリングしてください。
 
@@ -89,6 +93,23 @@ SCORING_PROMPT = """
 # 候補者スコアリング
 # ==============================
 def score_candidate(candidate):
+    """候補者をスコアリング（キャッシュにあればAPIを呼ばない）"""
+
+    key = make_key(OPENAI_MODEL, SCORING_PROMPT_VERSION, candidate, SCORING_FIELDS)
+    cached = score_cache.get(key)
+    if cached is not None:
+        return cached
+
+    result = _score_with_api(candidate)
+
+    # エラー時の結果はキャッシュしない（次回再スコアリングする）
+    if not result.get("error"):
+        score_cache.put(key, result)
+
+    return result
+
+
+def _score_with_api(candidate):
     """OpenAI APIで候補者をスコアリング"""
 
     name = candidate.get("name", "不明")
@@ -104,9 +125,12 @@ def score_candidate(candidate):
         location=location
     )
 
+    content = ""
+
     try:
         # OpenAI API呼び出し
-        response = client.chat.completions.create(
+        content = chat(
+            "scoring_v1",
             model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": "あなたはIT業界のリクルーターです。JSON形式で出力してください。"},
@@ -117,7 +141,7 @@ def score_candidate(candidate):
         )
 
         # レスポンス解析
-        content = response.choices[0].message.content.strip()
+        content = content.strip()
 
         # JSON抽出（```json ... ```で囲まれている場合も対応）
         if "```json" in content:
@@ -143,7 +167,8 @@ def score_candidate(candidate):
             "age_reasoning": "解析エラー",
             "score": 0,
             "decision": "skip",
-            "reason": "AIレスポンスの解析に失敗"
+            "reason": "AIレスポンスの解析に失敗",
+            "error": True
         }
     except Exception as e:
         print(f"⚠️ APIエラー ({name}): {e}")
@@ -152,12 +177,52 @@ def score_candidate(candidate):
             "age_reasoning": "エラー",
             "score": 0,
             "decision": "skip",
-            "reason": f"APIエラー: {str(e)}"
+            "reason": f"APIエラー: {str(e)}",
+            "error": True
         }
 
 # ==============================
 # メイン処理
 # ==============================
+# 結果CSVの列
+OUTPUT_FIELDS = ["name", "url", "headline", "company", "location",
+                 "estimated_age", "age_reasoning", "score", "decision", "reason"]
+
+
+def _merge_result(candidate, score_result):
+    """候補者情報とスコアリング結果を結果CSVの1行にまとめる"""
+    return {
+        "name": candidate.get("name", ""),
+        "url": candidate.get("url", ""),
+        "headline": candidate.get("headline", ""),
+        "company": candidate.get("company", ""),
+        "location": candidate.get("location", ""),
+        "estimated_age": score_result["estimated_age"],
+        "age_reasoning": score_result["age_reasoning"],
+        "score": score_result["score"],
+        "decision": score_result["decision"],
+        "reason": score_result["reason"]
+    }
+
+
+def save_send_targets(send_targets):
+    """送信対象リスト（スコア降順、上限件数まで）を保存"""
+    if not send_targets:
+        return
+    with open(MESSAGES_FILE, "w", newline="", encoding="utf-8") as f:
+        fieldnames = ["name", "url", "score"]
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for target in send_targets:
+            writer.writerow({
+                "name": target["name"],
+                "url": target["url"],
+                "score": target["score"]
+            })
+
+    print(f"✅ 送信対象リストを保存: {MESSAGES_FILE}")
+
+
 def score_all_candidates():
     """全候補者をスコアリング"""
 
@@ -191,26 +256,19 @@ def score_all_candidates():
 
     for idx, candidate in enumerate(candidates, start=1):
         name = candidate.get("name", "不明")
+        if suppression_index.contains(candidate.get("url"), SCORING_REASONS):
+            print(f"[{idx}/{total}] ⏭️  {name} - 除外リスト該当（送信済み・配信停止）、スキップ\n")
+            continue
         print(f"[{idx}/{total}] 📊 {name} をスコアリング中...")
 
         # スコアリング実行
         score_result = score_candidate(candidate)
 
         # 結果を統合
-        result = {
-            "name": candidate.get("name", ""),
-            "url": candidate.get("url", ""),
-            "headline": candidate.get("headline", ""),
-            "company": candidate.get("company", ""),
-            "location": candidate.get("location", ""),
-            "estimated_age": score_result["estimated_age"],
-            "age_reasoning": score_result["age_reasoning"],
-            "score": score_result["score"],
-            "decision": score_result["decision"],
-            "reason": score_result["reason"]
-        }
-
+        result = _merge_result(candidate, score_result)
         results.append(result)
+        # 見出しだけの判定のため除外リストには記録しない（v2の詳細評価を妨げない）
+        candidate_store.upsert_score(result, scorer="v1")
 
         # 結果表示
         score = score_result["score"]
@@ -232,9 +290,7 @@ def score_all_candidates():
     print(f"{'='*70}")
 
     with open(OUTPUT_FILE, "w", newline="", encoding="utf-8") as f:
-        fieldnames = ["name", "url", "headline", "company", "location",
-                      "estimated_age", "age_reasoning", "score", "decision", "reason"]
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer = csv.DictWriter(f, fieldnames=OUTPUT_FIELDS)
         writer.writeheader()
         writer.writerows(results)
 
@@ -248,19 +304,7 @@ def score_all_candidates():
     send_targets_limited = send_targets[:MAX_SEND_COUNT]
 
     # 送信対象リストを保存（メッセージ機能は削除）
-    if send_targets_limited:
-        with open(MESSAGES_FILE, "w", newline="", encoding="utf-8") as f:
-            fieldnames = ["name", "url", "score"]
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            for target in send_targets_limited:
-                writer.writerow({
-                    "name": target["name"],
-                    "url": target["url"],
-                    "score": target["score"]
-                })
-
-        print(f"✅ 送信対象リストを保存: {MESSAGES_FILE}")
+    save_send_targets(send_targets_limited)
 
     # サマリー
     print(f"\n{'='*70}")
@@ -274,6 +318,9 @@ def score_all_candidates():
     else:
         print(f"   📌 今回送信: {len(send_targets_limited)} 件")
     print(f"⚪ スキップ: {skip_count} 件")
+    print(f"🗃️  {score_cache.summary()}")
+    print(f"🚫 {suppression_index.summary()}")
+    print(f"💰 {llm_metrics.summary('scoring_v1')}")
     print(f"{'='*70}\n")
 
     if send_targets_limited:
@@ -283,8 +330,66 @@ def score_all_candidates():
 
     return len(send_targets_limited)
 
+
+def score_stream():
+    """
+    全候補者をストリーミングでスコアリング（入力件数によらずメモリ一定）
+
+    1件ずつ読み込み・スコアリングして結果CSVへ逐次書き出し、送信対象はスコア上位 MAX_SEND_COUNT 件だけを保持する。
+    """
+
+    if not os.path.exists(INPUT_FILE):
+        print(f"❌ エラー: 候補者ファイルが見つかりません: {INPUT_FILE}")
+        print(f"💡 先に linkedin_search.py を実行してください")
+        return
+
+    print(f"\n{'='*70}")
+    print(f"🧠 AIスコアリング開始（ストリーミング）")
+    print(f"{'='*70}")
+    print(f"入力: {INPUT_FILE}")
+    print(f"使用モデル: {OPENAI_MODEL}")
+    print(f"最低スコア: {MIN_SCORE} 点")
+    print(f"{'='*70}\n")
+
+    top = TopK(MAX_SEND_COUNT)
+
+    with CSVStreamWriter(OUTPUT_FILE, OUTPUT_FIELDS) as writer:
+        for idx, candidate in enumerate(iter_csv(INPUT_FILE), start=1):
+            if suppression_index.contains(candidate.get("url"), SCORING_REASONS):
+                continue
+            score_result = score_candidate(candidate)
+            result = _merge_result(candidate, score_result)
+            writer.write(result)
+            candidate_store.upsert_score(result, scorer="v1")
+            if result["decision"] == "send":
+                top.push(result["score"], result)
+            print(f"[{idx}] 📊 {result['name'] or '不明'}: {result['score']}点 | 判定: {'送信対象' if result['decision'] == 'send' else 'スキップ'}")
+
+    print(f"✅ 保存完了: {OUTPUT_FILE}")
+    send_targets_limited = top.sorted()
+    save_send_targets(send_targets_limited)
+
+    print(f"\n{'='*70}")
+    print(f"🎯 スコアリング完了サマリー（ストリーミング）")
+    print(f"{'='*70}")
+    print(f"総候補者数: {writer.rows} 件")
+    print(f"✅ 送信対象: {top.count} 件（{MIN_SCORE}点以上）")
+    print(f"   📌 今回送信: {len(send_targets_limited)} 件（上限: {MAX_SEND_COUNT}件）")
+    print(f"⚪ スキップ: {writer.rows - top.count} 件")
+    print(f"🗃️  {score_cache.summary()}")
+    print(f"🚫 {suppression_index.summary()}")
+    print(f"💰 {llm_metrics.summary('scoring_v1')}")
+    print(f"{'='*70}\n")
+
+    return len(send_targets_limited)
+
 # ==============================
 # エントリポイント
 # ==============================
 if __name__ == "__main__":
-    score_all_candidates()
+    require_api_key()
+    # 大量の候補者CSVは --stream で1件ずつ処理（メモリ一定）
+    if "--stream" in sys.argv[1:]:
+        score_stream()
+    else:
+        score_all_candidates()
@@ -2,10 +2,33 @@
 # OpenAI APIを使った詳細プロフィールのスコアリング（HR除外、年齢厳格化）
 
 import os
+import sys
 import csv
 import json
+import math
+import time
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from openai import OpenAI
+
+# aiagent をモジュールとして読み込めるようにする
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aiagent.score_cache import ScoreCache, make_key
+from aiagent.prefilter import prefilter
+from aiagent.age_estimator import age_facts, AGE_BASE_YEAR
+from aiagent.score_schema import (
+    SCORE_SCHEMA, BATCH_SCORE_SCHEMA, response_format, validate_score, validate_batch_item, finalize_score
+)
+from aiagent import batch_jobs
+from aiagent.checkpoint import CheckpointWriter, read_checkpoint, completed_urls
+from aiagent.llm_client import create_completion, get_client, llm_metrics, require_api_key, estimate_cost
+from aiagent.similarity_rank import rank_profiles
+from aiagent.streaming import iter_csv, CSVStreamWriter, TopK
+from aiagent.candidate_store import candidate_store
+from aiagent.suppression import suppression_index, SCORING_REASONS
+from aiagent.profile_diff import INCREMENTAL_SCORING, fingerprint, load_previous_csv, diff_profiles, diff_summary
 
 # ==============================
 # 設定
@@ -13,37 +36,52 @@ from openai import OpenAI
 load_dotenv()
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATA_DIR = os.path.join(BASE_DIR, "data")
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
 INPUT_FILE = os.path.join(DATA_DIR, "profile_details.csv")
 OUTPUT_FILE = os.path.join(DATA_DIR, "candidates_scored_v2.csv")
 MESSAGES_FILE = os.path.join(DATA_DIR, "messages_v2.csv")
+CHECKPOINT_FILE = os.path.join(DATA_DIR, "candidates_scored_v2.checkpoint.jsonl")  # 1件ごとの途中結果（--resume用）
+BATCH_DIR = os.path.join(DATA_DIR, "batch")
+BATCH_REQUESTS_FILE = os.path.join(BATCH_DIR, "scoring_requests.jsonl")  # Batch APIに投入するリクエスト
+BATCH_JOB_FILE = os.path.join(BATCH_DIR, "scoring_job.json")  # 投入済みジョブ（再開用）
 
 # OpenAI設定
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
+# 並列実行設定
+SCORING_CONCURRENCY = int(os.getenv("SCORING_CONCURRENCY", 4))  # 同時実行リクエスト数の上限
+SCORING_BATCH_SIZE = int(os.getenv("SCORING_BATCH_SIZE", 1))  # 1リクエストで評価する人数（1=バッチなし）
+
+# 構造化出力設定
+SCORING_RESPONSE_FORMAT = os.getenv("SCORING_RESPONSE_FORMAT", "json_schema")  # json_schema / json_object
+SCORING_SCHEMA_RETRIES = int(os.getenv("SCORING_SCHEMA_RETRIES", 2))  # スキーマ不一致時の再スコアリング回数
+
 # スコアリング基準
 MIN_SCORE = int(os.getenv("MIN_SCORE", 60))
 MAX_SEND_COUNT = int(os.getenv("MAX_SEND_COUNT", 50))  # テスト時は2
 
-# ==============================
-# OpenAIクライアント
-# ==============================
-if not OPENAI_API_KEY:
-    print("❌ エラー: OPENAI_API_KEYが設定されていません")
-    print("💡 .envファイルにOPENAI_API_KEYを設定してください")
-    exit(1)
+# カスケード（安価なモデルで全員を評価し、境界付近の候補者だけ OPENAI_MODEL で再評価）
+SCORING_CASCADE_MODEL = os.getenv("SCORING_CASCADE_MODEL", "")  # 一次評価に使うモデル（空=カスケードなし）
+SCORING_CASCADE_BAND = int(os.getenv("SCORING_CASCADE_BAND", 10))  # MIN_SCORE ± この点数の候補者を再評価
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+# スコアリング結果キャッシュ
+score_cache = ScoreCache()
 
 # ==============================
 # スコアリングプロンプト
 # ==============================
-SCORING_PROMPT = """
-あなたはIT業界のリクルーターです。以下の候補者の詳細プロフィールを分析して、スコアリングしてください。
+# プロンプトや出力項目を変更したら更新する（キャッシュキーに含まれる）
+SCORING_PROMPT_VERSION = "v2.3-prefix-cache"
+if AGE_BASE_YEAR != 2025:
+    # 年齢計算の基準年を変えると評価基準の文面も変わる
+    SCORING_PROMPT_VERSION += f"-age{AGE_BASE_YEAR}"
+if MIN_SCORE != 60:
+    # 判定の基準点も評価基準の文面に含まれる
+    SCORING_PROMPT_VERSION += f"-min{MIN_SCORE}"
+SCORING_FIELDS = ["name", "headline", "location", "is_premium", "experiences", "education", "skills"]
 
-【候補者情報】
-名前: {name}
+# 候補者情報（単体・バッチ共通）
+CANDIDATE_TEMPLATE = """名前: {name}
 ヘッドライン: {headline}
 場所: {location}
 LinkedIn Premium会員: {is_premium}
@@ -53,13 +91,16 @@ LinkedIn Premium会員: {is_premium}
 学歴:
 {education}
 
-スキル: {skills}
+推定年齢（学歴から算出済み）: {age_facts}
+
+スキル: {skills}"""
 
-【評価基準】
+# 評価基準（単体・バッチ共通）
+SCORING_CRITERIA = """【評価基準】
 
 1. 年齢評価（0-25点）
    - 学歴の卒業年から年齢を推定（大学卒業を22歳と仮定）
-   - 計算式: 現在年齢 = 2025年 - 卒業年 + 22歳
+   - 計算式: 現在年齢 = """ + str(AGE_BASE_YEAR) + """年 - 卒業年 + 22歳
    - 25-30歳: 25点
    - 31-35歳: 20点
    - 36-40歳: 15点
@@ -86,128 +127,500 @@ LinkedIn Premium会員: {is_premium}
    - IT業界と無関係（飲食、販売、製造、小売など）
    - 現在以下の企業に勤務している者:
      * フューチャー株式会社
-     * フューチャーアーキテクト株式会社
+     * フューチャーアーキテクト株式会社"""
+
+# 重要な注意事項（単体・バッチ共通）
+SCORING_NOTES = """【重要な注意事項】
+- LinkedIn Premium会員（is_premium: "True"または"yes"）は必ず除外（decision: "skip"、total_score: 0）
+- 41歳以上は必ず除外（decision: "skip"、total_score: 0）
+- 経営層（社長、CEO、取締役等）は必ず除外（decision: "skip"、total_score: 0）
+- HR・人材関係（リクルーター、採用担当等）は必ず除外（decision: "skip"、total_score: 0）
+- フューチャー株式会社またはフューチャーアーキテクト株式会社に現在勤務している者は必ず除外（decision: "skip"、total_score: 0）
+- 合計スコアが""" + str(MIN_SCORE) + """点以上の場合は "send"、それ未満は "skip"
+"""
+
+# 評価基準・注意事項・出力形式はすべて固定のシステムメッセージに置き、候補者情報だけを
+# ユーザーメッセージで送る。先頭が毎回同じになるため、API側のプロンプトキャッシュが効く
+SCORING_SYSTEM_PREFIX = """あなたはIT業界のリクルーターです。ユーザーが送る候補者の詳細プロフィールを分析して、スコアリングしてください。
 
+""" + SCORING_CRITERIA + """
+
+""" + SCORING_NOTES
+
+SCORING_SYSTEM_PROMPT = SCORING_SYSTEM_PREFIX + """
 【出力形式】
 以下のJSON形式で出力してください。他の説明は一切不要です。
 
-{{
+{
   "estimated_age": 推定年齢（数値、不明な場合はnull）,
   "age_reasoning": "年齢推定の根拠",
   "age_score": 年齢スコア（0-25）,
   "it_experience_score": IT経験スコア（0-40）,
   "position_score": ポジションスコア（-30 〜 +20）,
-  "total_score": 合計スコア（age_score + it_experience_score + position_score）,
+  "excluded": 除外条件に該当する場合はtrue、それ以外はfalse,
+  "total_score": 合計スコア（除外時は0、それ以外は age_score + it_experience_score + position_score）,
   "decision": "send" または "skip",
   "reason": "スコアリングの理由（簡潔に1-2文）"
-}}
+}"""
 
-【重要な注意事項】
-- LinkedIn Premium会員（is_premium: "True"または"yes"）は必ず除外（decision: "skip"、total_score: 0）
-- 41歳以上は必ず除外（decision: "skip"、total_score: 0）
-- 経営層（社長、CEO、取締役等）は必ず除外（decision: "skip"、total_score: 0）
-- HR・人材関係（リクルーター、採用担当等）は必ず除外（decision: "skip"、total_score: 0）
-- フューチャー株式会社またはフューチャーアーキテクト株式会社に現在勤務している者は必ず除外（decision: "skip"、total_score: 0）
-- 合計スコアが60点以上の場合は "send"、それ未満は "skip"
-"""
+# 複数候補者を1リクエストで評価する場合（評価基準の送信を1回にまとめる）
+BATCH_SCORING_SYSTEM_PROMPT = SCORING_SYSTEM_PREFIX + """
+【出力形式】
+ユーザーが複数の候補者を送った場合は、以下のJSON形式で results 配列に候補者1名につき1要素を出力してください。
+他の説明は一切不要です。"profile_url" には候補者一覧に記載されたプロフィールURLをそのまま記入してください。
+
+{
+  "results": [
+    {
+      "profile_url": "候補者のプロフィールURL",
+      "estimated_age": 推定年齢（数値、不明な場合はnull）,
+      "age_reasoning": "年齢推定の根拠",
+      "age_score": 年齢スコア（0-25）,
+      "it_experience_score": IT経験スコア（0-40）,
+      "position_score": ポジションスコア（-30 〜 +20）,
+      "excluded": 除外条件に該当する場合はtrue、それ以外はfalse,
+      "total_score": 合計スコア（除外時は0、それ以外は age_score + it_experience_score + position_score）,
+      "decision": "send" または "skip",
+      "reason": "スコアリングの理由（簡潔に1-2文）"
+    }
+  ]
+}"""
+
+# 候補者ごとに変わる部分（ユーザーメッセージ）
+CANDIDATE_MESSAGE = """【候補者情報】
+{candidate}"""
+
+BATCH_CANDIDATES_MESSAGE = """【候補者一覧】（{count}名）
+{candidates}"""
 
 # ==============================
-# 候補者スコアリング
+# レスポンス解析
 # ==============================
-def score_candidate(candidate):
-    """OpenAI APIで候補者をスコアリング"""
+RESULT_FIELDS = [
+    "estimated_age", "age_reasoning", "age_score", "it_experience_score",
+    "position_score", "excluded", "total_score", "decision", "reason"
+]
 
-    name = candidate.get("name", "不明")
-    headline = candidate.get("headline", "情報なし")
-    location = candidate.get("location", "情報なし")
+
+def _to_result(item, facts):
+    """
+    検証済みの応答からスコアリング結果を作る
+
+    年齢・年齢スコアはローカルで算出済みの値を優先し、合計点と判定はローカルで再計算する。
+    """
+    result = {field: item[field] for field in RESULT_FIELDS}
+    if facts["age_score"] is not None:
+        result["estimated_age"] = facts["estimated_age"]
+        result["age_score"] = facts["age_score"]
+    return finalize_score(result, MIN_SCORE)
+
+
+def _error_result(age_reasoning, reason, latency_ms):
+    """スコアリングできなかった場合の結果（キャッシュしない）"""
+    return {
+        "estimated_age": None,
+        "age_reasoning": age_reasoning,
+        "age_score": 0,
+        "it_experience_score": 0,
+        "position_score": 0,
+        "total_score": 0,
+        "decision": "skip",
+        "reason": reason,
+        "latency_ms": latency_ms,
+        "error": True
+    }
+
+
+def _request_body(system_prompt, user_content, schema_name, schema, max_tokens, model=None):
+    """chat.completions のリクエスト内容（通常呼び出し・Batch API共通）"""
+    return {
+        "model": model or OPENAI_MODEL,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_content}
+        ],
+        "temperature": 0.3,
+        "max_tokens": max_tokens,
+        "response_format": response_format(schema_name, schema, SCORING_RESPONSE_FORMAT)
+    }
+
+
+def _request_json(system_prompt, user_content, schema_name, schema, max_tokens, model=None, stage="scoring"):
+    """構造化出力でスコアリングを依頼し、応答JSONを返す"""
+    body = _request_body(system_prompt, user_content, schema_name, schema, max_tokens, model)
+    response = create_completion(stage, **body)
+    return json.loads(response.choices[0].message.content)
+
+
+def _describe_age(facts):
+    """ローカルで算出した年齢をプロンプトに渡す既知の事実として記述"""
+    if facts["estimated_age"] is None:
+        return "算出不可（卒業年の記載なし。職歴から推定してください）"
+    if facts["age_score"] is None:
+        return f"{facts['estimated_age']}歳（{facts['graduation_year']}年卒。この年齢をそのまま使用してください）"
+    return (f"{facts['estimated_age']}歳（{facts['graduation_year']}年卒、age_score: {facts['age_score']}。"
+            f"この値をそのまま使用してください）")
+
+
+def _format_candidate(candidate, facts=None):
+    """候補者情報をプロンプト用の文字列に整形"""
+    facts = facts or age_facts(candidate.get("education"))
     is_premium = candidate.get("is_premium", False)
     # BooleanをYes/Noに変換
     is_premium_str = "yes" if str(is_premium).lower() in ['true', 'yes', '1'] else "no"
-    experiences = candidate.get("experiences", "情報なし")
-    education = candidate.get("education", "情報なし")
-    skills = candidate.get("skills", "情報なし")
-
-    # プロンプト生成
-    prompt = SCORING_PROMPT.format(
-        name=name,
-        headline=headline,
-        location=location,
+    return CANDIDATE_TEMPLATE.format(
+        name=candidate.get("name", "不明"),
+        headline=candidate.get("headline", "情報なし"),
+        location=candidate.get("location", "情報なし"),
         is_premium=is_premium_str,
-        experiences=experiences,
-        education=education,
-        skills=skills
+        experiences=candidate.get("experiences", "情報なし"),
+        education=candidate.get("education", "情報なし"),
+        age_facts=_describe_age(facts),
+        skills=candidate.get("skills", "情報なし")
     )
 
-    try:
-        # OpenAI API呼び出し
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": "あなたはIT業界のリクルーターです。JSON形式で出力してください。"},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=400
-        )
-
-        # レスポンス解析
-        content = response.choices[0].message.content.strip()
-
-        # JSON抽出（```json ... ```で囲まれている場合も対応）
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0].strip()
-
-        result = json.loads(content)
-
-        return {
-            "estimated_age": result.get("estimated_age"),
-            "age_reasoning": result.get("age_reasoning", ""),
-            "age_score": result.get("age_score", 0),
-            "it_experience_score": result.get("it_experience_score", 0),
-            "position_score": result.get("position_score", 0),
-            "total_score": result.get("total_score", 0),
-            "decision": result.get("decision", "skip"),
-            "reason": result.get("reason", "")
-        }
-
-    except json.JSONDecodeError as e:
-        print(f"⚠️ JSON解析エラー ({name}): {e}")
-        print(f"   レスポンス: {content}")
-        return {
-            "estimated_age": None,
-            "age_reasoning": "解析エラー",
-            "age_score": 0,
-            "it_experience_score": 0,
-            "position_score": 0,
-            "total_score": 0,
-            "decision": "skip",
-            "reason": "AIレスポンスの解析に失敗"
-        }
-    except Exception as e:
-        print(f"⚠️ APIエラー ({name}): {e}")
-        return {
-            "estimated_age": None,
-            "age_reasoning": "エラー",
-            "age_score": 0,
-            "it_experience_score": 0,
-            "position_score": 0,
-            "total_score": 0,
-            "decision": "skip",
-            "reason": f"APIエラー: {str(e)}"
-        }
+# ==============================
+# 候補者スコアリング
+# ==============================
+def score_candidate(candidate):
+    """候補者をスコアリング（ルール除外・キャッシュにあればAPIを呼ばない）"""
+
+    excluded = prefilter(candidate)
+    if excluded is not None:
+        return {**excluded, "latency_ms": 0}
+
+    key = make_key(OPENAI_MODEL, SCORING_PROMPT_VERSION, candidate, SCORING_FIELDS)
+    cached = _cached(candidate, key)
+    if cached is not None:
+        return {**cached, "latency_ms": 0, "cached": True}
+
+    if SCORING_CASCADE_MODEL:
+        return _settle(candidate, key, _score_with_api(candidate, SCORING_CASCADE_MODEL, "scoring_cascade"))
+    return _settle(candidate, key, _score_with_api(candidate))
+
+
+# カスケードの件数（一次評価した人数、OPENAI_MODEL で再評価した人数）
+cascade_counts = {"first": 0, "escalated": 0}
+_cascade_lock = threading.Lock()
+
+
+def cascade_summary():
+    """
+    カスケードの再評価件数と、全員を OPENAI_MODEL で評価した場合と比べた削減量（サマリー表示用、無効ならNone）
+
+    全員を OPENAI_MODEL で評価した場合のコストは一次評価の入出力トークン数を OPENAI_MODEL の料金で、
+    API待ち時間は再評価1回あたりの平均 × 一次評価の回数で見積もる。
+    """
+    first = llm_metrics.stages.get("scoring_cascade", {})
+    strong = llm_metrics.stages.get("scoring", {})
+    if not SCORING_CASCADE_MODEL or not cascade_counts["first"]:
+        return None
+
+    rate = cascade_counts["escalated"] / cascade_counts["first"] * 100
+    lines = [f"カスケード: {SCORING_CASCADE_MODEL} で {cascade_counts['first']} 件を一次評価 → "
+             f"{OPENAI_MODEL} で再評価 {cascade_counts['escalated']} 件（{rate:.0f}%、{MIN_SCORE}±{SCORING_CASCADE_BAND}点）"]
+
+    actual_cost = first.get("cost_usd", 0) + strong.get("cost_usd", 0)
+    baseline_cost = estimate_cost(OPENAI_MODEL, first.get("prompt_tokens", 0),
+                                  first.get("completion_tokens", 0), first.get("cached_tokens", 0),
+                                  first.get("cache_write_tokens", 0))
+    if baseline_cost is not None:
+        lines.append(f"推定コスト ${actual_cost:.4f}（全件 {OPENAI_MODEL} の場合 ${baseline_cost:.4f}、"
+                     f"削減 ${baseline_cost - actual_cost:.4f}）")
+
+    actual_latency = first.get("latency_ms", 0) + strong.get("latency_ms", 0)
+    if strong.get("calls"):
+        baseline_latency = strong["latency_ms"] / strong["calls"] * first.get("calls", 0)
+        lines.append(f"API待ち時間 合計 {actual_latency / 1000:.1f}秒（全件 {OPENAI_MODEL} の場合 約{baseline_latency / 1000:.1f}秒、"
+                     f"削減 約{(baseline_latency - actual_latency) / 1000:.1f}秒）")
+    return "\n   ".join(lines)
+
+
+def _cascade_key(candidate):
+    """カスケードの一次評価で確定した結果のキャッシュキー（再評価の範囲が変われば別のキー）"""
+    label = f"{SCORING_CASCADE_MODEL}|cascade:{MIN_SCORE}±{SCORING_CASCADE_BAND}"
+    return make_key(label, SCORING_PROMPT_VERSION, candidate, SCORING_FIELDS)
+
+
+def _cached(candidate, key):
+    """
+    キャッシュ済みの結果（OPENAI_MODEL の結果を優先し、カスケード有効時は一次評価で確定した結果も使う）
+
+    キャッシュキーに MIN_SCORE を含めないため、合計点と判定は参照のたびに今回の MIN_SCORE で再計算する。
+    """
+    keys = [key, _cascade_key(candidate)] if SCORING_CASCADE_MODEL else [key]
+    cached = score_cache.get_first(keys)  # ヒット・ミスは候補者ごとに1回として数える
+    return finalize_score(cached, MIN_SCORE) if cached is not None else None
+
+
+def _settle(candidate, key, first):
+    """
+    APIの評価結果から最終結果を決めてキャッシュする
+
+    カスケード有効時は first が一次評価（SCORING_CASCADE_MODEL）の結果で、
+    合計点が MIN_SCORE ± SCORING_CASCADE_BAND に入る候補者と一次評価に失敗した候補者だけを
+    OPENAI_MODEL で再評価する。エラー時の結果はキャッシュしない（次回再スコアリングする）。
+    """
+    result = first
+    if SCORING_CASCADE_MODEL:
+        escalate = first.get("error") or abs(first["total_score"] - MIN_SCORE) <= SCORING_CASCADE_BAND
+        with _cascade_lock:
+            cascade_counts["first"] += 1
+            cascade_counts["escalated"] += 1 if escalate else 0
+        if not escalate:
+            score_cache.put(_cascade_key(candidate), {k: v for k, v in first.items() if k != "latency_ms"})
+            return {**first, "escalated": False}
+        result = _score_with_api(candidate)
+        result = {**result, "latency_ms": first.get("latency_ms", 0) + result["latency_ms"], "escalated": True}
+
+    if not result.get("error"):
+        score_cache.put(key, {k: v for k, v in result.items() if k not in ("latency_ms", "escalated")})
+    return result
+
+
+def _score_with_api(candidate, model=None, stage="scoring"):
+    """LLM APIで候補者をスコアリング（スキーマに一致しない応答は再スコアリング）"""
+
+    name = candidate.get("name", "不明")
+    facts = age_facts(candidate.get("education"))
+
+    # 候補者ごとに変わるのはユーザーメッセージのみ
+    user_content = CANDIDATE_MESSAGE.format(candidate=_format_candidate(candidate, facts))
+
+    started = time.perf_counter()
+
+    for attempt in range(SCORING_SCHEMA_RETRIES + 1):
+        try:
+            item = _request_json(SCORING_SYSTEM_PROMPT, user_content, "candidate_score", SCORE_SCHEMA, 400, model, stage)
+            errors = validate_score(item)
+        except json.JSONDecodeError as e:
+            errors = [f"JSON解析エラー: {e}"]
+        except Exception as e:
+            # 429/5xxは create_completion 内でリトライ済み
+            print(f"⚠️ APIエラー ({name}): {e}")
+            return _error_result("エラー", f"APIエラー: {str(e)}", int((time.perf_counter() - started) * 1000))
+
+        if not errors:
+            return {**_to_result(item, facts), "latency_ms": int((time.perf_counter() - started) * 1000)}
+
+        print(f"⚠️ スキーマ不一致 ({name}, {attempt + 1}/{SCORING_SCHEMA_RETRIES + 1}回目): {'; '.join(errors[:3])}")
+
+    return _error_result("解析エラー", "AIレスポンスがスキーマに一致しません", int((time.perf_counter() - started) * 1000))
+
+# ==============================
+# バッチスコアリング（複数候補者を1リクエストで評価）
+# ==============================
+def score_batch(candidates):
+    """
+    複数の候補者を1リクエストでスコアリング
+
+    ルール除外・キャッシュ済みの候補者はAPIに送らない。レスポンスはプロフィールURLで
+    突き合わせ、欠落・不正な要素の候補者だけを単体で再スコアリングする。
+    カスケード有効時はバッチを SCORING_CASCADE_MODEL で評価し、境界付近の候補者だけを個別に再評価する。
+
+    Args:
+        candidates: 候補者dictのリスト
+
+    Returns:
+        list: candidates と同じ順序のスコアリング結果
+    """
+    results = [None] * len(candidates)
+    keys = [make_key(OPENAI_MODEL, SCORING_PROMPT_VERSION, c, SCORING_FIELDS) for c in candidates]
+
+    # キャッシュ済み、またはURLで突き合わせできない候補者はバッチに含めない
+    batch_indexes = []
+    seen_urls = set()
+    for i, (candidate, key) in enumerate(zip(candidates, keys)):
+        excluded = prefilter(candidate)
+        if excluded is not None:
+            results[i] = {**excluded, "latency_ms": 0}
+            continue
+        cached = _cached(candidate, key)
+        if cached is not None:
+            results[i] = {**cached, "latency_ms": 0, "cached": True}
+            continue
+        url = candidate.get("profile_url", "")
+        if url and url not in seen_urls:
+            seen_urls.add(url)
+            batch_indexes.append(i)
+
+    if len(batch_indexes) == 1:
+        i = batch_indexes[0]
+        results[i] = score_candidate(candidates[i])
+    elif batch_indexes:
+        blocks = [
+            f"--- 候補者{n} ---\nプロフィールURL: {candidates[i]['profile_url']}\n{_format_candidate(candidates[i])}"
+            for n, i in enumerate(batch_indexes, start=1)
+        ]
+        user_content = BATCH_CANDIDATES_MESSAGE.format(count=len(batch_indexes), candidates="\n\n".join(blocks))
+
+        started = time.perf_counter()
+        items = []
+        try:
+            payload = _request_json(BATCH_SCORING_SYSTEM_PROMPT, user_content, "candidate_scores",
+                                    BATCH_SCORE_SCHEMA, 400 * len(batch_indexes), SCORING_CASCADE_MODEL or None,
+                                    "scoring_cascade" if SCORING_CASCADE_MODEL else "scoring")
+            if isinstance(payload, dict) and isinstance(payload.get("results"), list):
+                items = payload["results"]
+        except Exception as e:
+            print(f"⚠️ バッチスコアリングエラー（{len(batch_indexes)}件を個別に再スコアリング）: {e}")
+        latency_ms = int((time.perf_counter() - started) * 1000)
+
+        # 妥当な要素だけを採用し、それ以外の候補者だけを個別に再スコアリングする
+        by_url = {item["profile_url"]: item for item in items if not validate_batch_item(item)}
+        retry_count = 0
+        for i in batch_indexes:
+            item = by_url.get(candidates[i]["profile_url"])
+            if item is not None:
+                result = _to_result(item, age_facts(candidates[i].get("education")))
+                results[i] = _settle(candidates[i], keys[i], {**result, "latency_ms": latency_ms})
+            else:
+                retry_count += 1
+                results[i] = score_candidate(candidates[i])
+
+        if retry_count and items:
+            print(f"⚠️ バッチ応答の欠落・不正 {retry_count}/{len(batch_indexes)} 件を個別に再スコアリングしました")
+
+    # URL重複などでバッチ対象外になった候補者
+    for i, candidate in enumerate(candidates):
+        if results[i] is None:
+            results[i] = score_candidate(candidate)
+
+    return results
+
+# ==============================
+# 並列スコアリング
+# ==============================
+def _chunked(iterable, size):
+    """イテラブルを size 件ずつのリストに分割"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _score_chunk(chunk):
+    """1件ずつのスコアリングをチャンク単位のインターフェースに合わせる"""
+    return [score_candidate(candidate) for candidate in chunk]
+
+
+def score_in_order(candidates, concurrency=SCORING_CONCURRENCY, batch_size=SCORING_BATCH_SIZE):
+    """
+    候補者を最大 concurrency リクエスト並列でスコアリングし、入力順に結果を返す
+
+    同時に実行するリクエストは concurrency 件までに制限し、
+    完了順ではなく入力順に yield するため出力CSVの順序は常に一定になる。
+    batch_size が2以上の場合は batch_size 人ずつ1リクエストにまとめる。
+
+    Args:
+        candidates: 候補者dictのイテラブル
+        concurrency: 同時実行リクエスト数の上限
+        batch_size: 1リクエストで評価する人数
+
+    Yields:
+        tuple: (candidate, score_result)
+    """
+    task = score_batch if batch_size > 1 else _score_chunk
+    chunks = _chunked(candidates, max(1, batch_size))
+
+    if concurrency <= 1:
+        for chunk in chunks:
+            yield from zip(chunk, task(chunk))
+        return
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = []
+        for chunk in chunks:
+            pending.append((chunk, executor.submit(task, chunk)))
+            # 同時実行はワーカー数で制限される。投入済みの待ち行列は2倍までに抑え、
+            # 先頭が遅くても他のワーカーが空かないようにする
+            if len(pending) >= concurrency * 2:
+                head, future = pending.pop(0)
+                yield from zip(head, future.result())
+        for chunk, future in pending:
+            yield from zip(chunk, future.result())
+
+
+def _percentile(values, pct):
+    """昇順ソート済みリストのパーセンタイル（最近傍法）"""
+    if not values:
+        return 0
+    index = max(0, math.ceil(pct / 100 * len(values)) - 1)
+    return values[index]
+
+def fingerprint_version():
+    """フィンガープリントに含める評価条件（モデル・プロンプト版・最低スコアが変わったら前回の結果を引き継がない）"""
+    return f"{OPENAI_MODEL}|{SCORING_CASCADE_MODEL}|{SCORING_PROMPT_VERSION}|{MIN_SCORE}"
+
+# ==============================
+# 結果保存
+# ==============================
+# 結果CSVの列
+OUTPUT_FIELDS = ["name", "profile_url", "headline", "location",
+                 "estimated_age", "age_reasoning", "age_score",
+                 "it_experience_score", "position_score", "total_score",
+                 "decision", "reason", "fingerprint"]
+
+
+def save_results(records):
+    """
+    スコアリング結果CSVと送信対象リストを保存
+
+    結果は1件ずつ読みながらCSVに書き出し、送信対象はスコア上位 MAX_SEND_COUNT 件だけを
+    ヒープで保持する（全件をメモリに載せない）。
+
+    Args:
+        records: 結果dictのイテラブル（チェックポイントから逐次読み出す）
+
+    Returns:
+        tuple: (全件数, 送信対象の件数, スコア降順の送信対象（上限適用後）)
+    """
+    top = TopK(MAX_SEND_COUNT)
+
+    with CSVStreamWriter(OUTPUT_FILE, OUTPUT_FIELDS) as writer:
+        for record in records:
+            writer.write(record)
+            if record["decision"] == "send":
+                top.push(record["total_score"], record)
+
+    print(f"✅ 保存完了: {OUTPUT_FILE}")
+
+    send_targets_limited = top.sorted()
+    save_send_targets(send_targets_limited)
+    return writer.rows, top.count, send_targets_limited
+
+
+def save_send_targets(send_targets):
+    """送信対象リスト（スコア降順、上限件数まで）を保存"""
+    if not send_targets:
+        return
+    with open(MESSAGES_FILE, "w", newline="", encoding="utf-8") as f:
+        fieldnames = ["name", "profile_url", "total_score"]
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for target in send_targets:
+            writer.writerow({
+                "name": target["name"],
+                "profile_url": target["profile_url"],
+                "total_score": target["total_score"]
+            })
+
+    print(f"✅ 送信対象リストを保存: {MESSAGES_FILE}")
 
 # ==============================
 # メイン処理
 # ==============================
-def score_all_candidates():
-    """全候補者をスコアリング"""
+def load_candidates():
+    """プロフィール詳細CSVを読み込む（ファイルがない・空の場合はNone）"""
 
     if not os.path.exists(INPUT_FILE):
         print(f"❌ エラー: プロフィール詳細ファイルが見つかりません: {INPUT_FILE}")
         print(f"💡 先に linkedin_get_profiles.py を実行してください")
-        return
+        return None
 
     # CSV読み込み
     with open(INPUT_FILE, "r", encoding="utf-8") as f:
@@ -216,111 +629,155 @@ def score_all_candidates():
 
     if not candidates:
         print("⚠️ 候補者データが空です")
+        return None
+
+    # 理想の候補者像に近い順に並べる（SIMILARITY_MIN / SIMILARITY_TOP_K でAPI呼び出し前に絞り込み）
+    return rank_profiles(candidates)
+
+
+def _merge_result(candidate, score_result):
+    """プロフィールとスコアリング結果を結果CSVの1行にまとめる"""
+    return {
+        "name": candidate.get("name", ""),
+        "profile_url": candidate.get("profile_url", ""),
+        "headline": candidate.get("headline", ""),
+        "location": candidate.get("location", ""),
+        "estimated_age": score_result["estimated_age"],
+        "age_reasoning": score_result["age_reasoning"],
+        "age_score": score_result["age_score"],
+        "it_experience_score": score_result["it_experience_score"],
+        "position_score": score_result["position_score"],
+        "total_score": score_result["total_score"],
+        "decision": score_result["decision"],
+        "reason": score_result["reason"],
+        # 失敗した結果は引き継がない（次回も再スコアリングする）
+        "fingerprint": "" if score_result.get("error") else fingerprint(candidate, fingerprint_version())
+    }
+
+
+def _print_result(progress, candidate, score_result):
+    """1件分のスコアリング結果を表示"""
+    name = candidate.get("name", "不明")
+    if score_result.get("prefiltered"):
+        print(f"[{progress}] 📊 {name} をスコアリング完了 (ルール除外)")
+    elif score_result.get("cached"):
+        print(f"[{progress}] 📊 {name} をスコアリング完了 (キャッシュ)")
+    else:
+        print(f"[{progress}] 📊 {name} をスコアリング完了 ({score_result['latency_ms']}ms)")
+
+    total_score = score_result["total_score"]
+    age = score_result["estimated_age"]
+    if score_result["decision"] == "send":
+        print(f"   ✅ スコア: {total_score}点 (年齢{score_result['age_score']} + IT{score_result['it_experience_score']} + 役職{score_result['position_score']}) | 推定年齢: {age}歳 | 判定: 送信対象")
+    else:
+        print(f"   ⚪ スコア: {total_score}点 | 推定年齢: {age}歳 | 判定: スキップ")
+    print(f"   理由: {score_result['reason']}\n")
+
+
+def score_all_candidates(concurrency=SCORING_CONCURRENCY, batch_size=SCORING_BATCH_SIZE, resume=False):
+    """
+    全候補者をスコアリング
+
+    結果は1件ごとにチェックポイントへ追記し、最終的なCSVはチェックポイントから生成する。
+    resume=True なら前回のチェックポイントに記録済みの候補者（プロフィールURL）を飛ばして続きから実行する。
+    """
+
+    candidates = load_candidates()
+    if candidates is None:
         return
 
+    done_urls = completed_urls(CHECKPOINT_FILE) if resume else set()
+    pending = [c for c in candidates if c.get("profile_url") not in done_urls]
+    resumed_count = len(candidates) - len(pending)
+
+    # メッセージ送信済み・配信停止の候補者はスコアリングしない
+    pending = [c for c in pending if not suppression_index.contains(c.get("profile_url"), SCORING_REASONS)]
+    suppressed_count = len(candidates) - resumed_count - len(pending)
+
+    # 前回の結果とフィンガープリントが一致する候補者は再スコアリングせず結果を引き継ぐ
+    carried = []
+    diff_counts = None
+    if INCREMENTAL_SCORING:
+        pending, carried, diff_counts = diff_profiles(pending, load_previous_csv(OUTPUT_FILE), fingerprint_version())
+
     total = len(candidates)
     print(f"\n{'='*70}")
     print(f"🧠 AIスコアリング開始（詳細プロフィール版）")
     print(f"{'='*70}")
     print(f"候補者数: {total} 件")
     print(f"使用モデル: {OPENAI_MODEL}")
+    if SCORING_CASCADE_MODEL:
+        print(f"カスケード: {SCORING_CASCADE_MODEL} で一次評価 → {MIN_SCORE}±{SCORING_CASCADE_BAND}点のみ {OPENAI_MODEL} で再評価")
+    print(f"同時実行数: {concurrency}")
+    print(f"バッチサイズ: {batch_size} 人/リクエスト")
     print(f"最低スコア: {MIN_SCORE} 点")
     print(f"除外条件: 41歳以上、経営層、HR職種")
+    if resume:
+        print(f"再開: チェックポイント記録済み {resumed_count} 件をスキップ")
+    if suppressed_count:
+        print(f"除外リスト該当: {suppressed_count} 件をスキップ（送信済み・配信停止）")
+    if diff_counts:
+        print(diff_summary(diff_counts))
     print(f"{'='*70}\n")
 
-    results = []
-    send_count = 0
-    skip_count = 0
-
-    for idx, candidate in enumerate(candidates, start=1):
-        name = candidate.get("name", "不明")
-        print(f"[{idx}/{total}] 📊 {name} をスコアリング中...")
-
-        # スコアリング実行
-        score_result = score_candidate(candidate)
-
-        # 結果を統合
-        result = {
-            "name": candidate.get("name", ""),
-            "profile_url": candidate.get("profile_url", ""),
-            "headline": candidate.get("headline", ""),
-            "location": candidate.get("location", ""),
-            "estimated_age": score_result["estimated_age"],
-            "age_reasoning": score_result["age_reasoning"],
-            "age_score": score_result["age_score"],
-            "it_experience_score": score_result["it_experience_score"],
-            "position_score": score_result["position_score"],
-            "total_score": score_result["total_score"],
-            "decision": score_result["decision"],
-            "reason": score_result["reason"]
-        }
-
-        results.append(result)
-
-        # 結果表示
-        total_score = score_result["total_score"]
-        decision = score_result["decision"]
-        age = score_result["estimated_age"]
-
-        if decision == "send":
-            send_count += 1
-            print(f"   ✅ スコア: {total_score}点 (年齢{score_result['age_score']} + IT{score_result['it_experience_score']} + 役職{score_result['position_score']}) | 推定年齢: {age}歳 | 判定: 送信対象")
-        else:
-            skip_count += 1
-            print(f"   ⚪ スコア: {total_score}点 | 推定年齢: {age}歳 | 判定: スキップ")
-
-        print(f"   理由: {score_result['reason']}\n")
+    latencies = []
+    prefiltered_count = 0
+    started = time.perf_counter()
+    scored = enumerate(score_in_order(pending, concurrency, batch_size), start=total - len(pending) + 1)
+
+    with CheckpointWriter(CHECKPOINT_FILE, resume=resume) as checkpoint:
+        for _, record in carried:
+            checkpoint.append(record)
+            candidate_store.upsert_score(record)
+            suppression_index.record_score(record["profile_url"], record["decision"])
+
+        for idx, (candidate, score_result) in scored:
+            if score_result.get("prefiltered"):
+                prefiltered_count += 1
+            elif not score_result.get("cached"):
+                latencies.append(score_result["latency_ms"])
+            _print_result(f"{idx}/{total}", candidate, score_result)
+            result = _merge_result(candidate, score_result)
+            checkpoint.append(result)
+            candidate_store.upsert_score(result)
+            if not score_result.get("error"):
+                suppression_index.record_score(result["profile_url"], result["decision"])
+
+    elapsed = time.perf_counter() - started
 
     # CSV保存（全候補者）
     print(f"\n{'='*70}")
     print(f"💾 スコアリング結果を保存中...")
     print(f"{'='*70}")
 
-    with open(OUTPUT_FILE, "w", newline="", encoding="utf-8") as f:
-        fieldnames = ["name", "profile_url", "headline", "location",
-                      "estimated_age", "age_reasoning", "age_score",
-                      "it_experience_score", "position_score", "total_score",
-                      "decision", "reason"]
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(results)
-
-    print(f"✅ 保存完了: {OUTPUT_FILE}")
-
-    # 送信対象を抽出（スコア順でソート）
-    send_targets = [r for r in results if r["decision"] == "send"]
-    send_targets.sort(key=lambda x: x["total_score"], reverse=True)  # スコア降順
-
-    # 上限件数まで絞り込み
-    send_targets_limited = send_targets[:MAX_SEND_COUNT]
-
-    # 送信対象リストを保存
-    if send_targets_limited:
-        with open(MESSAGES_FILE, "w", newline="", encoding="utf-8") as f:
-            fieldnames = ["name", "profile_url", "total_score"]
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            for target in send_targets_limited:
-                writer.writerow({
-                    "name": target["name"],
-                    "profile_url": target["profile_url"],
-                    "total_score": target["total_score"]
-                })
-
-        print(f"✅ 送信対象リストを保存: {MESSAGES_FILE}")
+    row_count, send_count, send_targets_limited = save_results(read_checkpoint(CHECKPOINT_FILE))
 
     # サマリー
+    latencies.sort()
     print(f"\n{'='*70}")
     print(f"🎯 スコアリング完了サマリー")
     print(f"{'='*70}")
-    print(f"総候補者数: {total} 件")
-    print(f"✅ 送信対象: {len(send_targets)} 件（{MIN_SCORE}点以上）")
-    if len(send_targets) > MAX_SEND_COUNT:
+    print(f"総候補者数: {row_count} 件")
+    print(f"✅ 送信対象: {send_count} 件（{MIN_SCORE}点以上）")
+    if send_count > MAX_SEND_COUNT:
         print(f"   📌 今回送信: {len(send_targets_limited)} 件（上限: {MAX_SEND_COUNT}件）")
-        print(f"   ⏭️  次回送信: {len(send_targets) - MAX_SEND_COUNT} 件")
+        print(f"   ⏭️  次回送信: {send_count - MAX_SEND_COUNT} 件")
     else:
         print(f"   📌 今回送信: {len(send_targets_limited)} 件")
-    print(f"⚪ スキップ: {skip_count} 件")
+    print(f"⚪ スキップ: {row_count - send_count} 件")
+    print(f"🚫 ルール除外: {prefiltered_count} 件（API呼び出し {prefiltered_count} 回を削減）")
+    if diff_counts:
+        print(f"♻️  前回の結果を引き継ぎ: {len(carried)} 件（プロフィール変更なし）")
+    print(f"⏱️  所要時間: {elapsed:.1f}秒（同時実行数: {concurrency}）")
+    if latencies:
+        print(f"   レイテンシ: 平均 {sum(latencies) / len(latencies):.0f}ms / p50 {_percentile(latencies, 50)}ms / p95 {_percentile(latencies, 95)}ms / 最大 {latencies[-1]}ms")
+    print(f"🗃️  {score_cache.summary()}")
+    print(f"🚫 {suppression_index.summary()}")
+    print(f"💰 {llm_metrics.summary('scoring')}")
+    cascade = cascade_summary()
+    if cascade:
+        print(f"💰 一次評価 {llm_metrics.summary('scoring_cascade')}")
+        print(f"🪜 {cascade}")
     print(f"{'='*70}\n")
 
     if send_targets_limited:
@@ -330,8 +787,274 @@ def score_all_candidates():
 
     return len(send_targets_limited)
 
+def score_stream(concurrency=SCORING_CONCURRENCY, batch_size=SCORING_BATCH_SIZE):
+    """
+    全候補者をストリーミングでスコアリング（入力件数によらずメモリ一定）
+
+    読み込み → ルール除外・スコアリング → 書き出し を1件ずつ流し、結果CSVは逐次flushする。
+    送信対象はスコア上位 MAX_SEND_COUNT 件だけをヒープで保持する。
+    全件を比較する類似度ランキング・差分判定と、チェックポイントからの再開は行わない。
+    """
+
+    if not os.path.exists(INPUT_FILE):
+        print(f"❌ エラー: プロフィール詳細ファイルが見つかりません: {INPUT_FILE}")
+        print(f"💡 先に linkedin_get_profiles.py を実行してください")
+        return
+
+    print(f"\n{'='*70}")
+    print(f"🧠 AIスコアリング開始（ストリーミング）")
+    print(f"{'='*70}")
+    print(f"入力: {INPUT_FILE}")
+    print(f"使用モデル: {OPENAI_MODEL}")
+    if SCORING_CASCADE_MODEL:
+        print(f"カスケード: {SCORING_CASCADE_MODEL} で一次評価 → {MIN_SCORE}±{SCORING_CASCADE_BAND}点のみ {OPENAI_MODEL} で再評価")
+    print(f"同時実行数: {concurrency}")
+    print(f"バッチサイズ: {batch_size} 人/リクエスト")
+    print(f"最低スコア: {MIN_SCORE} 点")
+    print(f"{'='*70}\n")
+
+    top = TopK(MAX_SEND_COUNT)
+    suppressed_count = 0
+    prefiltered_count = 0
+    api_count = 0
+    latency_total = 0
+    latency_max = 0
+    started = time.perf_counter()
+
+    def unsuppressed(rows):
+        """メッセージ送信済み・配信停止の候補者を読み飛ばす"""
+        nonlocal suppressed_count
+        for row in rows:
+            if suppression_index.contains(row.get("profile_url"), SCORING_REASONS):
+                suppressed_count += 1
+                continue
+            yield row
+
+    with CSVStreamWriter(OUTPUT_FILE, OUTPUT_FIELDS) as writer:
+        rows = unsuppressed(iter_csv(INPUT_FILE))
+        for idx, (candidate, score_result) in enumerate(score_in_order(rows, concurrency, batch_size), start=1):
+            if score_result.get("prefiltered"):
+                prefiltered_count += 1
+            elif not score_result.get("cached"):
+                api_count += 1
+                latency_total += score_result["latency_ms"]
+                latency_max = max(latency_max, score_result["latency_ms"])
+            _print_result(idx, candidate, score_result)
+
+            result = _merge_result(candidate, score_result)
+            writer.write(result)
+            candidate_store.upsert_score(result)
+            if not score_result.get("error"):
+                suppression_index.record_score(result["profile_url"], result["decision"])
+            if result["decision"] == "send":
+                top.push(result["total_score"], result)
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ 保存完了: {OUTPUT_FILE}")
+    send_targets_limited = top.sorted()
+    save_send_targets(send_targets_limited)
+
+    print(f"\n{'='*70}")
+    print(f"🎯 スコアリング完了サマリー（ストリーミング）")
+    print(f"{'='*70}")
+    print(f"総候補者数: {writer.rows} 件")
+    print(f"✅ 送信対象: {top.count} 件（{MIN_SCORE}点以上）")
+    print(f"   📌 今回送信: {len(send_targets_limited)} 件（上限: {MAX_SEND_COUNT}件）")
+    print(f"⚪ スキップ: {writer.rows - top.count} 件")
+    print(f"🚫 ルール除外: {prefiltered_count} 件（API呼び出し {prefiltered_count} 回を削減）")
+    print(f"🚫 除外リスト該当: {suppressed_count} 件（送信済み・配信停止）")
+    print(f"⏱️  所要時間: {elapsed:.1f}秒（同時実行数: {concurrency}）")
+    if api_count:
+        print(f"   レイテンシ: 平均 {latency_total / api_count:.0f}ms / 最大 {latency_max}ms")
+    print(f"🗃️  {score_cache.summary()}")
+    print(f"💰 {llm_metrics.summary('scoring')}")
+    cascade = cascade_summary()
+    if cascade:
+        print(f"💰 一次評価 {llm_metrics.summary('scoring_cascade')}")
+        print(f"🪜 {cascade}")
+    print(f"{'='*70}\n")
+
+    return len(send_targets_limited)
+
+# ==============================
+# Batch APIモード（夜間の大量スコアリング向け）
+# ==============================
+def _batch_requests(candidates):
+    """
+    Batch APIに投入するリクエストを生成
+
+    ルール除外・キャッシュ済み・内容が同じ候補者は投入しない。
+    custom_id にはキャッシュキーを使い、結果の取り込み時にそのままキャッシュへ保存する。
+
+    Yields:
+        tuple: (custom_id, リクエストbody)
+    """
+    seen_keys = set()
+    for candidate in candidates:
+        if prefilter(candidate) is not None:
+            continue
+        key = make_key(OPENAI_MODEL, SCORING_PROMPT_VERSION, candidate, SCORING_FIELDS)
+        if key in seen_keys or _cached(candidate, key) is not None:
+            continue
+        seen_keys.add(key)
+        user_content = CANDIDATE_MESSAGE.format(candidate=_format_candidate(candidate))
+        yield key, _request_body(SCORING_SYSTEM_PROMPT, user_content, "candidate_score", SCORE_SCHEMA, 400)
+
+
+def batch_submit():
+    """未スコアリングの候補者をJSONLにまとめてBatch APIに投入し、ジョブIDを保存"""
+
+    job = batch_jobs.load_job(BATCH_JOB_FILE)
+    if job is not None:
+        print(f"⚠️ 結果を取り込んでいないジョブがあります: {job['batch_id']}（{job['status']}）")
+        print(f"💡 --batch status で状態確認、--batch merge で結果を取り込んでください")
+        return job
+
+    candidates = load_candidates()
+    if candidates is None:
+        return None
+
+    count = batch_jobs.write_requests(BATCH_REQUESTS_FILE, _batch_requests(candidates))
+    if count == 0:
+        print("✅ 全候補者がルール除外またはキャッシュ済みです。Batch APIへの投入は不要です")
+        print(f"💡 python3 aiagent/linkedin_scorer_v2.py で結果CSVを出力してください")
+        return None
+
+    batch = batch_jobs.submit(get_client(), BATCH_REQUESTS_FILE, metadata={"prompt_version": SCORING_PROMPT_VERSION})
+    job = {
+        "batch_id": batch.id,
+        "status": batch.status,
+        "model": OPENAI_MODEL,
+        "prompt_version": SCORING_PROMPT_VERSION,
+        "request_count": count,
+        "requests_file": BATCH_REQUESTS_FILE,
+        "submitted_at": datetime.now().isoformat(timespec="seconds")
+    }
+    batch_jobs.save_job(BATCH_JOB_FILE, job)
+
+    print(f"\n{'='*70}")
+    print(f"📦 Batch APIにスコアリングを投入しました")
+    print(f"{'='*70}")
+    print(f"ジョブID: {batch.id}")
+    print(f"リクエスト数: {count} 件（候補者 {len(candidates)} 件中）")
+    print(f"ジョブ情報: {BATCH_JOB_FILE}")
+    print(f"{'='*70}\n")
+    print(f"💡 完了後に python3 aiagent/linkedin_scorer_v2.py --batch merge で結果を取り込んでください")
+    return job
+
+
+def batch_status(wait=False):
+    """保存済みジョブの状態を確認（wait=True なら終了するまでポーリング）"""
+
+    job = batch_jobs.load_job(BATCH_JOB_FILE)
+    if job is None:
+        print(f"⚠️ 投入済みのジョブがありません: {BATCH_JOB_FILE}")
+        print(f"💡 先に --batch submit を実行してください")
+        return None
+
+    batch = batch_jobs.poll(get_client(), job["batch_id"], timeout=None if wait else 0)
+    job["status"] = batch.status
+    batch_jobs.save_job(BATCH_JOB_FILE, job)
+    return batch
+
+
+def _ingest_batch_results(batch, candidates):
+    """
+    バッチ結果を検証してキャッシュに保存
+
+    Returns:
+        tuple: (取り込んだ件数, 失敗・不正な件数)
+    """
+    facts_by_key = {
+        make_key(OPENAI_MODEL, SCORING_PROMPT_VERSION, c, SCORING_FIELDS): age_facts(c.get("education"))
+        for c in candidates
+    }
+
+    ingested = 0
+    failed = 0
+    for custom_id, body, error in batch_jobs.iter_results(get_client(), batch):
+        if error is not None or custom_id not in facts_by_key:
+            failed += 1
+            continue
+        try:
+            item = json.loads(body["choices"][0]["message"]["content"])
+            errors = validate_score(item)
+        except (KeyError, IndexError, TypeError, json.JSONDecodeError) as e:
+            errors = [f"JSON解析エラー: {e}"]
+        if errors:
+            failed += 1
+            continue
+        score_cache.put(custom_id, _to_result(item, facts_by_key[custom_id]))
+        ingested += 1
+    return ingested, failed
+
+
+def batch_merge(wait=False):
+    """
+    完了したバッチの結果を取り込み、candidates_scored_v2.csv を出力
+
+    結果はキャッシュ経由で通常のスコアリングに渡すため、出力形式・順序は通常モードと同じ。
+    失敗・不正な応答の候補者だけは通常のAPI呼び出しでスコアリングする。
+    """
+    global score_cache
+
+    batch = batch_status(wait)
+    if batch is None:
+        return None
+    if batch.status not in batch_jobs.TERMINAL_STATUSES:
+        print(f"⏳ ジョブはまだ完了していません: {batch_jobs.describe(batch)}")
+        print(f"💡 --batch wait で完了まで待機できます")
+        return None
+
+    candidates = load_candidates()
+    if candidates is None:
+        return None
+
+    job = batch_jobs.load_job(BATCH_JOB_FILE)
+    if (job["model"], job["prompt_version"]) != (OPENAI_MODEL, SCORING_PROMPT_VERSION):
+        # 評価条件の異なる結果は取り込まない
+        print(f"⚠️ 投入時とモデル・プロンプト版が異なります（{job['model']} / {job['prompt_version']}）。全件を再スコアリングします")
+    else:
+        # キャッシュ無効時もバッチ結果を使えるよう、今回の実行中だけメモリ上のキャッシュを使う
+        if not score_cache.enabled:
+            score_cache = ScoreCache(path=":memory:", enabled=True)
+
+        ingested, failed = _ingest_batch_results(batch, candidates)
+        print(f"📥 バッチ結果を取り込みました: {ingested} 件（失敗・不正: {failed} 件は通常のAPIで再スコアリング）")
+
+    sent = score_all_candidates()
+    batch_jobs.archive_job(BATCH_JOB_FILE)
+    return sent
+
 # ==============================
 # エントリポイント
 # ==============================
 if __name__ == "__main__":
-    score_all_candidates()
+    parser = argparse.ArgumentParser(description="詳細プロフィールのAIスコアリング")
+    parser.add_argument(
+        "--batch", choices=["submit", "status", "wait", "merge"],
+        help="Batch APIモード（submit: 投入 / status: 状態確認 / wait: 完了まで待って取り込み / merge: 結果取り込み）"
+    )
+    parser.add_argument(
+        "--stream", action="store_true",
+        help="ストリーミングモード（1件ずつ読み込み・書き出し、入力件数によらずメモリ一定。大量のCSV向け）"
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="前回中断したスコアリングをチェックポイントから再開（記録済みの候補者は再スコアリングしない）"
+    )
+    args = parser.parse_args()
+    require_api_key()
+
+    if args.batch == "submit":
+        batch_submit()
+    elif args.batch == "status":
+        batch_status()
+    elif args.batch == "wait":
+        batch_merge(wait=True)
+    elif args.batch == "merge":
+        batch_merge()
+    elif args.stream:
+        score_stream()
+    else:
+        score_all_candidates(resume=args.resume)
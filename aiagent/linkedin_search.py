@@ -2,6 +2,7 @@
 # LinkedIn候補者検索スクリプト（検索条件を柔軟に設定可能）
 
 import os
+import sys
 import csv
 import time
 import pickle
@@ -14,11 +15,17 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from webdriver_manager.chrome import ChromeDriverManager
 
+# aiagent をモジュールとして読み込めるようにする
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aiagent.candidate_store import candidate_store
+from aiagent.suppression import suppression_index, CONTACT_REASONS
+from aiagent.profile_identity import canonical_profile_url
+
 # ==============================
 # 設定
 # ==============================
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATA_DIR = os.path.join(BASE_DIR, "data")
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
 OUTPUT_FILE = os.path.join(DATA_DIR, "candidates_raw.csv")
 COOKIE_FILE = os.path.join(DATA_DIR, "cookies.pkl")
 
@@ -158,7 +165,8 @@ def extract_profiles(driver):
                 const profileLink = item.querySelector('a[href*="/in/"]');
                 if (!profileLink) return;
 
-                const url = profileLink.href.split('?')[0];
+                // クエリ（miniProfileUrn）はメンバーIDの照合に使うため残し、Python側で正規化する
+                const url = profileLink.href;
                 if (seen.has(url)) return;
                 seen.add(url);
 
@@ -276,15 +284,26 @@ def search_candidates(keywords, location="Japan", max_pages=3):
         print(f"📦 抽出件数: {len(profiles)} 件")
 
         # 重複除外して追加
-        new_count = 0
+        new_profiles = []
+        suppressed_count = 0
         for profile in profiles:
-            url = profile.get("url", "")
+            # 同一人物の別の表記（エンコード・メンバーID・末尾スラッシュ）を同じURLにまとめる
+            url = canonical_profile_url(profile.get("url", ""))
+            profile["url"] = url
             if url and url not in seen_urls:
                 seen_urls.add(url)
-                all_candidates.append(profile)
-                new_count += 1
-
-        print(f"✅ 新規候補者: {new_count} 件（累計: {len(all_candidates)} 件）")
+                # 過去に申請・送信済み、配信停止の候補者は除外
+                if suppression_index.contains(url, CONTACT_REASONS):
+                    suppressed_count += 1
+                    continue
+                new_profiles.append(profile)
+        all_candidates.extend(new_profiles)
+        new_count = len(new_profiles)
+
+        # 候補者ストアにページ単位で反映
+        candidate_store.upsert_candidates(new_profiles, "search")
+
+        print(f"✅ 新規候補者: {new_count} 件（累計: {len(all_candidates)} 件、除外リスト該当: {suppressed_count} 件）")
 
         # 次ページへ
         if page < max_pages:
@@ -2,8 +2,8 @@
 # 検索結果ページ上で直接つながり申請を送信（プロフィール遷移なし）
 
 import os
+import sys
 import time
-import csv
 import random
 import pickle
 from datetime import datetime
@@ -16,11 +16,17 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from webdriver_manager.chrome import ChromeDriverManager
 
+# aiagent をモジュールとして読み込めるようにする
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aiagent.candidate_store import candidate_store
+from aiagent.suppression import suppression_index, CONTACT_REASONS, CONNECTION_REQUESTED
+from aiagent.log_writer import BufferedLogWriter
+
 # ==============================
 # 設定
 # ==============================
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATA_DIR = os.path.join(BASE_DIR, "data")
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
 LOG_FILE = os.path.join(DATA_DIR, "connection_logs.csv")
 COOKIE_FILE = os.path.join(DATA_DIR, "cookies.pkl")
 
@@ -95,20 +101,22 @@ def login():
 # ==============================
 # ログ記録
 # ==============================
-def log_request(name, result, error=""):
-    """送信結果をログに記録"""
-    file_exists = os.path.exists(LOG_FILE)
-
-    with open(LOG_FILE, "a", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=["date", "name", "result", "error"])
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow({
-            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "name": name,
-            "result": result,
-            "error": error
-        })
+# 申請ログ（ファイルを開いたまま行をバッファし、まとめて書き出す）
+request_log = BufferedLogWriter(LOG_FILE, ["date", "name", "profile_url", "result", "error"])
+
+def log_request(name, result, error="", profile_url=""):
+    """送信結果をログに記録（成功したプロフィールURLは除外リストにも追加）"""
+    request_log.write({
+        "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "name": name,
+        "profile_url": profile_url,
+        "result": result,
+        "error": error
+    })
+
+    candidate_store.add_connection_request(name, profile_url, result, error)
+    if result == "success":
+        suppression_index.add(profile_url, CONNECTION_REQUESTED)
 
 # ==============================
 # 検索結果ページ上でつながり申請
@@ -167,9 +175,11 @@ def send_connections_on_page(driver, current_total=0, max_requests=50):
 
         // つながり申請ボタンまたはメッセージボタンがある場合のみ候補者カードとして扱う
         if (hasConnectButton || hasMessageButton) {
+            const link = li.querySelector('a[href*="/in/"]');
             results.push({
                 index: candidateIndex,
                 name: name,
+                url: link ? link.href : '',  // miniProfileUrn（メンバーID）は別名表の照合に使う
                 hasConnectButton: hasConnectButton,
                 classes: classes
             });
@@ -201,12 +211,19 @@ def send_connections_on_page(driver, current_total=0, max_requests=50):
                 break
 
             name = candidate['name']
+            url = candidate.get('url', '')
             has_button = candidate['hasConnectButton']
 
+            # 過去に申請・送信済み、配信停止の候補者はクリックしない
+            if suppression_index.contains(url, CONTACT_REASONS):
+                print(f"   ⏭️  {name} - 除外リスト該当（申請・送信済みまたは配信停止）")
+                skip_count += 1
+                continue
+
             if not has_button:
                 print(f"   ⏭️  {name} - つながり申請ボタンなし（既接続または保留中）")
                 skip_count += 1
-                log_request(name, "skip", "no_connect_button")
+                log_request(name, "skip", "no_connect_button", url)
                 continue
 
             # ボタンをクリック
@@ -293,7 +310,7 @@ def send_connections_on_page(driver, current_total=0, max_requests=50):
 
                     print(f"   ✅ {name} - つながり申請を送信")
                     success_count += 1
-                    log_request(name, "success", "")
+                    log_request(name, "success", "", url)
 
                     # 遅延
                     delay = random.uniform(*DELAY_RANGE)
@@ -310,11 +327,11 @@ def send_connections_on_page(driver, current_total=0, max_requests=50):
                         error_msg = "クリック実行失敗"
 
                     print(f"   ❌ {name} - {error_msg}")
-                    log_request(name, "error", error_msg)
+                    log_request(name, "error", error_msg, url)
 
             except Exception as e:
                 print(f"   ❌ {name} - エラー: {e}")
-                log_request(name, "error", str(e))
+                log_request(name, "error", str(e), url)
 
         return success_count, skip_count
 
@@ -405,7 +422,7 @@ def send_connections(keywords, location="Japan", max_pages=1, max_requests=5):
     print(f"{'='*70}")
     print(f"✅ 送信成功: {total_success}件")
     print(f"⏭️  スキップ: {total_skip}件")
-    print(f"📝 ログ: {LOG_FILE}")
+    print(f"📝 ログ: {request_log.path}")
 
     input("\nEnterキーを押してブラウザを閉じます...")
     driver.quit()
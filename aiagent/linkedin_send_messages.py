@@ -2,13 +2,13 @@
 # AIでメッセージを生成し、送信
 
 import os
+import sys
 import time
 import csv
 import pickle
 import random
 from datetime import datetime
 from dotenv import load_dotenv
-from openai import OpenAI
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
@@ -18,13 +18,22 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 
+# aiagent をモジュールとして読み込めるようにする
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aiagent.llm_client import llm_metrics, require_api_key
+from aiagent.message_variants import MessageVariantPool
+from aiagent.message_queue import ApprovedMessageStore, prefetch
+from aiagent.candidate_store import candidate_store
+from aiagent.suppression import suppression_index, MESSAGE_REASONS, MESSAGED
+from aiagent.log_writer import BufferedLogWriter
+
 # ==============================
 # 設定
 # ==============================
 load_dotenv()
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATA_DIR = os.path.join(BASE_DIR, "data")
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
 INPUT_FILE = os.path.join(DATA_DIR, "messages_v2.csv")
 LOG_FILE = os.path.join(DATA_DIR, "message_logs.csv")
 COOKIE_FILE = os.path.join(DATA_DIR, "cookies.pkl")
@@ -32,7 +41,6 @@ COOKIE_FILE = os.path.join(DATA_DIR, "cookies.pkl")
 os.makedirs(DATA_DIR, exist_ok=True)
 
 # OpenAI設定
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
 # 送信設定
@@ -54,13 +62,13 @@ KPMGコンサルティングの依田と申します。
 もしご関心あれば、カジュアルにオンラインでお話できると嬉しいです！よろしくお願いします！"""
 
 # ==============================
-# OpenAIクライアント
+# メッセージ生成
 # ==============================
-if not OPENAI_API_KEY:
-    print("❌ エラー: OPENAI_API_KEYが設定されていません")
-    exit(1)
+# メッセージのバリエーションプール（data/message_variants.json）
+variant_pool = MessageVariantPool(MESSAGE_TEMPLATE)
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+# 承認済みメッセージと送信状態（data/approved_messages.jsonl）
+approved_store = ApprovedMessageStore()
 
 # ==============================
 # ログイン
@@ -131,7 +139,9 @@ def login():
 # ==============================
 def generate_message(name):
     """
-    OpenAI APIでメッセージを生成（テンプレートに軽微なバリエーション）
+    メッセージを生成（事前に生成したバリエーションに名前を差し込む）
+
+    APIを呼ぶのはバリエーションが不足している場合のみで、通常はローカルで完結する。
 
     Args:
         name: 候補者名
@@ -139,45 +149,7 @@ def generate_message(name):
     Returns:
         str: 生成されたメッセージ
     """
-    # テンプレートベースで生成
-    base_message = MESSAGE_TEMPLATE.format(name=name)
-
-    # AIで軽微なバリエーション追加
-    prompt = f"""
-以下のメッセージテンプレートを元に、自然で親しみやすいメッセージを生成してください。
-大幅な変更は不要です。語尾や表現を少しだけ変えてください。
-
-【テンプレート】
-{base_message}
-
-【要件】
-- 名前は必ず「{name}さん」で始める
-- 内容の構造は基本的にテンプレート通り
-- 語尾や接続詞を少しだけ自然にバリエーションを付ける
-- 絵文字（🙇）は残す
-- 箇条書き（・）はそのまま維持
-- 全体の長さはテンプレートと同程度
-- 他の説明は一切不要、メッセージ本文のみ出力
-"""
-
-    try:
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": "あなたはメッセージ生成アシスタントです。"},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.5,
-            max_tokens=400
-        )
-
-        message = response.choices[0].message.content.strip()
-        return message
-
-    except Exception as e:
-        print(f"   ⚠️ メッセージ生成エラー: {e}")
-        # エラー時はテンプレートをそのまま使用
-        return base_message
+    return variant_pool.render(name)
 
 # ==============================
 # メッセージ送信
@@ -506,22 +478,23 @@ def send_message(driver, profile_url, name, message):
 # ==============================
 # ログ記録
 # ==============================
+# 送信ログ（ファイルを開いたまま行をバッファし、まとめて書き出す）
+message_log = BufferedLogWriter(LOG_FILE, ["date", "name", "profile_url", "result", "error", "details"])
+
 def log_message(name, profile_url, result, error="", details=""):
     """送信結果をログに記録"""
-    file_exists = os.path.exists(LOG_FILE)
-
-    with open(LOG_FILE, "a", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=["date", "name", "profile_url", "result", "error", "details"])
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow({
-            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "name": name,
-            "profile_url": profile_url,
-            "result": result,
-            "error": error,
-            "details": details
-        })
+    message_log.write({
+        "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "name": name,
+        "profile_url": profile_url,
+        "result": result,
+        "error": error,
+        "details": details
+    })
+
+    candidate_store.add_message(name, profile_url, result, error, details)
+    if result == "success":
+        suppression_index.add(profile_url, MESSAGED)
 
 # ==============================
 # メイン処理
@@ -543,51 +516,45 @@ def main():
         print("⚠️ 送信対象データが空です")
         return
 
-    # 上限件数まで絞り込み
+    # 送信済みを除外して上限件数まで絞り込み
+    targets = [
+        t for t in targets
+        if t.get('profile_url')
+        and not approved_store.is_sent(t['profile_url'])
+        and not suppression_index.contains(t['profile_url'], MESSAGE_REASONS)
+    ]
     targets = targets[:MAX_MESSAGES]
     total = len(targets)
+    reused = sum(1 for t in targets if approved_store.get(t['profile_url']))
 
     print(f"\n{'='*70}")
-    print(f"📨 メッセージ生成開始")
+    print(f"📨 メッセージ送信準備")
     print(f"{'='*70}")
-    print(f"送信対象: {total} 件")
+    print(f"送信対象: {total} 件（送信済みを除く）")
     print(f"上限: {MAX_MESSAGES} 件")
+    print(f"承認済みメッセージの再利用: {reused} 件")
     print(f"{'='*70}\n")
 
-    # まず全メッセージを生成して表示
-    messages_to_send = []
-
-    for idx, target in enumerate(targets, start=1):
-        name = target.get('name', '不明')
-        profile_url = target.get('profile_url', '')
-        score = target.get('total_score', '0')
-
-        if not profile_url:
-            print(f"[{idx}/{total}] ⚠️ {name} - URLなし、スキップ")
-            continue
-
-        print(f"[{idx}/{total}] 💬 {name} (スコア: {score}点) のメッセージを生成中...")
-        message = generate_message(name)
-
-        messages_to_send.append({
-            'name': name,
-            'profile_url': profile_url,
-            'score': score,
-            'message': message
-        })
+    if not targets:
+        print("⚠️ 未送信の送信対象がありません")
+        return
 
-    # 生成したメッセージを全て表示
-    print(f"\n{'='*70}")
-    print(f"📋 生成されたメッセージ一覧")
+    # 送信する文面（宛名はそれぞれの名前に置き換え）
+    variants = variant_pool.ensure()
+    print(f"{'='*70}")
+    print(f"📋 送信する文面（{len(variants) or 1} パターン、宛名は各候補者の名前に置き換え）")
     print(f"{'='*70}\n")
-
-    for idx, msg_data in enumerate(messages_to_send, start=1):
-        print(f"--- [{idx}/{len(messages_to_send)}] {msg_data['name']} (スコア: {msg_data['score']}点) ---")
-        print(f"{msg_data['message']}")
+    for idx, variant in enumerate(variants or [{"text": MESSAGE_TEMPLATE}], start=1):
+        print(f"--- パターン{idx} ---")
+        print(variant["text"])
         print()
 
-    # ユーザーに確認
-    print(f"{'='*70}")
+    print(f"--- 送信先 ---")
+    for idx, target in enumerate(targets, start=1):
+        print(f"[{idx}/{total}] {target.get('name', '不明')} (スコア: {target.get('total_score', '0')}点)")
+
+    # ユーザーに確認（1回のみ）
+    print(f"\n{'='*70}")
     print(f"これらのメッセージを送信しますか？")
     print(f"{'='*70}")
     confirm = input("送信する場合は 'yes' と入力してください: ").strip().lower()
@@ -596,6 +563,17 @@ def main():
         print("\n❌ 送信をキャンセルしました")
         return
 
+    def prepare(target):
+        """メッセージを用意（承認済みがあれば再利用、なければ生成して保存）"""
+        approved = approved_store.get(target['profile_url'])
+        if approved:
+            return approved
+        name = target.get('name', '不明')
+        return approved_store.approve(name, target['profile_url'], target.get('total_score', '0'), generate_message(name))
+
+    # メッセージ生成はログイン・送信と並行してバックグラウンドで先行
+    prepared = prefetch(targets, prepare)
+
     # ログイン
     print(f"\n{'='*70}")
     print(f"📨 メッセージ送信開始")
@@ -606,19 +584,20 @@ def main():
     success_count = 0
     error_count = 0
 
-    for idx, msg_data in enumerate(messages_to_send, start=1):
+    for idx, msg_data in enumerate(prepared, start=1):
         name = msg_data['name']
         profile_url = msg_data['profile_url']
         score = msg_data['score']
         message = msg_data['message']
 
-        print(f"[{idx}/{len(messages_to_send)}] 📤 {name} (スコア: {score}点) へ送信中...")
+        print(f"[{idx}/{total}] 📤 {name} (スコア: {score}点) へ送信中...")
 
         # メッセージ送信
         result, error, details = send_message(driver, profile_url, name, message)
 
         # ログ記録
         log_message(name, profile_url, result, error, details)
+        approved_store.mark(profile_url, "sent" if result == "success" else "failed")
 
         # 結果表示
         if result == "success":
@@ -639,7 +618,8 @@ def main():
     print(f"{'='*70}")
     print(f"✅ 送信成功: {success_count} 件")
     print(f"❌ 送信失敗: {error_count} 件")
-    print(f"📝 ログ: {LOG_FILE}")
+    print(f"📝 ログ: {message_log.path}")
+    print(f"💰 {llm_metrics.summary('message')}")
     print(f"{'='*70}\n")
 
     input("\nEnterキーを押してブラウザを閉じます...")
@@ -649,4 +629,5 @@ def main():
 # エントリポイント
 # ==============================
 if __name__ == "__main__":
+    require_api_key()
     main()
@@ -0,0 +1,135 @@
+# aiagent/llm_cassette.py
+# OpenAI APIの記録・再生（httpxトランスポート。リクエスト内容のハッシュをキーに応答をJSONLへ保存・再生）
+
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+
+import httpx
+
+# ==============================
+# 設定
+# ==============================
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
+CASSETTE_DIR = os.path.join(DATA_DIR, "cassettes")
+
+# off: 使わない / record: 実APIを呼んで記録 / replay: 記録のみ使用（APIを呼ばない） / auto: 記録があれば再生、なければ記録
+CASSETTE_MODES = ("off", "record", "replay", "auto")
+
+# 記録しないレスポンスヘッダー（本文は展開済みで保存するため）
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie"}
+
+# ==============================
+# キー生成
+# ==============================
+def request_key(method, url, content):
+    """
+    リクエストのキー（メソッド + パス + 本文のSHA-256）
+
+    ホスト名は含めない（OPENAI_BASE_URL を変えても同じ記録を使える）。
+    JSON本文はキー順を揃えてからハッシュする。
+    """
+    try:
+        body = json.dumps(json.loads(content), ensure_ascii=False, sort_keys=True)
+    except (ValueError, UnicodeDecodeError):
+        body = hashlib.sha256(content).hexdigest()
+    raw = f"{method.upper()} {httpx.URL(url).raw_path.decode('ascii')}\n{body}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+# ==============================
+# トランスポート
+# ==============================
+class CassetteTransport(httpx.BaseTransport):
+    """
+    記録・再生に対応したhttpxトランスポート
+
+    - 記録は1行1リクエストのJSONL（同じキーは後の記録が優先）
+    - replay で記録がないリクエストは404（リトライ対象外のエラー）を返し、実APIは呼ばない
+    - 2xx以外の応答は記録しない（再実行時に再度APIを呼ぶ）
+    """
+
+    def __init__(self, path, mode="auto", transport=None):
+        if mode not in CASSETTE_MODES or mode == "off":
+            raise ValueError(f"不正な記録モード: {mode}")
+        self.path = path
+        self.mode = mode
+        self.transport = transport or httpx.HTTPTransport()
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if mode != "record" and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._entries[entry["key"]] = entry
+
+    def handle_request(self, request):
+        content = request.read()
+        key = request_key(request.method, str(request.url), content)
+
+        if self.mode != "record":
+            entry = self._entries.get(key)
+            if entry is not None:
+                with self._lock:
+                    self.hits += 1
+                return httpx.Response(
+                    entry["status"],
+                    headers=entry["headers"],
+                    content=entry["body"].encode("utf-8"),
+                    request=request
+                )
+            if self.mode == "replay":
+                with self._lock:
+                    self.misses += 1
+                return httpx.Response(
+                    404,
+                    json={"error": {
+                        "message": f"記録にないリクエストです（{request.method} {request.url.path}, key={key[:12]}）",
+                        "type": "cassette_miss"
+                    }},
+                    request=request
+                )
+
+        response = self.transport.handle_request(request)
+        body = response.read()
+        response.close()
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_HEADERS}
+
+        if 200 <= response.status_code < 300:
+            self._record(key, request, content, response.status_code, headers, body)
+
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+    def _record(self, key, request, content, status, headers, body):
+        entry = {
+            "key": key,
+            "method": request.method,
+            "path": request.url.path,
+            "request": content.decode("utf-8", errors="replace"),
+            "status": status,
+            "headers": headers,
+            "body": body.decode("utf-8", errors="replace"),
+            "recorded_at": datetime.now().isoformat(timespec="seconds")
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self.recorded += 1
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.transport.close()
+
+    def summary(self):
+        """サマリー表示用の文字列"""
+        return f"記録・再生（{self.mode}）: 再生 {self.hits} 件 / 未記録 {self.misses} 件 / 新規記録 {self.recorded} 件"
@@ -0,0 +1,673 @@
+# aiagent/llm_client.py
+# LLM API呼び出しの共通ラッパー（OpenAI / Anthropic の振り分け・レート制御・リトライ・トークン数/レイテンシ/コストの記録）
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import threading
+from types import SimpleNamespace
+from datetime import datetime
+from dotenv import load_dotenv
+from openai import OpenAI, DefaultHttpxClient, RateLimitError, APIStatusError, APIConnectionError
+
+# ==============================
+# 設定
+# ==============================
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
+METRICS_FILE = os.path.join(DATA_DIR, "llm_metrics.jsonl")  # 1呼び出し1行の記録（ダッシュボードで集計）
+
+os.makedirs(DATA_DIR, exist_ok=True)
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # ローカルのモックサーバー等に向ける場合に指定
+
+# Anthropic（LLM_PROVIDERS に anthropic を含める場合）
+ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+ANTHROPIC_MODEL = os.getenv("ANTHROPIC_MODEL", "claude-3-5-haiku-latest")
+ANTHROPIC_BASE_URL = os.getenv("ANTHROPIC_BASE_URL")  # ローカルのモックサーバー等に向ける場合に指定
+# 呼び出し元が指定したモデル → Anthropicのモデル（カンマ区切り、例: gpt-4o-mini=claude-3-5-haiku-latest,gpt-4o=claude-sonnet-4-0）
+# claude- で始まるモデルはそのまま使い、対応がないモデルは ANTHROPIC_MODEL に置き換える
+ANTHROPIC_MODEL_MAP = dict(
+    (name.strip(), target.strip())
+    for name, _, target in (pair.partition("=") for pair in os.getenv("ANTHROPIC_MODEL_MAP", "").split(","))
+    if target.strip()
+)
+
+# 利用するプロバイダー（カンマ区切り、例: openai,anthropic）。レイテンシ・エラー率で振り分け、失敗時は切り替える
+LLM_PROVIDERS = [name.strip() for name in os.getenv("LLM_PROVIDERS", "openai").lower().split(",")
+                 if name.strip() in ("openai", "anthropic")] or ["openai"]
+LLM_ERROR_PENALTY = float(os.getenv("LLM_ERROR_PENALTY", 4))  # エラー率をレイテンシに換算する重み
+LLM_CIRCUIT_ERRORS = int(os.getenv("LLM_CIRCUIT_ERRORS", 3))  # この回数連続で失敗したら一時的に後回し
+LLM_CIRCUIT_COOLDOWN = float(os.getenv("LLM_CIRCUIT_COOLDOWN", 30))  # 後回しにする時間（秒）
+LLM_ROUTING_EXPLORE = float(os.getenv("LLM_ROUTING_EXPLORE", 0.05))  # 2番手のプロバイダーを先に試す確率
+
+# APIの記録・再生（off / record / replay / auto）。replay ならAPIキーなし・オフラインで実行できる
+LLM_CASSETTE = os.getenv("LLM_CASSETTE", "off").lower()
+LLM_CASSETTE_FILE = os.getenv("LLM_CASSETTE_FILE", os.path.join(DATA_DIR, "cassettes", "llm.jsonl"))
+
+# 429/5xx・接続エラー時の最大リトライ回数（旧設定名 SCORING_MAX_RETRIES も参照）
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", os.getenv("SCORING_MAX_RETRIES", 5)))
+RETRY_BASE_DELAY = 1.0  # バックオフの初期待機（秒）
+RETRY_MAX_DELAY = 30.0  # バックオフの最大待機（秒）
+
+# レート制御の初期値（1分あたり）。最初の応答以降は x-ratelimit-* ヘッダーの実際の上限・残量で補正する
+LLM_RPM = float(os.getenv("LLM_RPM", 500))
+LLM_TPM = float(os.getenv("LLM_TPM", 200000))
+
+# 料金表（USD / 100万トークン: 入力, 出力）。モデル名の前方一致で最も長いものを使う
+PRICING = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "claude-3-5-haiku": (0.80, 4.00),
+    "claude-3-5-sonnet": (3.00, 15.00),
+    "claude-3-haiku": (0.25, 1.25),
+    "claude-3-opus": (15.00, 75.00),
+    "claude-haiku-4": (1.00, 5.00),
+    "claude-sonnet-4": (3.00, 15.00),
+    "claude-opus-4": (15.00, 75.00),
+}
+# プロンプトキャッシュの料金倍率（プロバイダー → (読み込み, 書き込み)）。Anthropicは書き込みに割増がかかる
+CACHE_RATES = {
+    "openai": (0.5, 1.0),
+    "anthropic": (0.1, 1.25),
+}
+
+# 実行ID（同じプロセス内の呼び出しを1回の実行として集計する）
+RUN_ID = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+
+# ==============================
+# コスト計算
+# ==============================
+def estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens=0, cache_write_tokens=0, provider=None):
+    """
+    料金表から推定コスト（USD）を返す（料金表にないモデルはNone）
+
+    prompt_tokens はキャッシュの読み込み（cached_tokens）・書き込み（cache_write_tokens）を含む入力トークン数。
+    キャッシュの料金倍率は provider（省略時はモデル名から判定）の CACHE_RATES を使う。
+    """
+    matches = [name for name in PRICING if model and model.startswith(name)]
+    if not matches:
+        return None
+    input_price, output_price = PRICING[max(matches, key=len)]
+    provider = provider or ("anthropic" if model.startswith("claude") else "openai")
+    read_rate, write_rate = CACHE_RATES.get(provider, CACHE_RATES["openai"])
+    uncached_tokens = prompt_tokens - cached_tokens - cache_write_tokens
+    input_cost = (uncached_tokens + cached_tokens * read_rate + cache_write_tokens * write_rate) * input_price
+    return (input_cost + completion_tokens * output_price) / 1_000_000
+
+# ==============================
+# 記録・集計
+# ==============================
+class LLMMetrics:
+    """
+    API呼び出しごとの記録と、工程（stage）別・実行全体の集計
+
+    記録は METRICS_FILE に1行ずつ追記する。並列スコアリングから呼ばれるためロックで直列化。
+    """
+
+    def __init__(self, path=METRICS_FILE, run_id=RUN_ID):
+        self.path = path
+        self.run_id = run_id
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, model, latency_ms, retries, usage=None, error=None, provider="openai"):
+        """1回の呼び出しを記録"""
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        # プロンプトキャッシュにヒットした入力トークン数（usage.prompt_tokens_details.cached_tokens）と
+        # キャッシュに書き込んだ入力トークン数（Anthropicのみ、cache_write_tokens）
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", 0) or 0
+        cache_write_tokens = getattr(details, "cache_write_tokens", 0) or 0
+        cost = estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens, cache_write_tokens, provider)
+        entry = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "run_id": self.run_id,
+            "stage": stage,
+            "provider": provider,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            "cache_write_tokens": cache_write_tokens,
+            "latency_ms": latency_ms,
+            "retries": retries,
+            "cost_usd": cost,
+            "error": error
+        }
+
+        with self._lock:
+            totals = self.stages.setdefault(stage, {
+                "calls": 0, "errors": 0, "retries": 0, "prompt_tokens": 0,
+                "completion_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0, "latency_ms": 0, "cost_usd": 0.0
+            })
+            totals["calls"] += 1
+            totals["errors"] += 1 if error else 0
+            totals["retries"] += retries
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["cached_tokens"] += cached_tokens
+            totals["cache_write_tokens"] += cache_write_tokens
+            totals["latency_ms"] += latency_ms
+            totals["cost_usd"] += cost or 0.0
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+        return entry
+
+    def totals(self):
+        """実行全体の合計"""
+        with self._lock:
+            result = {}
+            for totals in self.stages.values():
+                for k, v in totals.items():
+                    result[k] = result.get(k, 0) + v
+            return result
+
+    def summary(self, stage=None):
+        """サマリー表示用の文字列（stage指定時はその工程のみ）"""
+        totals = self.stages.get(stage, {}) if stage else self.totals()
+        if not totals.get("calls"):
+            return "API使用量: 呼び出しなし"
+        cache_rate = totals["cached_tokens"] / totals["prompt_tokens"] * 100 if totals["prompt_tokens"] else 0
+        notes = ""
+        if len(router.providers) > 1:
+            notes += f" / {router.summary()}"
+        if rate_limiter.waited:
+            notes += f" / {rate_limiter.summary()}"
+        if cassette is not None:
+            notes += f" / {cassette.summary()}"
+        return (f"API使用量: {totals['calls']} 回 / 入力 {totals['prompt_tokens']:,}"
+                f"（うちキャッシュ {totals['cached_tokens']:,}、{cache_rate:.0f}%）+ 出力 {totals['completion_tokens']:,} トークン"
+                f" / 平均 {totals['latency_ms'] / totals['calls']:.0f}ms / 推定 ${totals['cost_usd']:.4f}"
+                f"（リトライ {totals['retries']} 回、エラー {totals['errors']} 回）{notes}")
+
+
+llm_metrics = LLMMetrics()
+
+# ==============================
+# レート制御（全工程で共有するトークンバケット）
+# ==============================
+def _parse_duration(value):
+    """x-ratelimit-reset-* の値（例: 1s, 6m0s, 20ms）を秒に変換（解釈できなければNone）"""
+    if not value:
+        return None
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+
+class RateLimiter:
+    """
+    リクエスト数・トークン数の2つのバケットで呼び出し前に待機する
+
+    - 上限と補充速度はレスポンスヘッダー（x-ratelimit-limit/remaining/reset-*）から更新する
+    - 残量はサーバーの値から実行中のリクエスト分を差し引いた値に合わせる
+    - 429を受けたら全スレッドの呼び出しを一時停止する（同時リトライの集中を避ける）
+    """
+
+    KINDS = ("requests", "tokens")
+
+    def __init__(self, rpm=LLM_RPM, tpm=LLM_TPM):
+        self.limits = {"requests": rpm, "tokens": tpm}
+        self.rates = {"requests": rpm / 60, "tokens": tpm / 60}  # 1秒あたりの補充量
+        self.available = dict(self.limits)
+        self.in_flight = {"requests": 0, "tokens": 0}
+        self.avg_tokens = 1000.0  # 1リクエストあたりのトークン数（実績の移動平均）
+        self.paused_until = 0.0
+        self.waited = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        for kind in self.KINDS:
+            self.available[kind] = min(self.limits[kind], self.available[kind] + self.rates[kind] * elapsed)
+
+    def acquire(self):
+        """呼び出し枠を確保する（枠がなければ補充されるまで待機）。戻り値は release() に渡す"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                cost = {"requests": 1, "tokens": min(self.avg_tokens, self.limits["tokens"])}
+                wait = self.paused_until - now
+                if wait <= 0:
+                    wait = max((cost[kind] - self.available[kind]) / self.rates[kind] for kind in self.KINDS)
+                if wait <= 0:
+                    for kind in self.KINDS:
+                        self.available[kind] -= cost[kind]
+                        self.in_flight[kind] += cost[kind]
+                    return cost
+                self.waited += wait
+            # 同時に待機したスレッドが一斉に再開しないようにずらす
+            time.sleep(wait + random.uniform(0, min(wait, 1.0) * 0.1))
+
+    def release(self, cost, headers=None, usage=None):
+        """呼び出し完了時に実行中の枠を戻し、ヘッダー・使用量で上限と残量を補正"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            for kind in self.KINDS:
+                self.in_flight[kind] = max(0, self.in_flight[kind] - cost[kind])
+
+            total_tokens = getattr(usage, "total_tokens", None)
+            if total_tokens:
+                self.avg_tokens = self.avg_tokens * 0.8 + total_tokens * 0.2
+
+            if not headers:
+                return
+            for kind in self.KINDS:
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                reset = _parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                try:
+                    if limit:
+                        self.limits[kind] = max(1.0, float(limit))
+                        self.rates[kind] = self.limits[kind] / 60
+                    if remaining is not None:
+                        remaining = float(remaining)
+                        # reset 秒後に上限まで戻る = その間の補充速度
+                        if reset and self.limits[kind] > remaining:
+                            self.rates[kind] = max(self.rates[kind], (self.limits[kind] - remaining) / reset)
+                        self.available[kind] = min(self.limits[kind], remaining - self.in_flight[kind])
+                except ValueError:
+                    continue
+
+    def penalize(self, delay):
+        """429を受けたとき、全スレッドの呼び出しを delay 秒止める"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            self.available["requests"] = min(self.available["requests"], 0)
+
+    def summary(self):
+        return (f"レート制御: 上限 {self.limits['requests']:.0f} リクエスト / {self.limits['tokens']:,.0f} トークン（毎分）"
+                f"、待機 延べ{self.waited:.1f}秒")
+
+
+rate_limiter = RateLimiter()
+
+# ==============================
+# クライアント
+# ==============================
+_client = None
+_anthropic_client = None
+_client_lock = threading.Lock()
+cassette = None  # 記録・再生が有効な場合の CassetteTransport（全プロバイダー共通）
+
+
+def require_api_key():
+    """利用するプロバイダーのAPIキーが1つもなければ終了する（記録の再生のみの場合は不要）。各スクリプトの実行開始時に呼ぶ"""
+    keys = {"openai": OPENAI_API_KEY, "anthropic": ANTHROPIC_API_KEY}
+    if LLM_CASSETTE == "replay" or any(keys.get(name) for name in LLM_PROVIDERS):
+        return
+    names = " / ".join(f"{name.upper()}_API_KEY" for name in LLM_PROVIDERS)
+    print(f"❌ エラー: {names}が設定されていません")
+    print(f"💡 .envファイルに{names}を設定してください（記録済みの応答で実行する場合は LLM_CASSETTE=replay）")
+    sys.exit(1)
+
+
+def use_cassette(mode, path=None):
+    """記録・再生モードを切り替える（次の get_client() から有効）"""
+    global LLM_CASSETTE, LLM_CASSETTE_FILE, _client, _anthropic_client, cassette
+    with _client_lock:
+        LLM_CASSETTE = mode
+        LLM_CASSETTE_FILE = path or LLM_CASSETTE_FILE
+        _client = None
+        _anthropic_client = None
+        cassette = None
+
+
+def _http_client(factory):
+    """記録・再生が有効なら CassetteTransport を使うhttpxクライアント（無効ならNone）。_client_lock 内で呼ぶ"""
+    global cassette
+    if LLM_CASSETTE == "off":
+        return None
+    if cassette is None:
+        from aiagent.llm_cassette import CassetteTransport
+        cassette = CassetteTransport(LLM_CASSETTE_FILE, LLM_CASSETTE)
+        print(f"📼 APIの記録・再生: {LLM_CASSETTE}（{LLM_CASSETTE_FILE}）")
+    return factory(transport=cassette)
+
+
+def _replay_key(api_key):
+    """記録の再生のみならAPIキーは不要（SDKの必須チェック用のダミー値）"""
+    return api_key or ("replay-only" if LLM_CASSETTE == "replay" else None)
+
+
+def get_client():
+    """OpenAIクライアント（初回呼び出し時に生成）"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            # リトライは create_completion() 側で制御するため、SDKの自動リトライは無効化
+            _client = OpenAI(
+                api_key=_replay_key(OPENAI_API_KEY),
+                base_url=OPENAI_BASE_URL,
+                max_retries=0,
+                http_client=_http_client(DefaultHttpxClient)
+            )
+        return _client
+
+
+def get_anthropic_client():
+    """Anthropicクライアント（初回呼び出し時に生成。anthropic パッケージは使う場合のみ必要）"""
+    global _anthropic_client
+    with _client_lock:
+        if _anthropic_client is None:
+            try:
+                import anthropic
+            except ImportError:
+                raise RuntimeError("anthropic パッケージがインストールされていません（pip install anthropic）")
+            _anthropic_client = anthropic.Anthropic(
+                api_key=_replay_key(ANTHROPIC_API_KEY),
+                base_url=ANTHROPIC_BASE_URL,
+                max_retries=0,
+                http_client=_http_client(anthropic.DefaultHttpxClient)
+            )
+        return _anthropic_client
+
+# ==============================
+# プロバイダー
+# ==============================
+class OpenAIProvider:
+    """OpenAI（OPENAI_BASE_URL の互換サーバーを含む）"""
+
+    name = "openai"
+
+    def __init__(self):
+        self.limiter = rate_limiter
+
+    def create(self, kwargs):
+        """chat.completions.create を呼び出し、(応答, レート制限ヘッダー) を返す"""
+        # レート制限の残量ヘッダーを読むため生レスポンスで受け取る
+        raw = get_client().chat.completions.with_raw_response.create(**kwargs)
+        return raw.parse(), raw.headers
+
+    def limit_headers(self, headers):
+        return headers
+
+    def is_retryable(self, error):
+        """リトライ対象のエラーか判定（429、5xx、接続エラー）"""
+        if isinstance(error, (RateLimitError, APIConnectionError)):
+            return True
+        if isinstance(error, APIStatusError):
+            return error.status_code >= 500
+        return False
+
+    def is_rate_limited(self, error):
+        return isinstance(error, RateLimitError)
+
+
+class AnthropicProvider:
+    """Anthropic Messages API（chat.completions 形式の引数・応答に変換して呼び出す）"""
+
+    name = "anthropic"
+
+    def __init__(self):
+        self.limiter = RateLimiter()
+
+    def create(self, kwargs):
+        raw = get_anthropic_client().messages.with_raw_response.create(**_to_anthropic(kwargs))
+        return _from_anthropic(raw.parse()), self.limit_headers(raw.headers)
+
+    def limit_headers(self, headers):
+        """anthropic-ratelimit-* を x-ratelimit-* の形式に読み替える（リセット時刻は使わない）"""
+        if not headers:
+            return None
+        result = {}
+        for kind in RateLimiter.KINDS:
+            for field in ("limit", "remaining"):
+                value = headers.get(f"anthropic-ratelimit-{kind}-{field}")
+                if value is not None:
+                    result[f"x-ratelimit-{field}-{kind}"] = value
+        return result
+
+    def is_retryable(self, error):
+        """リトライ対象のエラーか判定（429、5xx・529、接続エラー）"""
+        status = getattr(error, "status_code", None)
+        if status is not None:
+            return status == 429 or status >= 500
+        import anthropic
+        return isinstance(error, anthropic.APIConnectionError)
+
+    def is_rate_limited(self, error):
+        return getattr(error, "status_code", None) == 429
+
+
+def _anthropic_model(model):
+    """呼び出し元が指定したモデルに対応するAnthropicのモデル（カスケードの一次評価・再評価を別モデルのまま振り分ける）"""
+    if model and model.startswith("claude-"):
+        return model
+    return ANTHROPIC_MODEL_MAP.get(model or "", ANTHROPIC_MODEL)
+
+
+def _to_anthropic(kwargs):
+    """
+    chat.completions の引数を Messages API の引数に変換
+
+    - system メッセージは system に移し、プロンプトキャッシュの対象にする
+    - response_format の json_schema はツール呼び出し（入力スキーマ = 出力スキーマ）で強制する
+    """
+    messages = kwargs["messages"]
+    system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+    params = {
+        "model": _anthropic_model(kwargs.get("model")),
+        "max_tokens": kwargs.get("max_tokens") or 1024,
+        "messages": [{"role": m["role"], "content": m["content"]} for m in messages if m["role"] != "system"]
+    }
+    if kwargs.get("temperature") is not None:
+        params["temperature"] = kwargs["temperature"]
+
+    response_format = kwargs.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        spec = response_format["json_schema"]
+        params["tools"] = [{"name": spec["name"], "description": "結果をJSONで返す", "input_schema": spec["schema"]}]
+        params["tool_choice"] = {"type": "tool", "name": spec["name"]}
+    elif response_format.get("type") == "json_object":
+        system += "\n\n出力はJSONオブジェクトのみとし、前後に説明文を付けないでください。"
+
+    if system.strip():
+        params["system"] = [{"type": "text", "text": system.strip(), "cache_control": {"type": "ephemeral"}}]
+    return params
+
+
+def _from_anthropic(message):
+    """Messages API の応答を chat.completions の応答と同じ属性で読める形に変換"""
+    tool_inputs = [block.input for block in message.content if block.type == "tool_use"]
+    if tool_inputs:
+        content = json.dumps(tool_inputs[0], ensure_ascii=False)
+    else:
+        content = "".join(block.text for block in message.content if block.type == "text")
+
+    usage = message.usage
+    cached_tokens = getattr(usage, "cache_read_input_tokens", 0) or 0
+    cache_write_tokens = getattr(usage, "cache_creation_input_tokens", 0) or 0
+    prompt_tokens = usage.input_tokens + cached_tokens + cache_write_tokens
+    return SimpleNamespace(
+        model=message.model,
+        choices=[SimpleNamespace(
+            index=0,
+            message=SimpleNamespace(role="assistant", content=content),
+            finish_reason=message.stop_reason
+        )],
+        usage=SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=usage.output_tokens,
+            total_tokens=prompt_tokens + usage.output_tokens,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens, cache_write_tokens=cache_write_tokens)
+        )
+    )
+
+
+PROVIDERS = {"openai": OpenAIProvider, "anthropic": AnthropicProvider}
+
+# ==============================
+# ルーティング（レイテンシ・エラー率で呼び出し先を選び、失敗時は次のプロバイダーへ）
+# ==============================
+class ProviderRouter:
+    """
+    観測したレイテンシとエラー率でプロバイダーの呼び出し順を決める
+
+    - レイテンシの移動平均 ×（1 + エラー率 × LLM_ERROR_PENALTY）が小さい順に試す（未計測は先に試す）
+    - 連続 LLM_CIRCUIT_ERRORS 回失敗したプロバイダーは LLM_CIRCUIT_COOLDOWN 秒間、最後に回す
+    - LLM_ROUTING_EXPLORE の確率で2番手を先に試し、遅かったプロバイダーの回復を検知する
+    """
+
+    def __init__(self, providers):
+        self.providers = providers
+        self.stats = {
+            p.name: {"calls": 0, "errors": 0, "latency_ms": None, "error_rate": 0.0, "consecutive_errors": 0, "open_until": 0.0}
+            for p in providers
+        }
+        self._lock = threading.Lock()
+
+    def _score(self, provider):
+        stats = self.stats[provider.name]
+        latency = stats["latency_ms"] or 0
+        return latency * (1 + stats["error_rate"] * LLM_ERROR_PENALTY)
+
+    def ranked(self):
+        """今回の呼び出しで試す順序"""
+        with self._lock:
+            now = time.monotonic()
+            healthy = [p for p in self.providers if self.stats[p.name]["open_until"] <= now]
+            tripped = [p for p in self.providers if self.stats[p.name]["open_until"] > now]
+            healthy.sort(key=self._score)
+            tripped.sort(key=lambda p: self.stats[p.name]["open_until"])
+            if len(healthy) > 1 and random.random() < LLM_ROUTING_EXPLORE:
+                healthy[0], healthy[1] = healthy[1], healthy[0]
+            return healthy + tripped
+
+    def success(self, provider, latency_ms):
+        with self._lock:
+            stats = self.stats[provider.name]
+            stats["calls"] += 1
+            stats["latency_ms"] = latency_ms if stats["latency_ms"] is None else stats["latency_ms"] * 0.8 + latency_ms * 0.2
+            stats["error_rate"] *= 0.8
+            stats["consecutive_errors"] = 0
+            stats["open_until"] = 0.0
+
+    def failure(self, provider):
+        with self._lock:
+            stats = self.stats[provider.name]
+            stats["calls"] += 1
+            stats["errors"] += 1
+            stats["error_rate"] = stats["error_rate"] * 0.8 + 0.2
+            stats["consecutive_errors"] += 1
+            if len(self.providers) > 1 and stats["consecutive_errors"] >= LLM_CIRCUIT_ERRORS:
+                stats["open_until"] = time.monotonic() + LLM_CIRCUIT_COOLDOWN
+                stats["consecutive_errors"] = 0
+                print(f"   🔌 {provider.name} で{LLM_CIRCUIT_ERRORS}回連続エラーのため{LLM_CIRCUIT_COOLDOWN:.0f}秒間後回しにします")
+
+    def summary(self):
+        parts = []
+        for name, stats in self.stats.items():
+            latency = f"{stats['latency_ms']:.0f}ms" if stats["latency_ms"] is not None else "-"
+            parts.append(f"{name} {stats['calls']}回（平均 {latency}、エラー {stats['errors']}回）")
+        return "ルーティング: " + " / ".join(parts)
+
+
+router = ProviderRouter([PROVIDERS[name]() for name in LLM_PROVIDERS])
+
+# ==============================
+# API呼び出し（429/5xxでバックオフ）
+# ==============================
+def _retry_after(error):
+    """429応答の retry-after-ms / retry-after ヘッダー（秒、なければNone）"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def create_completion(stage, **kwargs):
+    """
+    chat.completions.create 形式の呼び出しをルーティング・レート制御・指数バックオフ付きで実行し、使用量を記録
+
+    プロバイダーが複数ある場合は速い順に試し、失敗したら待たずに次のプロバイダーへ切り替える。
+    全プロバイダーが失敗し、リトライ対象のエラーが含まれる場合のみバックオフして再試行する。
+
+    Args:
+        stage: 集計用の工程名（scoring, message など）
+        **kwargs: chat.completions.create の引数（Anthropicでは model を ANTHROPIC_MODEL_MAP・ANTHROPIC_MODEL で読み替える）
+
+    Returns:
+        ChatCompletion: APIレスポンス（Anthropicの場合は同じ属性を持つオブジェクト）
+    """
+    model = kwargs.get("model")
+    started = time.perf_counter()
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        error = None
+        failed_provider = None
+        retryable = False
+        rate_limited = []
+        for provider in router.ranked():
+            # 記録の再生時は実APIの制限を受けないため待機しない
+            limiter = provider.limiter if LLM_CASSETTE != "replay" else None
+            cost = limiter.acquire() if limiter else None
+            call_started = time.perf_counter()
+            try:
+                response, headers = provider.create(kwargs)
+            except Exception as e:
+                if limiter:
+                    limiter.release(cost, provider.limit_headers(getattr(getattr(e, "response", None), "headers", None)))
+                router.failure(provider)
+                error, failed_provider = e, provider
+                retryable = retryable or provider.is_retryable(e)
+                if provider.is_rate_limited(e):
+                    rate_limited.append((provider, e))
+                if len(router.providers) > 1:
+                    print(f"   🔀 {provider.name} でエラーのため次のプロバイダーを試します: {e}")
+                continue
+
+            usage = getattr(response, "usage", None)
+            if limiter:
+                limiter.release(cost, headers, usage)
+            router.success(provider, (time.perf_counter() - call_started) * 1000)
+            llm_metrics.record(stage, getattr(response, "model", None) or model,
+                               int((time.perf_counter() - started) * 1000), attempt,
+                               usage=usage, provider=provider.name)
+            return response
+
+        if not retryable or attempt >= LLM_MAX_RETRIES:
+            llm_metrics.record(stage, model, int((time.perf_counter() - started) * 1000), attempt,
+                               error=str(error), provider=failed_provider.name)
+            raise error
+
+        delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))
+        delay = random.uniform(delay / 2, delay)  # ジッターで同時リトライの集中を避ける
+        print(f"   ⏳ APIエラーのためリトライ ({attempt + 1}/{LLM_MAX_RETRIES}): {error} → {delay:.1f}秒待機")
+        for provider, e in rate_limited:
+            # 429はそのプロバイダーを使う全スレッドで待機（次の acquire() で止まる）
+            if provider.limiter:
+                provider.limiter.penalize(max(delay, _retry_after(e) or 0))
+        if len(rate_limited) < len(router.providers):
+            time.sleep(delay)
+
+
+def chat(stage, messages, **kwargs):
+    """メッセージを送って応答本文（文字列）を返す"""
+    response = create_completion(stage, messages=messages, **kwargs)
+    return response.choices[0].message.content
@@ -0,0 +1,220 @@
+# aiagent/log_writer.py
+# 送信・申請ログの共通ライター（ファイルを開いたまま行をバッファし、件数・時間・終了時・シグナルでまとめて書き出す）
+
+import os
+import io
+import csv
+import glob
+import json
+import time
+import atexit
+import signal
+import threading
+from datetime import datetime, date
+
+# ==============================
+# 設定
+# ==============================
+LOG_FORMAT = os.getenv("LOG_FORMAT", "csv").lower()  # csv / jsonl
+LOG_FLUSH_ROWS = int(os.getenv("LOG_FLUSH_ROWS", 20))  # この件数たまったら書き出す
+LOG_FLUSH_SECONDS = float(os.getenv("LOG_FLUSH_SECONDS", 5))  # 最後の書き出しからこの秒数で書き出す
+LOG_ROTATE_BYTES = int(os.getenv("LOG_ROTATE_BYTES", 0))  # このサイズを超えたら別ファイルに切り替える（0=しない）
+LOG_ROTATE_DAILY = os.getenv("LOG_ROTATE_DAILY", "off").lower() in ("on", "1", "true", "yes")  # 日付が変わったら切り替える
+
+# ==============================
+# パス・読み込み
+# ==============================
+def log_path(path, fmt=LOG_FORMAT):
+    """ログの実際の保存先（jsonl なら拡張子を .jsonl にする）"""
+    return os.path.splitext(path)[0] + ".jsonl" if fmt == "jsonl" else path
+
+
+def iter_log_rows(path):
+    """
+    ログの行をdictで順に読み出す（CSV・JSON Lines の両方と、切り替え済みの古いファイルを含む）
+
+    path には書き出し時と同じ .csv のパスを渡す。LOG_FORMAT を途中で変えた場合も両方の形式を読む。
+    """
+    stem = os.path.splitext(path)[0]
+    for ext in (".csv", ".jsonl"):
+        current = stem + ext
+        # 切り替え済みのファイルは名前では順序が決まらない（<日時>-1 が <日時> より前に並ぶ）ため更新日時順に読む
+        rotated = sorted(glob.glob(glob.escape(stem) + ".*" + ext), key=lambda file: (os.stat(file).st_mtime_ns, file))
+        for file in rotated + [current]:
+            if not os.path.exists(file):
+                continue
+            with open(file, "r", encoding="utf-8", newline="") as f:
+                if ext == ".csv":
+                    yield from csv.DictReader(f)
+                    continue
+                for line in f:
+                    if line.strip():
+                        try:
+                            yield json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+
+# ==============================
+# ライター本体
+# ==============================
+class BufferedLogWriter:
+    """
+    1行ずつ追記するログファイルのライター
+
+    - ファイルは最初の書き出し時に開き、以降は開いたまま追記する（ヘッダーは空のファイルにだけ書く）
+    - 行はメモリにためて flush_rows 件ごと・flush_seconds 秒ごと（バックグラウンドで確認）に書き出す
+    - プロセス終了時（Ctrl-C・SIGTERM を含む）に残りの行を書き出す
+    - fmt="jsonl" なら拡張子を .jsonl にして1行1 JSONで書く
+    - rotate_bytes / rotate_daily で古いファイルを <名前>.<日時>.<拡張子> に退避して新しいファイルに切り替える
+    - 既存のCSVのヘッダーが fieldnames と違う場合も同じ名前で退避してから書き始める
+    """
+
+    def __init__(self, path, fieldnames, fmt=LOG_FORMAT, flush_rows=LOG_FLUSH_ROWS,
+                 flush_seconds=LOG_FLUSH_SECONDS, rotate_bytes=LOG_ROTATE_BYTES, rotate_daily=LOG_ROTATE_DAILY):
+        self.fmt = "jsonl" if fmt == "jsonl" else "csv"
+        self.path = log_path(path, self.fmt)
+        self.fieldnames = fieldnames
+        self.flush_rows = max(1, flush_rows)
+        self.flush_seconds = flush_seconds
+        self.rotate_bytes = rotate_bytes
+        self.rotate_daily = rotate_daily
+        self.rows = 0
+        self._buffer = []
+        self._file = None
+        self._opened_day = None
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+        _register(self)
+
+    def write(self, row):
+        """1行を追加（しきい値に達したら書き出す）"""
+        with self._lock:
+            self._buffer.append({name: row.get(name, "") for name in self.fieldnames})
+            self.rows += 1
+            if len(self._buffer) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_seconds:
+                self.flush()
+
+    def flush(self):
+        """バッファ中の行をまとめて書き出す"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._buffer:
+                return
+            self._rotate_if_needed()
+            rows, self._buffer = self._buffer, []
+            try:
+                self._file.write(self._render(rows))
+            except BaseException:
+                # 書き出す前に中断された行はバッファに戻す（終了時にもう一度書き出す）
+                self._buffer[:0] = rows
+                raise
+            self._file.flush()
+
+    def _render(self, rows):
+        if self.fmt == "jsonl":
+            return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+        out = io.StringIO()
+        csv.DictWriter(out, fieldnames=self.fieldnames).writerows(rows)
+        return out.getvalue()
+
+    def _open(self):
+        if self.fmt == "csv" and self._header() not in (None, self.fieldnames):
+            # 列が変わった既存のCSVには追記せず退避する（古いヘッダーの下に列数の違う行を書かない）
+            os.replace(self.path, self._rotated_path(datetime.now().strftime("%Y%m%d-%H%M%S")))
+        self._file = open(self.path, "a", newline="", encoding="utf-8")
+        self._opened_day = date.today()
+        if self.fmt == "csv" and self._file.tell() == 0:
+            csv.DictWriter(self._file, fieldnames=self.fieldnames).writeheader()
+
+    def _header(self):
+        """既存のCSVのヘッダー（ファイルがない・空ならNone）"""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "r", newline="", encoding="utf-8") as f:
+            return next(csv.reader(f), None)
+
+    def _rotated_path(self, stamp):
+        stem, ext = os.path.splitext(self.path)
+        rotated = f"{stem}.{stamp}{ext}"
+        suffix = 1
+        while os.path.exists(rotated):
+            rotated = f"{stem}.{stamp}-{suffix}{ext}"
+            suffix += 1
+        return rotated
+
+    def _rotate_if_needed(self):
+        if self._file is None:
+            self._open()
+        day_changed = self.rotate_daily and date.today() != self._opened_day
+        too_large = self.rotate_bytes and self._file.tell() >= self.rotate_bytes
+        if not (day_changed or too_large):
+            return
+        self._file.close()
+        stamp = self._opened_day.isoformat() if day_changed else datetime.now().strftime("%Y%m%d-%H%M%S")
+        os.replace(self.path, self._rotated_path(stamp))
+        self._open()
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+# ==============================
+# 時間経過・終了時・シグナルでの書き出し
+# ==============================
+_writers = []
+_registry_lock = threading.Lock()
+_flusher = None
+
+
+def _register(writer):
+    global _flusher
+    with _registry_lock:
+        _writers.append(writer)
+        if _flusher is None:
+            atexit.register(close_all)
+            _install_signal_handlers()
+            _flusher = threading.Thread(target=_flush_loop, name="log-writer-flush", daemon=True)
+            _flusher.start()
+
+
+def _flush_loop():
+    """しばらく書き込みがないライターも flush_seconds ごとに書き出す"""
+    while True:
+        time.sleep(min([w.flush_seconds for w in _writers] or [LOG_FLUSH_SECONDS]) or 1)
+        for writer in list(_writers):
+            if time.monotonic() - writer._last_flush >= writer.flush_seconds:
+                try:
+                    writer.flush()
+                except Exception as e:
+                    print(f"⚠️ ログの書き出しに失敗しました（{writer.path}）: {e}")
+
+
+def close_all():
+    """全ライターの残りの行を書き出して閉じる"""
+    for writer in list(_writers):
+        try:
+            writer.close()
+        except Exception as e:
+            print(f"⚠️ ログの書き出しに失敗しました（{writer.path}）: {e}")
+
+
+def _install_signal_handlers():
+    """
+    SIGTERM / SIGHUP を SystemExit に変えて終了処理（atexit での書き出し）を通す
+
+    Ctrl-C（SIGINT）は KeyboardInterrupt として終了処理を通るため変更しない。
+    独自のハンドラが設定済みのシグナルと、メインスレッド以外からの呼び出しでは何もしない。
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    for name in ("SIGTERM", "SIGHUP"):
+        signum = getattr(signal, name, None)
+        if signum is not None and signal.getsignal(signum) == signal.SIG_DFL:
+            signal.signal(signum, _exit_on_signal)
+
+
+def _exit_on_signal(signum, frame):
+    raise SystemExit(128 + signum)
@@ -2,7 +2,7 @@
 import streamlit as st
 import sys
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # =====================================
 # パス設定（aiagent をモジュールとして認識させる）
@@ -15,6 +15,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from aiagent.linkedin_scraper import scrape_candidates
 from aiagent.analyzer import analyze_candidates
 from aiagent.linkedin_sender import send_connection_requests
+from aiagent.snapshots import snapshots_enabled, snapshot_available, sync_csv, read_snapshot
 from dotenv import load_dotenv
 
 # =====================================
@@ -41,10 +42,12 @@ if "last_run" not in st.session_state:
 # データパス定義
 # =====================================
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, "../data")
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "../data")
 SENT_LOG_PATH = os.path.join(DATA_DIR, "sent_log.csv")
+SENT_LOG_COLUMNS = ["date", "name", "profile_url", "result", "error"]
 SCORED_PATH = os.path.join(DATA_DIR, "candidates_scored.csv")
 RAW_PATH = os.path.join(DATA_DIR, "candidates_raw.csv")
+LLM_METRICS_PATH = os.path.join(DATA_DIR, "llm_metrics.jsonl")
 
 # =====================================
 # ログ関数
@@ -104,10 +107,22 @@ elif selected_tab == "ダッシュボード":
     st.write("送信数や返信率などを実データで可視化します。")
 
     import pandas as pd
+    period_days = st.number_input("集計期間（日）", min_value=1, max_value=3650, value=90, step=1)
+    since = (datetime.now() - timedelta(days=int(period_days))).date()
+
+    df = None
     if os.path.exists(SENT_LOG_PATH):
-        df = pd.read_csv(SENT_LOG_PATH)
-        if not df.empty:
+        if snapshots_enabled():
+            # sent_log.csv の追加分だけをParquetに取り込み、必要な列と期間内の日付パーティションだけを読む
+            sync_csv("sent_log", SENT_LOG_PATH)
+            df = read_snapshot("sent_log", columns=SENT_LOG_COLUMNS, since=since)
+        else:
+            df = pd.read_csv(SENT_LOG_PATH, usecols=lambda column: column in SENT_LOG_COLUMNS).reindex(columns=SENT_LOG_COLUMNS)
             df["date"] = pd.to_datetime(df["date"], errors="coerce")
+        df = df[df["date"].dt.date >= since]
+
+    if df is not None:
+        if not df.empty:
             df["day"] = df["date"].dt.date
 
             st.subheader("日別 送信数")
@@ -121,6 +136,70 @@ elif selected_tab == "ダッシュボード":
     else:
         st.info("送信ログがまだありません。AI提案条件タブから実行してください。")
 
+    if snapshot_available("scores"):
+        st.subheader("日別 スコアリング件数")
+        scores = read_snapshot("scores", columns=["scored_at", "decision", "total_score"], since=since)
+        if not scores.empty:
+            scores["day"] = scores["scored_at"].dt.date
+            st.bar_chart(scores.pivot_table(index="day", columns="decision", values="total_score", aggfunc="count", fill_value=0))
+            st.caption(f"平均スコア: {scores['total_score'].mean():.1f}（{len(scores)} 件）")
+
+    st.subheader("API使用量（トークン・コスト・レイテンシ）")
+    if os.path.exists(LLM_METRICS_PATH):
+        metrics = pd.read_json(LLM_METRICS_PATH, lines=True)
+        if not metrics.empty:
+            metrics["tokens"] = metrics["prompt_tokens"] + metrics["completion_tokens"]
+            for column in ("cached_tokens", "cache_write_tokens"):
+                if column not in metrics:
+                    metrics[column] = 0
+                metrics[column] = metrics[column].fillna(0)
+
+            by_stage = metrics.groupby("stage").agg(
+                呼び出し数=("stage", "size"),
+                入力トークン=("prompt_tokens", "sum"),
+                出力トークン=("completion_tokens", "sum"),
+                キャッシュ済み入力=("cached_tokens", "sum"),
+                キャッシュ書き込み=("cache_write_tokens", "sum"),
+                推定コスト_USD=("cost_usd", "sum"),
+                平均レイテンシ_ms=("latency_ms", "mean"),
+                p95レイテンシ_ms=("latency_ms", lambda x: x.quantile(0.95)),
+                リトライ数=("retries", "sum"),
+            )
+            by_stage["キャッシュ率_%"] = (by_stage["キャッシュ済み入力"] / by_stage["入力トークン"].where(by_stage["入力トークン"] > 0) * 100).round(1)
+            st.dataframe(by_stage, use_container_width=True)
+
+            col1, col2 = st.columns(2)
+            with col1:
+                st.caption("工程別 推定コスト（USD）")
+                st.bar_chart(by_stage["推定コスト_USD"])
+            with col2:
+                st.caption("工程別 平均レイテンシ（ms）")
+                st.bar_chart(by_stage["平均レイテンシ_ms"])
+
+            if "provider" not in metrics:
+                metrics["provider"] = "openai"
+            metrics["provider"] = metrics["provider"].fillna("openai")
+            if metrics["provider"].nunique() > 1:
+                st.caption("プロバイダー別")
+                st.dataframe(metrics.groupby("provider").agg(
+                    呼び出し数=("provider", "size"),
+                    推定コスト_USD=("cost_usd", "sum"),
+                    平均レイテンシ_ms=("latency_ms", "mean"),
+                    p95レイテンシ_ms=("latency_ms", lambda x: x.quantile(0.95)),
+                    エラー数=("error", "count"),
+                ), use_container_width=True)
+
+            st.caption("実行別 推定コスト（USD、工程ごとの内訳）")
+            by_run = metrics.pivot_table(index="run_id", columns="stage", values="cost_usd", aggfunc="sum", fill_value=0)
+            st.bar_chart(by_run)
+
+            st.caption("実行別 トークン数")
+            st.bar_chart(metrics.pivot_table(index="run_id", columns="stage", values="tokens", aggfunc="sum", fill_value=0))
+        else:
+            st.info("API使用量の記録がまだありません。")
+    else:
+        st.info("API使用量の記録がまだありません。")
+
 # =====================================
 # タブ③：返信フォロー（ダミー）
 # =====================================
@@ -0,0 +1,126 @@
+# aiagent/message_queue.py
+# メッセージ生成と送信の並行実行（生成ワーカー → 上限付きキュー → ブラウザ送信）と承認済みメッセージの保存
+
+import os
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# ==============================
+# 設定
+# ==============================
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
+APPROVED_FILE = os.path.join(DATA_DIR, "approved_messages.jsonl")
+
+os.makedirs(DATA_DIR, exist_ok=True)
+
+MESSAGE_WORKERS = int(os.getenv("MESSAGE_WORKERS", 4))  # メッセージ生成の同時実行数
+MESSAGE_QUEUE_SIZE = int(os.getenv("MESSAGE_QUEUE_SIZE", 8))  # 送信待ちとして先行生成する件数の上限
+
+_DONE = object()
+
+# ==============================
+# 承認済みメッセージ
+# ==============================
+class ApprovedMessageStore:
+    """
+    承認済みメッセージと送信状態をJSONLに追記保存
+
+    同じプロフィールURLの記録は後のものが優先される（approved → sent / failed）。
+    再実行時は送信済みの候補者を除外し、承認済みのメッセージは生成し直さずに再利用する。
+    """
+
+    def __init__(self, path=APPROVED_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._records[record["profile_url"]] = {**self._records.get(record["profile_url"], {}), **record}
+
+    def _append(self, record):
+        with self._lock:
+            self._records[record["profile_url"]] = {**self._records.get(record["profile_url"], {}), **record}
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def get(self, profile_url):
+        """承認済み（未送信）のメッセージ（なければNone）"""
+        record = self._records.get(profile_url)
+        if record and record.get("status") != "sent" and record.get("message"):
+            return record
+        return None
+
+    def is_sent(self, profile_url):
+        record = self._records.get(profile_url)
+        return bool(record) and record.get("status") == "sent"
+
+    def approve(self, name, profile_url, score, message):
+        """生成したメッセージを承認済みとして保存"""
+        record = {
+            "profile_url": profile_url,
+            "name": name,
+            "score": score,
+            "message": message,
+            "status": "approved",
+            "updated_at": datetime.now().isoformat(timespec="seconds")
+        }
+        self._append(record)
+        return record
+
+    def mark(self, profile_url, status):
+        """送信結果（sent / failed）を記録"""
+        self._append({
+            "profile_url": profile_url,
+            "status": status,
+            "updated_at": datetime.now().isoformat(timespec="seconds")
+        })
+
+# ==============================
+# 先行生成
+# ==============================
+def prefetch(items, prepare, workers=MESSAGE_WORKERS, queue_size=MESSAGE_QUEUE_SIZE):
+    """
+    prepare(item) をワーカーで並列実行し、結果を入力順に返す
+
+    生成は送信より最大 queue_size 件先まで進め、送信側はキューから順に取り出す。
+    全体の所要時間は「生成 + 送信」ではなく、ほぼ max(生成, 送信) になる。
+
+    Args:
+        items: 入力のイテラブル
+        prepare: 1件を処理する関数（例外はそのまま送信側で再送出される）
+        workers: 同時実行数
+        queue_size: 先行生成する件数の上限
+
+    Returns:
+        generator: prepare(item) の結果を入力順に返す（呼び出した時点で生成を開始する）
+    """
+    results = queue.Queue(maxsize=max(1, queue_size))
+
+    def produce():
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                # キューが埋まっている間は投入を止め、送信側より先に進むのは queue_size 件までにする
+                for item in items:
+                    results.put(executor.submit(prepare, item))
+        finally:
+            results.put(_DONE)
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    def drain():
+        while True:
+            future = results.get()
+            if future is _DONE:
+                return
+            yield future.result()
+
+    return drain()
@@ -0,0 +1,162 @@
+# aiagent/message_variants.py
+# メッセージ文面のバリエーションプール（宛名なしの文面を事前に数件生成し、宛名はローカルで差し込む）
+
+import os
+import json
+import atexit
+import random
+import hashlib
+import threading
+from dotenv import load_dotenv
+
+from aiagent.llm_client import chat
+
+# ==============================
+# 設定
+# ==============================
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
+VARIANTS_FILE = os.path.join(DATA_DIR, "message_variants.json")
+
+os.makedirs(DATA_DIR, exist_ok=True)
+
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+MESSAGE_VARIANT_COUNT = int(os.getenv("MESSAGE_VARIANT_COUNT", 5))  # 用意するバリエーション数
+
+NAME_PLACEHOLDER = "{name}"
+
+# バリエーション生成の指示（宛名は {name} のまま残させる）
+VARIANT_SYSTEM_PROMPT = """あなたはメッセージ生成アシスタントです。
+以下のメッセージテンプレートを元に、自然で親しみやすいメッセージを生成してください。
+大幅な変更は不要です。語尾や表現を少しだけ変えてください。
+
+【テンプレート】
+{template}
+
+【要件】
+- 宛名は「{{name}}さん」のまま残す（{{name}} は後で名前に置き換える）
+- 内容の構造は基本的にテンプレート通り
+- 語尾や接続詞を少しだけ自然にバリエーションを付ける
+- 箇条書き（・）はそのまま維持
+- 全体の長さはテンプレートと同程度
+- 他の説明は一切不要、メッセージ本文のみ出力
+"""
+
+# ==============================
+# バリエーションプール
+# ==============================
+class MessageVariantPool:
+    """
+    テンプレートごとのメッセージバリエーション
+
+    - 文面は宛名を {name} のまま生成し、送信時にローカルで名前を差し込む
+    - 使用回数を記録し、使用回数が最も少ない文面から順に使う
+      （使用回数はメモリ上で数え、flush() またはプロセス終了時にまとめて保存する）
+    - テンプレートが変わったら別のプールとして生成し直す
+    """
+
+    def __init__(self, template, path=VARIANTS_FILE, size=MESSAGE_VARIANT_COUNT, model=OPENAI_MODEL):
+        self.template = template
+        self.path = path
+        self.size = size
+        self.model = model
+        self.key = hashlib.sha256(f"{model}\n{template}".encode("utf-8")).hexdigest()[:16]
+        self._attempted = False  # 生成はプロセスごとに1回まで（失敗時に毎回APIを呼ばない）
+        self._lock = threading.Lock()
+        self._variants = None
+        self._dirty = False  # 保存していない使用回数があるか
+        atexit.register(self.flush)
+
+    # ------------------------------
+    # 保存・読み込み
+    # ------------------------------
+    def _load_all(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return {}
+
+    def _save(self):
+        self._dirty = False
+        pools = self._load_all()
+        pools[self.key] = {"model": self.model, "template": self.template, "variants": self._variants}
+        tmp_file = self.path + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(pools, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.path)
+
+    # ------------------------------
+    # 生成
+    # ------------------------------
+    def _is_valid(self, text):
+        """宛名の置き換え位置があり、テンプレートから大きく外れていない文面か"""
+        if not text.startswith(f"{NAME_PLACEHOLDER}さん"):
+            return False
+        if "{" in text.replace(NAME_PLACEHOLDER, "") or "}" in text.replace(NAME_PLACEHOLDER, ""):
+            return False
+        return 0.5 <= len(text) / len(self.template) <= 1.5
+
+    def _generate_one(self, number):
+        """バリエーションを1件生成（不正な文面・エラー時はNone）"""
+        try:
+            text = chat(
+                "message",
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": VARIANT_SYSTEM_PROMPT.format(template=self.template)},
+                    {"role": "user", "content": f"バリエーション{number}を作成してください。"}
+                ],
+                temperature=0.8,
+                max_tokens=400
+            ).strip()
+        except Exception as e:
+            print(f"   ⚠️ メッセージ生成エラー: {e}")
+            return None
+        if not self._is_valid(text):
+            print(f"   ⚠️ 宛名 {NAME_PLACEHOLDER} を含まない文面のため破棄しました（バリエーション{number}）")
+            return None
+        return text
+
+    def ensure(self):
+        """プールを読み込み、不足分のバリエーションを生成"""
+        with self._lock:
+            if self._variants is None:
+                self._variants = self._load_all().get(self.key, {}).get("variants", [])
+            missing = self.size - len(self._variants)
+            if missing <= 0 or self._attempted:
+                return self._variants
+            self._attempted = True
+
+            print(f"📝 メッセージのバリエーションを {missing} 件生成中...")
+            for number in range(len(self._variants) + 1, self.size + 1):
+                text = self._generate_one(number)
+                if text is not None:
+                    self._variants.append({"text": text, "uses": 0})
+            self._save()
+            return self._variants
+
+    # ------------------------------
+    # 差し込み
+    # ------------------------------
+    def render(self, name):
+        """使用回数が最も少ないバリエーションに名前を差し込んで返す（プールが空ならテンプレートを使用）"""
+        variants = self.ensure()
+        with self._lock:
+            if not variants:
+                return self.template.replace(NAME_PLACEHOLDER, name)
+            fewest = min(v["uses"] for v in variants)
+            variant = random.choice([v for v in variants if v["uses"] == fewest])
+            variant["uses"] += 1
+            self._dirty = True
+            return variant["text"].replace(NAME_PLACEHOLDER, name)
+
+    def flush(self):
+        """メモリ上の使用回数を保存"""
+        with self._lock:
+            if self._dirty:
+                self._save()
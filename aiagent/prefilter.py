@@ -0,0 +1,134 @@
+# aiagent/prefilter.py
+# LLMスコアリング前のルールベース除外判定（v2評価基準の「即座に除外」条件をローカルで判定）
+
+import re
+
+from aiagent.age_estimator import MAX_AGE, age_facts
+
+# ==============================
+# 設定
+# ==============================
+SEGMENT_END = r"(?=\s*(?:$|[|｜/／,、・()（）]))"  # 行末または区切り文字の直前
+
+# 除外キーワード（カテゴリ → パターン）。英字は前後が英字でない場合のみ一致させる
+# 学生は語の終わりでのみ一致させ、紛らわしい表記（「大学生向け」など）は除外せずLLMの判定に任せる
+EXCLUSION_PATTERNS = {
+    "executive": [
+        "代表取締役", "取締役", "執行役員", r"社長(?!室)",
+        r"(?<![A-Za-z])(?:CEO|CIO|CTO|CFO)(?![A-Za-z])",
+    ],
+    "hr": [
+        "人材紹介", "人材派遣", "リクルーター", "採用担当", "ヘッドハンター",
+        "キャリアアドバイザー", "人事コンサルタント",
+        r"(?<![A-Za-z])(?:Recruiter|Headhunter|Talent Acquisition)(?![A-Za-z])",
+    ],
+    "student": [
+        r"(?:大学院|大学|専門学校)?学生" + SEGMENT_END, r"(?:大学院|大学)生" + SEGMENT_END, "在学中",
+        r"(?<![A-Za-z])Student(?:" + SEGMENT_END + r"| (?:at|@) )",
+    ],
+    "future": [
+        r"株式会社フューチャー(?:アーキテクト)?", r"フューチャー(?:アーキテクト)?株式会社", "フューチャーアーキテクト",
+        r"(?<![A-Za-z])Future (?:Architect|Corporation|Inc)",
+    ],
+}
+
+EXCLUSION_LABELS = {
+    "premium": "LinkedIn Premium会員",
+    "executive": "経営層",
+    "hr": "HR・人材関係",
+    "student": "学生",
+    "future": "フューチャー/フューチャーアーキテクト在籍",
+    "age": f"{MAX_AGE + 1}歳以上",
+}
+
+# 全カテゴリを名前付きグループで1本の正規表現にまとめ、1回の走査で判定する
+EXCLUSION_MATCHER = re.compile(
+    "|".join(
+        f"(?P<{category}>{'|'.join(patterns)})"
+        for category, patterns in EXCLUSION_PATTERNS.items()
+    ),
+    re.IGNORECASE | re.MULTILINE
+)
+
+# 直前が「元」「前」「ex-」なら過去の所属・役職なので除外しない（例: 元フューチャーアーキテクト）
+FORMER_PREFIX = re.compile(r"(?:元|前|(?<![A-Za-z])(?:ex-|ex\s|former\s))\s*(?:株式会社)?\s*$", re.IGNORECASE)
+
+CURRENT_MARKERS = ("現在", "在職中", "present")
+YEAR_PATTERN = re.compile(r"(?:19|20)\d{2}")
+
+# ==============================
+# プロフィール解析
+# ==============================
+def _is_true(value):
+    return str(value).strip().lower() in ("true", "yes", "1")
+
+
+def current_experiences(experiences):
+    """
+    職歴文字列から現在の職歴行を取り出す
+
+    職歴は「役職 @ 会社 (期間)」の改行区切り（get_profile_details の出力形式）。
+    期間に「現在」「Present」を含む行を現職とみなし、期間情報がなければ先頭行を使う。
+    """
+    lines = [line.strip() for line in str(experiences or "").splitlines() if line.strip()]
+    current = [line for line in lines if any(m in line.lower() for m in CURRENT_MARKERS)]
+    if current:
+        return current
+    if lines and not any(YEAR_PATTERN.search(line) for line in lines):
+        return lines[:1]
+    return []
+
+
+# ==============================
+# 除外判定
+# ==============================
+def check_exclusion(candidate):
+    """
+    除外条件に該当するか判定
+
+    Args:
+        candidate: プロフィールdict（headline, experiences, education, is_premium）
+
+    Returns:
+        tuple or None: (カテゴリ, 該当した文字列)。該当しなければNone
+    """
+    if _is_true(candidate.get("is_premium", False)):
+        return "premium", "Premium"
+
+    # 経営層・HR・学生・在籍企業はヘッドラインと現職のみで判定（過去の職歴では除外しない）
+    text = "\n".join([str(candidate.get("headline") or "")] + current_experiences(candidate.get("experiences")))
+    for match in EXCLUSION_MATCHER.finditer(text):
+        line_start = text.rfind("\n", 0, match.start()) + 1
+        if not FORMER_PREFIX.search(text[line_start:match.start()]):
+            return match.lastgroup, match.group(0)
+
+    facts = age_facts(candidate.get("education"))
+    if facts["excluded"]:
+        return "age", f"{facts['estimated_age']}歳（{facts['graduation_year']}年卒）"
+
+    return None
+
+
+def excluded_result(category, detail, education=None):
+    """除外時のスコアリング結果（v2形式、APIは呼ばない）"""
+    facts = age_facts(education)
+    return {
+        "estimated_age": facts["estimated_age"],
+        "age_reasoning": f"{facts['graduation_year']}年卒から算出" if facts["graduation_year"] else "",
+        "age_score": 0,
+        "it_experience_score": 0,
+        "position_score": 0,
+        "total_score": 0,
+        "decision": "skip",
+        "reason": f"ルール除外: {EXCLUSION_LABELS[category]}（{detail}）",
+        "prefiltered": True
+    }
+
+
+def prefilter(candidate):
+    """除外対象なら除外結果を、そうでなければNoneを返す"""
+    exclusion = check_exclusion(candidate)
+    if exclusion is None:
+        return None
+    category, detail = exclusion
+    return excluded_result(category, detail, candidate.get("education"))
@@ -0,0 +1,114 @@
+# aiagent/profile_diff.py
+# プロフィールの変更検知（内容のフィンガープリントを前回のスコアリング結果と比較し、変更のない候補者は結果を引き継ぐ）
+
+import os
+import csv
+import json
+import hashlib
+
+from aiagent.score_cache import normalize_text
+from aiagent.profile_identity import canonical_profile_url
+
+# ==============================
+# 設定
+# ==============================
+INCREMENTAL_SCORING = os.getenv("INCREMENTAL_SCORING", "on").lower() not in ("off", "0", "false", "no")
+
+# フィンガープリントの対象（スコアリングに使うプロフィール項目）
+FINGERPRINT_FIELDS = ["headline", "location", "is_premium", "experiences", "education", "skills"]
+
+# CSVから読み込んだ前回結果のうち、数値に戻す項目
+INT_FIELDS = ["estimated_age", "age_score", "it_experience_score", "position_score", "total_score"]
+
+# ==============================
+# フィンガープリント
+# ==============================
+def fingerprint(profile, version=""):
+    """
+    プロフィール内容のフィンガープリント（正規化した項目 + 評価条件のSHA-256、先頭16桁）
+
+    version にはモデル・プロンプト版などを渡す（評価条件が変わったら全員を再スコアリングする）。
+    """
+    payload = {
+        "version": version,
+        "profile": {field: normalize_text(profile.get(field, "")) for field in FINGERPRINT_FIELDS}
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+# ==============================
+# 前回結果の読み込み
+# ==============================
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def load_previous_csv(path):
+    """前回のスコアリング結果CSV（正規化したプロフィールURL → 結果）。フィンガープリントのない行は対象外"""
+    if not os.path.exists(path):
+        return {}
+    previous = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if not row.get("profile_url") or not row.get("fingerprint"):
+                continue
+            for field in INT_FIELDS:
+                if field in row:
+                    row[field] = _to_int(row[field])
+            previous[canonical_profile_url(row["profile_url"])] = row
+    return previous
+
+
+def load_previous_json(path):
+    """前回のスコアリング結果JSON（正規化したプロフィールURL → 結果）。フィンガープリントのない要素は対象外"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️ 前回のスコアリング結果を読み込めませんでした（全員を再スコアリングします）: {e}")
+        return {}
+    return {canonical_profile_url(r["profile_url"]): r for r in records if r.get("profile_url") and r.get("fingerprint")}
+
+# ==============================
+# 差分判定
+# ==============================
+def diff_profiles(profiles, previous, version=""):
+    """
+    前回結果と比べて、再スコアリングが必要な候補者と結果を引き継ぐ候補者に分ける
+
+    Args:
+        profiles: 今回取得したプロフィールのリスト（順序を保つ）
+        previous: load_previous_csv / load_previous_json の戻り値
+        version: fingerprint に渡す評価条件
+
+    Returns:
+        tuple: (再スコアリング対象のリスト, 引き継ぐ (プロフィール, 前回結果) のリスト, 件数のdict)
+    """
+    changed = []
+    carried = []
+    counts = {"new": 0, "changed": 0, "unchanged": 0}
+
+    for profile in profiles:
+        record = previous.get(canonical_profile_url(profile.get("profile_url")))
+        if record is None:
+            counts["new"] += 1
+            changed.append(profile)
+        elif record["fingerprint"] != fingerprint(profile, version):
+            counts["changed"] += 1
+            changed.append(profile)
+        else:
+            counts["unchanged"] += 1
+            carried.append((profile, record))
+
+    return changed, carried, counts
+
+
+def diff_summary(counts):
+    """差分判定の結果（サマリー表示用）"""
+    return (f"差分判定: 新規 {counts['new']} 件 / 変更あり {counts['changed']} 件 / "
+            f"変更なし {counts['unchanged']} 件（前回の結果を引き継ぎ、API呼び出しなし）")
@@ -0,0 +1,205 @@
+# aiagent/profile_identity.py
+# プロフィールURLの正規化と同一人物の別名表（バニティURL・メンバーID・クエリ付きURLを1つのIDにまとめる）
+
+import os
+import re
+import sys
+import sqlite3
+import threading
+import unicodedata
+from urllib.parse import urlsplit, unquote, quote, parse_qs
+
+# ==============================
+# 設定
+# ==============================
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
+ALIAS_FILE = os.path.join(DATA_DIR, "profile_aliases.sqlite3")
+
+os.makedirs(DATA_DIR, exist_ok=True)
+
+PROFILE_URL_BASE = "https://www.linkedin.com/in/"
+
+# メンバーID（例: ACoAABWBi7YBm8O9tTIJ3vmi_cW0vu3wfI0hhZU）。大文字小文字を区別する
+MEMBER_ID_PATTERN = re.compile(r"ACo[A-Za-z0-9_-]{10,}")
+PROFILE_PATH_PATTERN = re.compile(r"/in/([^/?#]+)")
+
+# メンバーIDを含むクエリパラメータ（例: ?miniProfileUrn=urn%3Ali%3Afs_miniProfile%3AACoAA...）
+MEMBER_ID_PARAMS = ("miniProfileUrn", "profileUrn", "memberUrn")
+
+# ==============================
+# 正規化
+# ==============================
+def parse_profile_url(url):
+    """
+    プロフィールURLからバニティ名（小文字・デコード済み）とメンバーIDを取り出す
+
+    Returns:
+        tuple: (vanity, member_id)。含まれないものはNone
+    """
+    if not url:
+        return None, None
+    parts = urlsplit(url.strip())
+    match = PROFILE_PATH_PATTERN.search(parts.path)
+    segment = unquote(match.group(1)) if match else ""
+
+    vanity = None
+    member_id = None
+    if MEMBER_ID_PATTERN.fullmatch(segment):
+        member_id = segment
+    elif segment:
+        vanity = unicodedata.normalize("NFC", segment).lower()
+
+    query = parse_qs(parts.query)
+    for param in MEMBER_ID_PARAMS:
+        for value in query.get(param, []):
+            found = MEMBER_ID_PATTERN.search(value)
+            if found:
+                member_id = member_id or found.group(0)
+    return vanity, member_id
+
+
+def profile_forms(url):
+    """URLが表す識別子（"id:メンバーID" / "in:バニティ名"）。メンバーIDがあれば先頭"""
+    vanity, member_id = parse_profile_url(url)
+    forms = []
+    if member_id:
+        forms.append(f"id:{member_id}")
+    if vanity:
+        forms.append(f"in:{vanity}")
+    return forms
+
+
+def url_for(identity):
+    """識別子からプロフィールURLを組み立てる（クエリなし、末尾スラッシュあり）"""
+    return PROFILE_URL_BASE + quote(identity.split(":", 1)[1], safe="-_.~") + "/"
+
+# ==============================
+# 別名表
+# ==============================
+class IdentityIndex:
+    """
+    観測したURLの識別子（別名）→ 正規ID の対応表
+
+    - 同じURLにバニティ名とメンバーIDが両方含まれていれば同一人物として結び付ける
+    - 正規IDは最初に観測した識別子（メンバーIDがあればメンバーID）。別々に観測した2つのIDが後で結び付いた場合は、メンバーID側の正規IDにまとめる
+    - 対応表は起動時にメモリへ読み込み、新しい別名だけをSQLiteに追記する
+    - 正規IDをまとめた記録（旧ID → 新ID）も残し、on_merge で登録した処理に通知する
+      （正規URLをキーに保存したデータの付け替え用。別プロセスでの統合は merges() で後から取得する）
+    """
+
+    def __init__(self, path=ALIAS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS profile_aliases (
+                alias TEXT PRIMARY KEY,
+                canonical TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_profile_aliases_canonical ON profile_aliases (canonical)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS profile_merges (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                old TEXT NOT NULL,
+                new TEXT NOT NULL,
+                merged_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self._conn.commit()
+        self._aliases = {}
+        self._members = {}  # 正規ID → 別名の集合
+        self._listeners = []
+        self._apply(self._conn.execute("SELECT alias, canonical FROM profile_aliases"))
+
+    def _apply(self, pairs):
+        for alias, canonical in pairs:
+            previous = self._aliases.get(alias)
+            if previous is not None:
+                self._members.get(previous, set()).discard(alias)
+            self._aliases[alias] = canonical
+            self._members.setdefault(canonical, set()).add(alias)
+
+    def resolve(self, url, register=True):
+        """
+        URLの正規ID（プロフィールURLでなければ空文字）
+
+        register=False なら別名表を更新しない（確認だけの用途）。
+        """
+        forms = profile_forms(url)
+        if not forms:
+            return ""
+        with self._lock:
+            known = [self._aliases[form] for form in forms if form in self._aliases]
+            canonical = known[0] if known else forms[0]
+            if not register:
+                return canonical
+
+            updates = [(form, canonical) for form in forms if self._aliases.get(form) != canonical]
+            # 別々の人物として登録済みだった正規IDを1つにまとめる
+            merged = sorted(set(known) - {canonical})
+            for other in merged:
+                updates += [(alias, canonical) for alias in self._members.pop(other, ())]
+            if updates:
+                self._conn.executemany("INSERT OR REPLACE INTO profile_aliases (alias, canonical) VALUES (?, ?)", updates)
+                self._conn.executemany("INSERT INTO profile_merges (old, new) VALUES (?, ?)",
+                                       [(other, canonical) for other in merged])
+                self._conn.commit()
+                self._apply(updates)
+            listeners = list(self._listeners) if merged else []
+
+        # 通知はロックの外で行う（通知先から resolve を呼べるように）
+        for listener in listeners:
+            listener()
+        return canonical
+
+    def on_merge(self, listener):
+        """正規IDをまとめたときに呼ぶ処理（引数なし）を登録"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def merges(self, after_id=0):
+        """after_id より後に記録された統合 [(id, 旧ID, 新ID), ...]（記録順）"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, old, new FROM profile_merges WHERE id > ? ORDER BY id", (after_id,)
+            ).fetchall()
+
+    def equivalents(self, canonical):
+        """正規IDと同一人物を表す識別子の一覧（まとめる前の正規IDで保存されたデータの検索用）"""
+        with self._lock:
+            aliases = sorted(self._members.get(canonical, ()))
+        return aliases or [canonical]
+
+    def canonical_url(self, url, register=True):
+        """正規IDのプロフィールURL（プロフィールURLでなければそのまま）"""
+        canonical = self.resolve(url, register)
+        return url_for(canonical) if canonical else (url or "")
+
+
+# プロセス内で共有する別名表
+identity_index = IdentityIndex()
+
+
+def canonical_profile_url(url):
+    """プロフィールURLを正規化（同一人物の別の表記は同じURLになる）"""
+    return identity_index.canonical_url(url)
+
+# ==============================
+# エントリポイント
+# ==============================
+if __name__ == "__main__":
+    # 例: python3 aiagent/profile_identity.py "https://www.linkedin.com/in/xxx?miniProfileUrn=..."
+    if len(sys.argv) < 2:
+        print("使い方: python3 aiagent/profile_identity.py <URL> [<URL> ...]")
+        sys.exit(1)
+    for url in sys.argv[1:]:
+        canonical = identity_index.resolve(url)
+        if not canonical:
+            print(f"⚠️ プロフィールURLではありません: {url}")
+            continue
+        print(f"🔗 {url}")
+        print(f"   → {url_for(canonical)}（別名: {', '.join(identity_index.equivalents(canonical))}）")
@@ -0,0 +1,170 @@
+# aiagent/score_cache.py
+# LLMスコアリング結果の永続キャッシュ（モデル・プロンプト版・プロフィール内容のハッシュをキーに保存）
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+
+# ==============================
+# 設定
+# ==============================
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
+CACHE_FILE = os.path.join(DATA_DIR, "score_cache.sqlite3")
+
+os.makedirs(DATA_DIR, exist_ok=True)
+
+SCORE_CACHE_ENABLED = os.getenv("SCORE_CACHE", "on").lower() not in ("off", "0", "false", "no")
+SCORE_CACHE_TTL_DAYS = float(os.getenv("SCORE_CACHE_TTL_DAYS", 30))  # 有効期限（日）
+SCORE_CACHE_MAX_ENTRIES = int(os.getenv("SCORE_CACHE_MAX_ENTRIES", 50000))  # 超えたら古い順に削除
+
+# ==============================
+# キー生成
+# ==============================
+def normalize_text(value):
+    """表記ゆれ（全角/半角、空白、改行）を吸収した文字列に変換"""
+    if value is None:
+        return ""
+    text = unicodedata.normalize("NFKC", str(value))
+    lines = [" ".join(line.split()) for line in text.splitlines()]
+    return "\n".join(line for line in lines if line)
+
+
+def make_key(model, prompt_version, profile, fields):
+    """(モデル, プロンプト版, 正規化したプロフィール項目) のSHA-256をキーにする"""
+    payload = {
+        "model": model,
+        "prompt_version": prompt_version,
+        "profile": {field: normalize_text(profile.get(field, "")) for field in fields}
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+# ==============================
+# キャッシュ本体
+# ==============================
+class ScoreCache:
+    """
+    SQLiteに保存するスコアリング結果キャッシュ
+
+    - TTLを過ぎたエントリはミス扱いで削除
+    - 件数が上限を超えたら最終参照が古い順（LRU）に削除
+    - 並列スコアリングから呼ばれるためロックで直列化
+    """
+
+    def __init__(self, path=CACHE_FILE, ttl_days=SCORE_CACHE_TTL_DAYS,
+                 max_entries=SCORE_CACHE_MAX_ENTRIES, enabled=SCORE_CACHE_ENABLED):
+        self.path = path
+        self.ttl_seconds = ttl_days * 24 * 3600
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._count = 0
+
+        if self.enabled:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS score_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_score_cache_last_access ON score_cache(last_access)")
+            self._conn.commit()
+            self._count = self._conn.execute("SELECT COUNT(*) FROM score_cache").fetchone()[0]
+
+    def get(self, key):
+        """キャッシュを参照（ヒット時はdict、ミス時はNone）"""
+        return self.get_first([key])
+
+    def get_first(self, keys):
+        """
+        複数のキーを順に参照し、最初に見つかった結果を返す
+
+        ヒット・ミスは何個のキーを参照しても1回として数える。
+        """
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                value = self._lookup(key, now)
+                if value is not None:
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def _lookup(self, key, now):
+        """1キー分の参照（TTL切れは削除してNone。ロック内で呼ぶ）"""
+        row = self._conn.execute(
+            "SELECT value, created_at FROM score_cache WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        value, created_at = row
+        if now - created_at > self.ttl_seconds:
+            self._conn.execute("DELETE FROM score_cache WHERE key = ?", (key,))
+            self._conn.commit()
+            self._count -= 1
+            return None
+
+        self._conn.execute("UPDATE score_cache SET last_access = ? WHERE key = ?", (now, key))
+        self._conn.commit()
+        return json.loads(value)
+
+    def put(self, key, value):
+        """結果を保存し、上限を超えた分をLRUで削除"""
+        if not self.enabled:
+            return
+
+        now = time.time()
+        with self._lock:
+            exists = self._conn.execute("SELECT 1 FROM score_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO score_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            if not exists:
+                self._count += 1
+
+            overflow = self._count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM score_cache WHERE key IN "
+                    "(SELECT key FROM score_cache ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,)
+                )
+                self._count -= overflow
+                self.evictions += overflow
+
+            self._conn.commit()
+
+    def summary(self):
+        """サマリー表示用の1行"""
+        if not self.enabled:
+            return "キャッシュ: 無効"
+        lookups = self.hits + self.misses
+        hit_rate = (self.hits / lookups * 100) if lookups else 0
+        line = f"キャッシュ: ヒット {self.hits} 件 / ミス {self.misses} 件（ヒット率 {hit_rate:.0f}%）"
+        if self.evictions:
+            line += f" / 削除 {self.evictions} 件"
+        return line
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
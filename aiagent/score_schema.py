@@ -0,0 +1,175 @@
+# aiagent/score_schema.py
+# v2スコアリング結果のJSONスキーマと、スキーマから生成する検証関数
+
+# ==============================
+# スキーマ定義
+# ==============================
+SCORE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "estimated_age": {"type": ["integer", "null"], "minimum": 15, "maximum": 100},
+        "age_reasoning": {"type": "string"},
+        "age_score": {"type": "integer", "minimum": 0, "maximum": 25},
+        "it_experience_score": {"type": "integer", "minimum": 0, "maximum": 40},
+        "position_score": {"type": "integer", "minimum": -30, "maximum": 20},
+        "excluded": {"type": "boolean"},
+        "total_score": {"type": "integer", "minimum": -30, "maximum": 85},
+        "decision": {"type": "string", "enum": ["send", "skip"]},
+        "reason": {"type": "string"},
+    },
+    "required": [
+        "estimated_age", "age_reasoning", "age_score", "it_experience_score",
+        "position_score", "excluded", "total_score", "decision", "reason"
+    ],
+    "additionalProperties": False,
+}
+
+# バッチ用: ルートはオブジェクトである必要があるため results 配列で包む
+BATCH_SCORE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "results": {
+            "type": "array",
+            "items": {
+                **SCORE_SCHEMA,
+                "properties": {"profile_url": {"type": "string"}, **SCORE_SCHEMA["properties"]},
+                "required": ["profile_url"] + SCORE_SCHEMA["required"],
+            },
+        },
+    },
+    "required": ["results"],
+    "additionalProperties": False,
+}
+
+# Structured Outputs（strictモード）が受け付けないキーワード。範囲チェックはローカルの検証で行う
+UNSUPPORTED_KEYWORDS = ("minimum", "maximum")
+
+# ==============================
+# API向けスキーマ
+# ==============================
+def _strip_unsupported(schema):
+    if isinstance(schema, dict):
+        return {k: _strip_unsupported(v) for k, v in schema.items() if k not in UNSUPPORTED_KEYWORDS}
+    if isinstance(schema, list):
+        return [_strip_unsupported(v) for v in schema]
+    return schema
+
+
+def response_format(name, schema, mode="json_schema"):
+    """
+    chat.completions の response_format 引数を生成
+
+    Args:
+        name: スキーマ名
+        schema: JSONスキーマ
+        mode: "json_schema"（Structured Outputs）または "json_object"（JSONモードのみ）
+    """
+    if mode == "json_object":
+        return {"type": "json_object"}
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name, "strict": True, "schema": _strip_unsupported(schema)},
+    }
+
+# ==============================
+# 検証関数の生成
+# ==============================
+_TYPE_CHECKS = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+
+def compile_validator(schema):
+    """
+    JSONスキーマ（本モジュールで使う範囲のサブセット）から検証関数を生成
+
+    スキーマの解釈は生成時に1回だけ行い、検証時はチェック関数を順に呼ぶだけにする。
+
+    Returns:
+        function: value を受け取り、エラーメッセージのリストを返す（空なら妥当）
+    """
+    checks = []
+
+    types = schema.get("type")
+    if types is not None:
+        type_checks = [_TYPE_CHECKS[t] for t in (types if isinstance(types, list) else [types])]
+        type_label = "/".join(types) if isinstance(types, list) else types
+        checks.append(lambda v, path: [] if any(c(v) for c in type_checks) else [f"{path}: {type_label}ではありません"])
+
+    if "enum" in schema:
+        allowed = schema["enum"]
+        checks.append(lambda v, path: [] if v in allowed else [f"{path}: {allowed} のいずれでもありません"])
+
+    if "minimum" in schema or "maximum" in schema:
+        low = schema.get("minimum", float("-inf"))
+        high = schema.get("maximum", float("inf"))
+
+        def check_range(v, path):
+            if isinstance(v, (int, float)) and not isinstance(v, bool) and not low <= v <= high:
+                return [f"{path}: {low}〜{high} の範囲外です（{v}）"]
+            return []
+        checks.append(check_range)
+
+    if "properties" in schema or "required" in schema:
+        properties = {k: compile_validator(v) for k, v in schema.get("properties", {}).items()}
+        required = schema.get("required", [])
+        closed = schema.get("additionalProperties") is False
+
+        def check_object(v, path):
+            if not isinstance(v, dict):
+                return []
+            errors = [f"{path}.{k}: 必須項目がありません" for k in required if k not in v]
+            for k, item in v.items():
+                if k in properties:
+                    errors.extend(properties[k](item, f"{path}.{k}"))
+                elif closed:
+                    errors.append(f"{path}.{k}: 未定義の項目です")
+            return errors
+        checks.append(check_object)
+
+    if "items" in schema:
+        item_check = compile_validator(schema["items"])
+
+        def check_array(v, path):
+            if not isinstance(v, list):
+                return []
+            errors = []
+            for i, item in enumerate(v):
+                errors.extend(item_check(item, f"{path}[{i}]"))
+            return errors
+        checks.append(check_array)
+
+    def validate(value, path="$"):
+        errors = []
+        for check in checks:
+            errors.extend(check(value, path))
+        return errors
+
+    return validate
+
+
+validate_score = compile_validator(SCORE_SCHEMA)
+validate_batch_item = compile_validator(BATCH_SCORE_SCHEMA["properties"]["results"]["items"])
+
+# ==============================
+# 合計点・判定の再計算
+# ==============================
+def finalize_score(item, min_score):
+    """
+    合計点と判定をローカルで再計算（LLMの足し算・判定は使わない）
+
+    除外条件に該当する場合は合計0点・skip、それ以外は各スコアの合計で判定する。
+    """
+    excluded = bool(item.get("excluded"))
+    total = 0 if excluded else item["age_score"] + item["it_experience_score"] + item["position_score"]
+    return {
+        **item,
+        "total_score": total,
+        "decision": "send" if not excluded and total >= min_score else "skip",
+    }
@@ -0,0 +1,265 @@
+# aiagent/scoring_benchmark.py
+# スコアリングの回帰ベンチマーク（固定した正解セットを score_candidate で再評価し、判定の一致率・スコア誤差を測る）
+
+import os
+import sys
+import csv
+import json
+import hashlib
+import argparse
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiagent.linkedin_scorer_v2 as scorer
+from aiagent.score_cache import ScoreCache
+from aiagent import llm_client
+from aiagent.llm_client import llm_metrics, require_api_key
+
+# ==============================
+# 設定
+# ==============================
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
+GOLDEN_FILE = os.path.join(DATA_DIR, "golden_set.jsonl")  # 正解セット（プロフィール + 期待する結果）
+HISTORY_FILE = os.path.join(DATA_DIR, "scoring_benchmark.jsonl")  # 実行ごとの結果（モデル・プロンプト版の比較用）
+BENCHMARK_CASSETTE_FILE = os.path.join(DATA_DIR, "cassettes", "benchmark.jsonl")  # --record / --replay の記録
+
+GOLDEN_SET_SIZE = int(os.getenv("GOLDEN_SET_SIZE", 100))  # --freeze で固定する件数
+BENCHMARK_MIN_AGREEMENT = float(os.getenv("BENCHMARK_MIN_AGREEMENT", 0.9))  # 判定一致率の下限
+BENCHMARK_MAX_MAE = float(os.getenv("BENCHMARK_MAX_MAE", 5))  # 合計スコアの平均絶対誤差の上限
+BENCHMARK_MAX_P95_MS = int(os.getenv("BENCHMARK_MAX_P95_MS", 0))  # p95レイテンシの上限（0=判定しない）
+
+SCORE_FIELDS = ["age_score", "it_experience_score", "position_score", "total_score"]
+ERROR_REASONINGS = ("エラー", "解析エラー")  # スコアリング失敗時の age_reasoning
+
+# ==============================
+# 正解セットの作成
+# ==============================
+def _read_csv(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def freeze(size=GOLDEN_SET_SIZE, path=GOLDEN_FILE):
+    """
+    既存のスコアリング結果から正解セットを作る
+
+    プロフィール詳細CSVとスコアリング結果CSVをプロフィールURLで突き合わせ、
+    スコアリングに失敗した候補者を除いて固定する。件数が多い場合は送信対象とスキップを
+    できるだけ同数ずつ、URLのハッシュ順（毎回同じ結果）で選ぶ。
+    """
+    profiles = {p.get("profile_url"): p for p in _read_csv(scorer.INPUT_FILE)}
+    results = _read_csv(scorer.OUTPUT_FILE)
+    if not profiles or not results:
+        print(f"❌ エラー: {scorer.INPUT_FILE} と {scorer.OUTPUT_FILE} が必要です")
+        print(f"💡 先に linkedin_scorer_v2.py を実行してください")
+        return 0
+
+    entries = []
+    for result in results:
+        profile = profiles.get(result.get("profile_url"))
+        if profile is None or result.get("age_reasoning") in ERROR_REASONINGS:
+            continue
+        entries.append({
+            "profile": {field: profile.get(field, "") for field in ["profile_url"] + scorer.SCORING_FIELDS},
+            "expected": {
+                "decision": result["decision"],
+                **{field: int(float(result[field] or 0)) for field in SCORE_FIELDS}
+            }
+        })
+
+    def stable_order(entry):
+        return hashlib.sha256(entry["profile"]["profile_url"].encode("utf-8")).hexdigest()
+
+    sends = sorted((e for e in entries if e["expected"]["decision"] == "send"), key=stable_order)
+    skips = sorted((e for e in entries if e["expected"]["decision"] != "send"), key=stable_order)
+    send_count = min(len(sends), max(size // 2, size - len(skips)))
+    golden = sends[:send_count] + skips[:size - send_count]
+
+    frozen_at = datetime.now().isoformat(timespec="seconds")
+    with open(path, "w", encoding="utf-8") as f:
+        for entry in golden:
+            entry = {**entry, "model": scorer.OPENAI_MODEL, "prompt_version": scorer.SCORING_PROMPT_VERSION, "frozen_at": frozen_at}
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    print(f"🧊 正解セットを固定しました: {len(golden)} 件（送信対象 {send_count} / スキップ {len(golden) - send_count}） → {path}")
+    return len(golden)
+
+
+def load_golden(path=GOLDEN_FILE):
+    """正解セットを読み込む"""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# ==============================
+# 再評価
+# ==============================
+def run(golden, concurrency=scorer.SCORING_CONCURRENCY):
+    """
+    正解セットを score_candidate で再評価して指標を集計
+
+    結果キャッシュは使わない（毎回モデルに問い合わせる）。記録済みの応答を再生する（--replay）か、
+    OPENAI_BASE_URL をローカルのモックサーバーに向ければオフラインで実行できる。
+
+    Returns:
+        dict: 一致率・誤差・レイテンシ・トークン数と、判定が食い違った候補者の一覧
+    """
+    scorer.score_cache = ScoreCache(enabled=False)
+    stages = ("scoring", "scoring_cascade")  # カスケード有効時は一次評価の分も含める
+    before = {stage: dict(llm_metrics.stages.get(stage, {})) for stage in stages}
+
+    candidates = [entry["profile"] for entry in golden]
+    expected_by_url = {entry["profile"]["profile_url"]: entry["expected"] for entry in golden}
+
+    compared = 0
+    agreed = 0
+    errors = 0
+    api_scored = 0
+    abs_errors = {field: 0 for field in SCORE_FIELDS}
+    latencies = []
+    mismatches = []
+
+    for idx, (candidate, result) in enumerate(scorer.score_in_order(candidates, concurrency, 1), start=1):
+        expected = expected_by_url[candidate["profile_url"]]
+        if result.get("error"):
+            errors += 1
+            print(f"[{idx}/{len(candidates)}] ❌ {candidate.get('name', '不明')}: {result['reason']}")
+            continue
+        if not result.get("prefiltered"):
+            api_scored += 1
+            latencies.append(result["latency_ms"])
+
+        compared += 1
+        for field in SCORE_FIELDS:
+            abs_errors[field] += abs(int(result[field] or 0) - expected[field])
+        if result["decision"] == expected["decision"]:
+            agreed += 1
+        else:
+            mismatches.append({
+                "name": candidate.get("name", ""),
+                "profile_url": candidate["profile_url"],
+                "expected": f"{expected['decision']} ({expected['total_score']}点)",
+                "actual": f"{result['decision']} ({result['total_score']}点)",
+                "reason": result.get("reason", "")
+            })
+        mark = "✅" if result["decision"] == expected["decision"] else "⚠️"
+        print(f"[{idx}/{len(candidates)}] {mark} {candidate.get('name', '不明')}: "
+              f"{expected['decision']} {expected['total_score']}点 → {result['decision']} {result['total_score']}点")
+
+    def used(field):
+        return sum(llm_metrics.stages.get(stage, {}).get(field, 0) - before[stage].get(field, 0) for stage in stages)
+
+    tokens = used("prompt_tokens") + used("completion_tokens")
+    cost = used("cost_usd")
+    latencies.sort()
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "model": scorer.OPENAI_MODEL,
+        "cascade_model": scorer.SCORING_CASCADE_MODEL or None,
+        "prompt_version": scorer.SCORING_PROMPT_VERSION,
+        "candidates": len(candidates),
+        "compared": compared,
+        "errors": errors,
+        "agreement": agreed / compared if compared else 0.0,
+        "mae": {field: abs_errors[field] / compared if compared else 0.0 for field in SCORE_FIELDS},
+        "latency_p50_ms": scorer._percentile(latencies, 50),
+        "latency_p95_ms": scorer._percentile(latencies, 95),
+        "tokens_per_candidate": tokens / api_scored if api_scored else 0.0,
+        "cost_per_candidate_usd": cost / api_scored if api_scored else 0.0,
+        "mismatches": mismatches
+    }
+
+# ==============================
+# 判定・表示
+# ==============================
+def check(report, min_agreement=BENCHMARK_MIN_AGREEMENT, max_mae=BENCHMARK_MAX_MAE, max_p95_ms=BENCHMARK_MAX_P95_MS):
+    """しきい値を下回った項目の一覧（空なら合格）"""
+    failures = []
+    if report["errors"]:
+        failures.append(f"スコアリング失敗 {report['errors']} 件")
+    if report["agreement"] < min_agreement:
+        failures.append(f"判定一致率 {report['agreement']:.1%} < {min_agreement:.1%}")
+    if report["mae"]["total_score"] > max_mae:
+        failures.append(f"合計スコアMAE {report['mae']['total_score']:.2f} > {max_mae}")
+    if max_p95_ms and report["latency_p95_ms"] > max_p95_ms:
+        failures.append(f"p95レイテンシ {report['latency_p95_ms']}ms > {max_p95_ms}ms")
+    return failures
+
+
+def print_report(report, failures):
+    print(f"\n{'='*70}")
+    print(f"📏 スコアリング回帰ベンチマーク結果")
+    print(f"{'='*70}")
+    cascade = f"（一次評価 {report['cascade_model']}）" if report["cascade_model"] else ""
+    print(f"モデル: {report['model']}{cascade} / プロンプト版: {report['prompt_version']}")
+    print(f"対象: {report['candidates']} 件（比較 {report['compared']} 件、失敗 {report['errors']} 件）")
+    print(f"判定一致率: {report['agreement']:.1%}（不一致 {len(report['mismatches'])} 件）")
+    print("スコアMAE: " + " / ".join(f"{field} {value:.2f}" for field, value in report["mae"].items()))
+    print(f"レイテンシ: p50 {report['latency_p50_ms']}ms / p95 {report['latency_p95_ms']}ms")
+    print(f"1件あたり: {report['tokens_per_candidate']:.0f} トークン / ${report['cost_per_candidate_usd']:.5f}")
+
+    for mismatch in report["mismatches"][:10]:
+        print(f"   ⚠️ {mismatch['name']}: {mismatch['expected']} → {mismatch['actual']}（{mismatch['reason']}）")
+    if len(report["mismatches"]) > 10:
+        print(f"   ...ほか {len(report['mismatches']) - 10} 件")
+
+    if failures:
+        print(f"\n❌ 回帰を検出しました:")
+        for failure in failures:
+            print(f"   - {failure}")
+    else:
+        print(f"\n✅ しきい値を満たしています")
+    print(f"{'='*70}\n")
+
+
+def save_history(report, failures, path=HISTORY_FILE):
+    """実行結果を履歴に追記（不一致の詳細は件数のみ）"""
+    entry = {**report, "mismatches": len(report["mismatches"]), "passed": not failures}
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+# ==============================
+# エントリポイント
+# ==============================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="スコアリングの回帰ベンチマーク（正解セットとの比較）")
+    parser.add_argument("--freeze", action="store_true", help="既存のスコアリング結果から正解セットを作成")
+    parser.add_argument("--size", type=int, default=GOLDEN_SET_SIZE, help="正解セットの件数（--freeze 時）")
+    parser.add_argument("--model", help="評価するモデル（未指定なら OPENAI_MODEL）")
+    parser.add_argument("--cascade-model", help="カスケードの一次評価に使うモデル（未指定なら SCORING_CASCADE_MODEL）")
+    parser.add_argument("--record", action="store_true", help="APIの応答を記録（data/cassettes/benchmark.jsonl）")
+    parser.add_argument("--replay", action="store_true", help="記録済みの応答だけで実行（APIを呼ばない）")
+    parser.add_argument("--min-agreement", type=float, default=BENCHMARK_MIN_AGREEMENT, help="判定一致率の下限（0〜1）")
+    parser.add_argument("--max-mae", type=float, default=BENCHMARK_MAX_MAE, help="合計スコアの平均絶対誤差の上限")
+    parser.add_argument("--max-p95-ms", type=int, default=BENCHMARK_MAX_P95_MS, help="p95レイテンシの上限（0=判定しない）")
+    args = parser.parse_args()
+
+    if args.freeze:
+        sys.exit(0 if freeze(args.size) else 1)
+
+    golden = load_golden()
+    if not golden:
+        print(f"❌ エラー: 正解セットが見つかりません: {GOLDEN_FILE}")
+        print(f"💡 先に python3 aiagent/scoring_benchmark.py --freeze を実行してください")
+        sys.exit(1)
+
+    if args.record or args.replay:
+        llm_client.use_cassette("replay" if args.replay else "record", BENCHMARK_CASSETTE_FILE)
+    require_api_key()
+
+    if args.model:
+        scorer.OPENAI_MODEL = args.model
+    if args.cascade_model:
+        scorer.SCORING_CASCADE_MODEL = args.cascade_model
+
+    report = run(golden)
+    failures = check(report, args.min_agreement, args.max_mae, args.max_p95_ms)
+    print_report(report, failures)
+    save_history(report, failures)
+    sys.exit(1 if failures else 0)
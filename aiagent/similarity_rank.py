@@ -0,0 +1,185 @@
+# aiagent/similarity_rank.py
+# 理想の候補者像との類似度によるローカル順位付け（文字n-gramのハッシュベクトル + コサイン類似度、API不要）
+
+import os
+import sys
+import csv
+import time
+import unicodedata
+
+import numpy as np
+from scipy import sparse
+
+# ==============================
+# 設定
+# ==============================
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
+INPUT_FILE = os.path.join(DATA_DIR, "profile_details.csv")
+EXEMPLARS_FILE = os.path.join(DATA_DIR, "ideal_candidates.txt")  # 理想の候補者像（1行1件、なければ既定値）
+
+SIMILARITY_RANKING = os.getenv("SIMILARITY_RANKING", "on").lower() not in ("off", "0", "false", "no")
+SIMILARITY_MIN = float(os.getenv("SIMILARITY_MIN", 0))  # これ未満の候補者はスコアリングしない（0=足切りなし）
+SIMILARITY_TOP_K = int(os.getenv("SIMILARITY_TOP_K", 0))  # 上位何件までスコアリングするか（0=全件）
+
+TEXT_FIELDS = ["headline", "experiences", "skills"]
+NGRAM_SIZES = (2, 3)  # 文字n-gram（日本語は分かち書きせずに扱える）
+HASH_BUCKETS = 2 ** 18  # ハッシュ空間の次元数
+
+# 既定の理想の候補者像（評価基準で高得点になる人物像）
+DEFAULT_EXEMPLARS = [
+    "SIer システムエンジニア Java AWS 設計 開発 プロジェクトリーダー 株式会社 現在",
+    "ITコンサルタント DX推進 要件定義 PMO クラウド導入 業務改革",
+    "ソフトウェアエンジニア バックエンド Python Go マイクロサービス Kubernetes",
+    "データサイエンティスト 機械学習 AI 分析基盤 SQL Python",
+    "プロジェクトマネージャー システム開発 基幹システム 刷新 ベンダーコントロール",
+    "Software Engineer Cloud Infrastructure AWS Azure DevOps",
+]
+
+# ==============================
+# ベクトル化
+# ==============================
+def profile_text(profile):
+    """類似度計算に使うテキスト（ヘッドライン + 職歴 + スキル）"""
+    return " ".join(str(profile.get(field) or "") for field in TEXT_FIELDS)
+
+
+WHITESPACE_CODES = np.array([0x09, 0x0A, 0x0B, 0x0C, 0x0D, 0x20], dtype=np.uint32)
+
+
+def _normalize(text):
+    """全角/半角・大文字/小文字の揺れを吸収（全角スペースはNFKCで半角になる）"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def hash_vectors(texts):
+    """
+    文字n-gramをハッシュした疎行列（行: 文書、列: ハッシュバケット）を作る
+
+    全文書を区切り文字（U+0000）で連結した1本のコードポイント配列に対して、
+    n-gramのハッシュをNumPyの配列演算でまとめて計算する（文書ごとのPythonループなし）。
+
+    Returns:
+        scipy.sparse.csr_matrix: (len(texts), HASH_BUCKETS) の出現回数行列
+    """
+    # 正規化も連結後の1本の文字列に対してまとめて行う（区切り文字は空白扱いされない）
+    joined = _normalize("\0".join(t.replace("\0", " ") for t in texts) + "\0")
+    codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32).copy()
+    # タブ・改行などの空白は半角スペースに揃える（正規表現より配列演算の方が速い）
+    codes[np.isin(codes, WHITESPACE_CODES)] = 0x20
+
+    # 各位置がどの文書に属するか（区切り文字の直後から次の文書）
+    is_sep = codes == 0
+    doc_ids = np.concatenate(([0], np.cumsum(is_sep, dtype=np.int32)[:-1]))
+
+    rows = []
+    cols = []
+    for n in NGRAM_SIZES:
+        if len(codes) < n:
+            continue
+        length = len(codes) - n + 1
+        # 多項式ハッシュ（uint32のオーバーフローはmod 2^32として扱う）
+        h = np.zeros(length, dtype=np.uint32)
+        for k in range(n):
+            h = h * np.uint32(1_000_003) + codes[k:k + length]
+        # 区切り文字をまたぐn-gramは除外
+        window_has_sep = np.zeros(length, dtype=bool)
+        for k in range(n):
+            window_has_sep |= is_sep[k:k + length]
+        valid = ~window_has_sep
+        rows.append(doc_ids[:length][valid])
+        cols.append((h[valid] ^ np.uint32(n)) % np.uint32(HASH_BUCKETS))
+
+    # (文書, バケット) を1つの整数キーにして集計し、CSRを直接組み立てる（COO経由より速い）
+    keys = np.concatenate([r.astype(np.int64) * HASH_BUCKETS + c for r, c in zip(rows, cols)]) if rows else np.zeros(0, np.int64)
+    keys, counts = np.unique(keys, return_counts=True)
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(keys // HASH_BUCKETS, minlength=len(texts)))))
+    return sparse.csr_matrix(
+        (counts.astype(np.float32), (keys % HASH_BUCKETS).astype(np.int32), indptr),
+        shape=(len(texts), HASH_BUCKETS)
+    )
+
+
+def _weight(counts, idf):
+    """TF（対数）× IDF を掛けて行をL2正規化"""
+    weighted = counts.copy()
+    weighted.data = np.log1p(weighted.data)
+    weighted = weighted.multiply(idf).tocsr()
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms) @ weighted
+
+
+def similarity_scores(texts, exemplars):
+    """
+    各テキストと理想の候補者像とのコサイン類似度（最も近い候補者像との値）
+
+    Returns:
+        numpy.ndarray: 0〜1 の類似度（texts と同じ順序）
+    """
+    if not texts:
+        return np.zeros(0)
+    counts = hash_vectors(texts)
+    exemplar_counts = hash_vectors(exemplars)
+
+    # IDFは候補者集合から算出（どの候補者にも出てくるn-gramの重みを下げる）
+    df = np.bincount(counts.indices, minlength=HASH_BUCKETS)
+    idf = np.log((1 + counts.shape[0]) / (1 + df)) + 1.0
+
+    vectors = _weight(counts, idf)
+    exemplar_vectors = _weight(exemplar_counts, idf)
+    return np.asarray((vectors @ exemplar_vectors.T).max(axis=1).todense()).ravel()
+
+
+def load_exemplars(path=EXEMPLARS_FILE):
+    """理想の候補者像を読み込む（ファイルがなければ既定値）"""
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            exemplars = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        if exemplars:
+            return exemplars
+    return DEFAULT_EXEMPLARS
+
+# ==============================
+# 順位付け
+# ==============================
+def rank_profiles(profiles, min_similarity=SIMILARITY_MIN, top_k=SIMILARITY_TOP_K, exemplars=None):
+    """
+    プロフィールを類似度の高い順に並べ、足切り・上位件数で絞り込む
+
+    各プロフィールに similarity（0〜1）を追加したコピーを返す。同じ類似度なら元の順序を保つ。
+    """
+    if not SIMILARITY_RANKING or not profiles:
+        return profiles
+
+    started = time.perf_counter()
+    scores = similarity_scores([profile_text(p) for p in profiles], exemplars or load_exemplars())
+    order = np.argsort(-scores, kind="stable")
+    if min_similarity > 0:
+        order = order[scores[order] >= min_similarity]
+    if top_k > 0:
+        order = order[:top_k]
+
+    ranked = [{**profiles[i], "similarity": round(float(scores[i]), 4)} for i in order]
+    print(f"🧭 類似度ランキング: {len(profiles)} 件 → {len(ranked)} 件"
+          f"（足切り {min_similarity} / 上位 {top_k or '全'} 件、{time.perf_counter() - started:.2f}秒）")
+    return ranked
+
+# ==============================
+# エントリポイント（プロフィールCSVの類似度上位を確認）
+# ==============================
+if __name__ == "__main__":
+    input_file = sys.argv[1] if len(sys.argv) > 1 else INPUT_FILE
+    if not os.path.exists(input_file):
+        print(f"❌ エラー: プロフィール詳細ファイルが見つかりません: {input_file}")
+        sys.exit(1)
+
+    with open(input_file, "r", encoding="utf-8") as f:
+        profiles = list(csv.DictReader(f))
+
+    ranked = rank_profiles(profiles, min_similarity=0, top_k=0)
+    print(f"\n{'='*70}")
+    print(f"🧭 理想の候補者像との類似度 上位20件")
+    print(f"{'='*70}")
+    for idx, profile in enumerate(ranked[:20], start=1):
+        print(f"{idx:>3}. {profile['similarity']:.3f}  {profile.get('name', '')}  {profile.get('headline', '')[:40]}")
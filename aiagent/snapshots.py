@@ -0,0 +1,339 @@
+# aiagent/snapshots.py
+# 分析用のParquetスナップショット（日付でパーティション分割・列は型付き）。pyarrow は使う場合のみ必要
+
+import io
+import os
+import sys
+import csv
+import uuid
+import shutil
+import atexit
+import threading
+from datetime import datetime, date, timedelta
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# aiagent をモジュールとして読み込めるようにする
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aiagent.log_writer import iter_log_rows
+
+# ==============================
+# 設定
+# ==============================
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
+SNAPSHOT_DIR = os.path.join(DATA_DIR, "snapshots")
+
+# auto: pyarrow がインストールされていれば書き出す / on: 必須（なければ警告） / off: 書き出さない
+PARQUET_SNAPSHOTS = os.getenv("PARQUET_SNAPSHOTS", "auto").lower()
+SNAPSHOT_FLUSH_ROWS = int(os.getenv("SNAPSHOT_FLUSH_ROWS", 5000))  # この件数ごとにParquetファイルへ書き出す
+
+PARTITION_FIELD = "day"  # パーティション列（YYYY-MM-DD、ディレクトリ名 day=YYYY-MM-DD）
+
+# テーブルごとの列の型と、パーティションに使う日時列
+TABLES = {
+    "candidates": ({
+        "profile_url": "string", "name": "string", "headline": "string", "company": "string",
+        "location": "string", "connected_date": "timestamp", "source": "string", "observed_at": "timestamp",
+    }, "observed_at"),
+    "profiles": ({
+        "profile_url": "string", "name": "string", "headline": "string", "location": "string",
+        "is_premium": "bool", "experiences": "string", "education": "string", "skills": "string",
+        "fetched_at": "timestamp",
+    }, "fetched_at"),
+    "scores": ({
+        "profile_url": "string", "name": "string", "scorer": "string", "estimated_age": "int",
+        "age_reasoning": "string", "age_score": "int", "it_experience_score": "int", "position_score": "int",
+        "total_score": "int", "decision": "string", "reason": "string", "fingerprint": "string",
+        "scored_at": "timestamp",
+    }, "scored_at"),
+    "connection_requests": ({
+        "date": "timestamp", "name": "string", "profile_url": "string",
+        "result": "string", "error": "string", "details": "string",
+    }, "date"),
+    "messages": ({
+        "date": "timestamp", "name": "string", "profile_url": "string",
+        "result": "string", "error": "string", "details": "string",
+    }, "date"),
+    # Streamlit画面の接続リクエスト送信ログ（data/sent_log.csv を sync_csv で取り込む）
+    "sent_log": ({
+        "date": "timestamp", "name": "string", "profile_url": "string", "result": "string", "error": "string",
+    }, "date"),
+}
+
+# ==============================
+# 型変換
+# ==============================
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_bool(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("true", "yes", "1")
+
+
+def _to_timestamp(value):
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    if not value:
+        return None
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(str(value)[:19], fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def _to_string(value):
+    return None if value is None else str(value)
+
+
+CONVERTERS = {"string": _to_string, "int": _to_int, "bool": _to_bool, "timestamp": _to_timestamp}
+
+
+def arrow_schema(table):
+    """テーブルのpyarrowスキーマ（パーティション列を含まない）"""
+    types = {"string": pa.string(), "int": pa.int32(), "bool": pa.bool_(), "timestamp": pa.timestamp("s")}
+    columns, _ = TABLES[table]
+    return pa.schema([(name, types[kind]) for name, kind in columns.items()])
+
+
+def coerce_row(table, row):
+    """1行を型付きの値に変換する（変換できない値はNone）"""
+    columns, _ = TABLES[table]
+    return {name: CONVERTERS[kind](row.get(name)) for name, kind in columns.items()}
+
+# ==============================
+# 書き出し
+# ==============================
+class SnapshotWriter:
+    """
+    テーブルごとに行をバッファし、日付ごとのParquetファイル（<テーブル>/day=YYYY-MM-DD/part-*.parquet）に書き出す
+
+    - flush_rows 件たまるか、プロセス終了時（atexit）に書き出す
+    - 書き出しは一時ファイル → リネームのため、読み込み側が書きかけのファイルを見ることはない
+    """
+
+    def __init__(self, root=SNAPSHOT_DIR, mode=PARQUET_SNAPSHOTS, flush_rows=SNAPSHOT_FLUSH_ROWS, flush_at_exit=True):
+        self.root = root
+        self.flush_rows = max(1, flush_rows)
+        self.enabled = mode != "off" and pa is not None
+        self.files = 0
+        self._run_id = datetime.now().strftime("%Y%m%d%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        self._lock = threading.Lock()
+        self._buffers = {table: [] for table in TABLES}
+
+        if mode == "on" and pa is None:
+            print("⚠️ PARQUET_SNAPSHOTS=on ですが pyarrow がインストールされていません（pip install pyarrow）。スナップショットは書き出しません")
+        if self.enabled and flush_at_exit:
+            atexit.register(self.flush)
+
+    def append(self, table, row):
+        self.extend(table, [row])
+
+    def extend(self, table, rows):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._buffers[table].extend(coerce_row(table, row) for row in rows)
+            if len(self._buffers[table]) >= self.flush_rows:
+                self._flush_table(table)
+
+    def flush(self):
+        """バッファ中の全テーブルを書き出す"""
+        if not self.enabled:
+            return
+        with self._lock:
+            for table in TABLES:
+                self._flush_table(table)
+
+    def _flush_table(self, table):
+        rows, self._buffers[table] = self._buffers[table], []
+        if not rows:
+            return
+        _, time_field = TABLES[table]
+        today = date.today().isoformat()
+        by_day = {}
+        for row in rows:
+            day = row[time_field].date().isoformat() if row[time_field] else today
+            by_day.setdefault(day, []).append(row)
+
+        schema = arrow_schema(table)
+        for day, day_rows in by_day.items():
+            directory = os.path.join(self.root, table, f"{PARTITION_FIELD}={day}")
+            os.makedirs(directory, exist_ok=True)
+            self.files += 1
+            path = os.path.join(directory, f"part-{self._run_id}-{self.files:05d}.parquet")
+            try:
+                pq.write_table(pa.Table.from_pylist(day_rows, schema=schema), path + ".tmp")
+                os.replace(path + ".tmp", path)
+            except Exception as e:
+                print(f"⚠️ スナップショットの書き出しに失敗しました（{table}, {day}）: {e}")
+
+
+# プロセス内で共有するライター
+snapshot_writer = SnapshotWriter()
+
+# ==============================
+# 追記型CSVの取り込み
+# ==============================
+SYNC_STATE_FILE = "_sync_offset"  # 取り込み済みのバイト位置（"_" で始まるためデータセットの読み込み対象外）
+
+
+def sync_csv(table, path, root=SNAPSHOT_DIR):
+    """
+    追記型のCSVのうち、前回の取り込み以降に追加された行だけをスナップショットに書き出す
+
+    取り込み済みの位置を記録するため、呼び出すたびにCSV全体を読み直さない。
+    CSVが作り直された（前回より小さい）場合はスナップショットを作り直す。
+
+    Returns:
+        int: 取り込んだ行数
+    """
+    if not snapshots_enabled() or not os.path.exists(path):
+        return 0
+    directory = os.path.join(root, table)
+    state_path = os.path.join(directory, SYNC_STATE_FILE)
+    offset = 0
+    if os.path.exists(state_path):
+        with open(state_path, "r", encoding="utf-8") as f:
+            offset = int(f.read().strip() or 0)
+    if os.path.getsize(path) < offset:
+        shutil.rmtree(directory, ignore_errors=True)
+        offset = 0
+
+    with open(path, "rb") as f:
+        header = f.readline()
+        f.seek(max(offset, len(header)))
+        data = f.read()
+    # 書き込み途中の最終行は次回に回す
+    data = data[:data.rfind(b"\n") + 1]
+    if not data:
+        return 0
+
+    fieldnames = next(csv.reader([header.decode("utf-8-sig")]))
+    rows = list(csv.DictReader(io.StringIO(data.decode("utf-8"), newline=""), fieldnames=fieldnames))
+    writer = SnapshotWriter(root=root, mode="on", flush_rows=len(rows) + 1, flush_at_exit=False)
+    writer.extend(table, rows)
+    writer.flush()
+
+    os.makedirs(directory, exist_ok=True)
+    with open(state_path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(str(max(offset, len(header)) + len(data)))
+    os.replace(state_path + ".tmp", state_path)
+    return len(rows)
+
+# ==============================
+# 読み込み
+# ==============================
+def snapshots_enabled():
+    """スナップショットを使うか（pyarrow があり、PARQUET_SNAPSHOTS=off でない）"""
+    return pa is not None and PARQUET_SNAPSHOTS != "off"
+
+
+def snapshot_available(table, root=SNAPSHOT_DIR):
+    """スナップショットを読めるか（pyarrow があり、書き出し済み）"""
+    return pa is not None and os.path.isdir(os.path.join(root, table))
+
+
+def read_snapshot(table, columns=None, since=None, until=None, filters=None, root=SNAPSHOT_DIR):
+    """
+    スナップショットをpandasのDataFrameで読み込む
+
+    Args:
+        columns: 読み込む列（指定した列だけをファイルから読む）
+        since / until: 期間（date または YYYY-MM-DD、両端を含む）。範囲外の日付のパーティションは開かない
+        filters: {列名: 値} の一致条件（行グループの統計で読み飛ばす）
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow がインストールされていません（pip install pyarrow）")
+    schema = arrow_schema(table).append(pa.field(PARTITION_FIELD, pa.string()))
+    dataset = ds.dataset(
+        os.path.join(root, table), format="parquet", schema=schema,
+        partitioning=ds.partitioning(pa.schema([(PARTITION_FIELD, pa.string())]), flavor="hive")
+    )
+    conditions = []
+    if since:
+        conditions.append(ds.field(PARTITION_FIELD) >= str(since))
+    if until:
+        conditions.append(ds.field(PARTITION_FIELD) <= str(until))
+    for name, value in (filters or {}).items():
+        conditions.append(ds.field(name) == value)
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+# ==============================
+# 既存ログからの取り込み・レポート
+# ==============================
+def import_logs():
+    """既存の送信・申請ログをスナップショットに取り込む（初回導入時用。JSON Lines・切り替え済みのログも読む）"""
+    sources = [
+        ("message_logs.csv", "messages", {}),
+        ("logs.csv", "connection_requests", {"url": "profile_url"}),
+        ("connection_logs.csv", "connection_requests", {}),
+    ]
+    for filename, table, renames in sources:
+        rows = [{renames.get(k, k): v for k, v in row.items()} for row in iter_log_rows(os.path.join(DATA_DIR, filename))]
+        if not rows:
+            continue
+        snapshot_writer.extend(table, rows)
+        print(f"✅ {filename}: {len(rows)} 件を {table} に取り込み")
+    snapshot_writer.flush()
+
+
+def print_report(since):
+    """日別の送信・申請・スコアリング件数（必要な列と期間だけを読む）"""
+    print(f"📊 {since} 以降の集計（{SNAPSHOT_DIR}）")
+    for table in ("messages", "connection_requests"):
+        if not snapshot_available(table):
+            continue
+        df = read_snapshot(table, columns=["day", "result"], since=since)
+        if df.empty:
+            continue
+        daily = df.assign(success=df["result"] == "success").groupby("day").agg(件数=("result", "size"), 成功=("success", "sum"))
+        print(f"\n[{table}]\n{daily.to_string()}")
+    if snapshot_available("scores"):
+        df = read_snapshot("scores", columns=["day", "decision", "total_score"], since=since)
+        if not df.empty:
+            daily = df.groupby("day").agg(
+                件数=("decision", "size"), 送信=("decision", lambda x: (x == "send").sum()),
+                平均スコア=("total_score", "mean")
+            ).round(1)
+            print(f"\n[scores]\n{daily.to_string()}")
+
+# ==============================
+# エントリポイント
+# ==============================
+if __name__ == "__main__":
+    # 例: python3 aiagent/snapshots.py report [YYYY-MM-DD]
+    #     python3 aiagent/snapshots.py import
+    if pa is None:
+        print("❌ エラー: pyarrow がインストールされていません（pip install pyarrow）")
+        sys.exit(1)
+    args = sys.argv[1:]
+    command = args[0] if args else ""
+
+    if command == "report":
+        print_report(args[1] if len(args) > 1 else (date.today() - timedelta(days=30)).isoformat())
+    elif command == "import":
+        import_logs()
+    else:
+        print("使い方: python3 aiagent/snapshots.py report [YYYY-MM-DD] / import")
+        sys.exit(1)
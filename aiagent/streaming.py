@@ -0,0 +1,82 @@
+# aiagent/streaming.py
+# 大量の候補者CSVをメモリ一定で処理するための部品（逐次読み込み・逐次書き出し・上位K件のヒープ）
+
+import os
+import csv
+import heapq
+
+# ==============================
+# 設定
+# ==============================
+STREAM_FLUSH_EVERY = int(os.getenv("STREAM_FLUSH_EVERY", 50))  # 出力CSVをflushするまでの件数
+
+# ==============================
+# 読み込み
+# ==============================
+def iter_csv(path):
+    """CSVを1行ずつdictで読み出す（全件をメモリに載せない）"""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f)
+
+# ==============================
+# 書き出し
+# ==============================
+class CSVStreamWriter:
+    """
+    1行ずつ追記するCSVライター
+
+    ファイルは開いたまま書き続け、flush_every 件ごとにflushする（途中で止まっても書き込み済みの行は残る）。
+    """
+
+    def __init__(self, path, fieldnames, flush_every=STREAM_FLUSH_EVERY):
+        self.path = path
+        self.flush_every = max(1, flush_every)
+        self.rows = 0
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=fieldnames)
+        self._writer.writeheader()
+
+    def write(self, row):
+        self._writer.writerow(row)
+        self.rows += 1
+        if self.rows % self.flush_every == 0:
+            self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ==============================
+# 上位K件
+# ==============================
+class TopK:
+    """
+    スコア上位 k 件だけを保持する最小ヒープ
+
+    同点は先に追加したものを優先する。保持するのは常に k 件までなので、入力件数によらずメモリは一定。
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.count = 0
+        self._heap = []  # (score, -追加順, record)
+
+    def push(self, score, record):
+        self.count += 1
+        if self.k <= 0:
+            return
+        entry = (score, -self.count, record)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def sorted(self):
+        """スコア降順（同点は追加順）のリスト"""
+        return [record for _, _, record in sorted(self._heap, key=lambda e: e[:2], reverse=True)]
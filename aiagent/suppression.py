@@ -0,0 +1,271 @@
+# aiagent/suppression.py
+# 送信済み・スキップ判定済み・配信停止の候補者の除外リスト（メモリ上のBloomフィルタ + ディスク上のSQLite）
+
+import os
+import sys
+import math
+import time
+import sqlite3
+import hashlib
+import threading
+
+# aiagent をモジュールとして読み込めるようにする
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aiagent.profile_identity import identity_index
+from aiagent.log_writer import iter_log_rows
+
+# ==============================
+# 設定
+# ==============================
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("AIAGENT_DATA_DIR") or os.path.join(BASE_DIR, "data")
+SUPPRESSION_FILE = os.path.join(DATA_DIR, "suppression.sqlite3")
+
+os.makedirs(DATA_DIR, exist_ok=True)
+
+SUPPRESSION_ENABLED = os.getenv("SUPPRESSION", "on").lower() not in ("off", "0", "false", "no")
+SUPPRESSION_CAPACITY = int(os.getenv("SUPPRESSION_CAPACITY", 100000))  # Bloomフィルタの想定件数（超えたら拡張）
+SUPPRESSION_FP_RATE = float(os.getenv("SUPPRESSION_FP_RATE", 0.001))  # Bloomフィルタの偽陽性率
+SUPPRESSION_SKIP_TTL_DAYS = float(os.getenv("SUPPRESSION_SKIP_TTL_DAYS", 90))  # スキップ判定の有効期限（日、過ぎたらプロフィールを再取得）
+
+# 除外理由
+MESSAGED = "messaged"  # メッセージ送信済み
+CONNECTION_REQUESTED = "connection_requested"  # つながり申請済み
+SCORED_SKIP = "scored_skip"  # スコアリングでスキップ判定（有効期限あり）
+OPTED_OUT = "opted_out"  # 配信停止の申し出
+REASONS = (MESSAGED, CONNECTION_REQUESTED, SCORED_SKIP, OPTED_OUT)
+
+# 工程ごとに確認する除外理由
+CONTACT_REASONS = (MESSAGED, CONNECTION_REQUESTED, OPTED_OUT)  # 検索・つながり申請
+PROFILE_REASONS = (MESSAGED, SCORED_SKIP, OPTED_OUT)  # プロフィール取得
+SCORING_REASONS = (MESSAGED, OPTED_OUT)  # スコアリング（スキップ判定済みは差分判定・キャッシュに任せる）
+MESSAGE_REASONS = (MESSAGED, OPTED_OUT)  # メッセージ送信
+
+# ==============================
+# キー
+# ==============================
+def profile_key(url, register=True):
+    """プロフィールURLの比較用キー（別名表で解決した同一人物の正規ID）"""
+    return identity_index.resolve(url, register)
+
+# ==============================
+# Bloomフィルタ
+# ==============================
+class BloomFilter:
+    """
+    件数と偽陽性率からビット数・ハッシュ数を決めるBloomフィルタ
+
+    「含まれない」は確定、「含まれるかもしれない」はディスク上の集合で確認する。
+    """
+
+    def __init__(self, capacity, fp_rate=SUPPRESSION_FP_RATE):
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+# ==============================
+# 除外リスト本体
+# ==============================
+class SuppressionIndex:
+    """
+    プロフィールURL（比較用キー）ごとの除外理由を保持する除外リスト
+
+    - ディスク上の集合（SQLite、キー + 理由が主キー）を正とし、起動時に全キーをBloomフィルタへ読み込む
+    - 確認はBloomフィルタで大半を即座に「対象外」と判定し、一致した場合だけディスクを検索する
+    - スキップ判定は SUPPRESSION_SKIP_TTL_DAYS を過ぎると除外しない（プロフィールの変化を拾い直す）
+    - 別名表で2つの正規IDがまとめられた後も、まとめる前のキーで登録した理由を確認する
+    """
+
+    def __init__(self, path=SUPPRESSION_FILE, enabled=SUPPRESSION_ENABLED,
+                 capacity=SUPPRESSION_CAPACITY, skip_ttl_days=SUPPRESSION_SKIP_TTL_DAYS):
+        self.path = path
+        self.enabled = enabled
+        self.skip_ttl_seconds = skip_ttl_days * 24 * 3600
+        self.checks = 0
+        self.suppressed = 0
+        self.disk_lookups = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._bloom = BloomFilter(capacity)
+
+        if self.enabled:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS suppression (
+                    key TEXT NOT NULL,
+                    reason TEXT NOT NULL,
+                    profile_url TEXT,
+                    added_at REAL NOT NULL,
+                    PRIMARY KEY (key, reason)
+                ) WITHOUT ROWID
+            """)
+            self._conn.commit()
+            self._load(capacity)
+
+    def _load(self, capacity):
+        """ディスク上のキーをBloomフィルタに読み込む（件数が想定を超えていれば拡張）"""
+        count = self._conn.execute("SELECT COUNT(DISTINCT key) FROM suppression").fetchone()[0]
+        self._bloom = BloomFilter(max(capacity, count * 2))
+        for (key,) in self._conn.execute("SELECT DISTINCT key FROM suppression"):
+            self._bloom.add(key)
+
+    def add(self, profile_url, reason):
+        """除外リストに追加（同じキー・理由は追加日時を更新）"""
+        key = profile_key(profile_url)
+        if not self.enabled or not key:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO suppression (key, reason, profile_url, added_at) VALUES (?, ?, ?, ?)",
+                (key, reason, profile_url, time.time())
+            )
+            self._conn.commit()
+            if key not in self._bloom:
+                self._bloom.add(key)
+                if self._bloom.count > self._bloom.capacity:
+                    self._load(self._bloom.capacity * 2)
+
+    def discard(self, profile_url, reason):
+        """除外理由を取り消す（Bloomフィルタには残るが、ディスク確認で対象外になる）"""
+        key = profile_key(profile_url)
+        if not self.enabled or not key:
+            return
+        keys = identity_index.equivalents(key)
+        with self._lock:
+            self._conn.execute(
+                f"DELETE FROM suppression WHERE key IN ({','.join('?' * len(keys))}) AND reason = ?",
+                (*keys, reason)
+            )
+            self._conn.commit()
+
+    def reason(self, profile_url, reasons=REASONS):
+        """
+        除外理由（reasons のいずれかに該当すればその理由、該当しなければNone）
+
+        Bloomフィルタに含まれないキーはディスクを検索せずにNoneを返す。
+        """
+        key = profile_key(profile_url, register=False)
+        if not self.enabled or not key:
+            return None
+        keys = identity_index.equivalents(key)
+        with self._lock:
+            self.checks += 1
+            keys = [k for k in keys if k in self._bloom]
+            if not keys:
+                return None
+            self.disk_lookups += 1
+            rows = self._conn.execute(
+                f"SELECT reason, added_at FROM suppression WHERE key IN ({','.join('?' * len(keys))})"
+                f" AND reason IN ({','.join('?' * len(reasons))})",
+                (*keys, *reasons)
+            ).fetchall()
+            skip_cutoff = time.time() - self.skip_ttl_seconds
+            for reason, added_at in rows:
+                if reason != SCORED_SKIP or added_at >= skip_cutoff:
+                    self.suppressed += 1
+                    return reason
+            return None
+
+    def contains(self, profile_url, reasons=REASONS):
+        return self.reason(profile_url, reasons) is not None
+
+    def record_score(self, profile_url, decision):
+        """スコアリング結果を反映（skip なら除外リストに追加、send なら過去のスキップ判定を取り消す）"""
+        if decision == "send":
+            self.discard(profile_url, SCORED_SKIP)
+        else:
+            self.add(profile_url, SCORED_SKIP)
+
+    def counts(self):
+        """理由ごとの件数"""
+        if not self.enabled:
+            return {}
+        with self._lock:
+            return dict(self._conn.execute("SELECT reason, COUNT(*) FROM suppression GROUP BY reason").fetchall())
+
+    def summary(self):
+        """サマリー表示用の文字列"""
+        if not self.enabled:
+            return "除外リスト: 無効"
+        return (f"除外リスト: 確認 {self.checks} 件 / 除外 {self.suppressed} 件"
+                f"（ディスク確認 {self.disk_lookups} 件、残りはBloomフィルタで即判定）")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# プロセス内で共有する除外リスト
+suppression_index = SuppressionIndex()
+
+# ==============================
+# 既存ログからの取り込み
+# ==============================
+def import_logs():
+    """既存のログ・スコアリング結果から除外リストを作る（初回導入時用。JSON Lines・切り替え済みのログも読む）"""
+    sources = [
+        ("message_logs.csv", "profile_url", MESSAGED, lambda row: row.get("result") == "success"),
+        ("logs.csv", "url", CONNECTION_REQUESTED, lambda row: row.get("result") == "success"),
+        ("connection_logs.csv", "profile_url", CONNECTION_REQUESTED, lambda row: row.get("result") == "success"),
+        ("candidates_scored_v2.csv", "profile_url", SCORED_SKIP, lambda row: row.get("decision") == "skip"),
+    ]
+    for filename, url_field, reason, matches in sources:
+        count = 0
+        for row in iter_log_rows(os.path.join(DATA_DIR, filename)):
+            if row.get(url_field) and matches(row):
+                suppression_index.add(row[url_field], reason)
+                count += 1
+        print(f"✅ {filename}: {count} 件を {reason} として追加")
+
+# ==============================
+# エントリポイント
+# ==============================
+if __name__ == "__main__":
+    # 例: python3 aiagent/suppression.py add https://www.linkedin.com/in/xxx opted_out
+    #     python3 aiagent/suppression.py remove https://www.linkedin.com/in/xxx opted_out
+    #     python3 aiagent/suppression.py check https://www.linkedin.com/in/xxx
+    #     python3 aiagent/suppression.py import
+    args = sys.argv[1:]
+    command = args[0] if args else ""
+
+    if command == "add" and len(args) >= 2:
+        reason = args[2] if len(args) > 2 else OPTED_OUT
+        if reason not in REASONS:
+            print(f"❌ エラー: 不明な理由です: {reason}（{', '.join(REASONS)}）")
+            sys.exit(1)
+        suppression_index.add(args[1], reason)
+        print(f"✅ 追加しました: {profile_key(args[1])}（{reason}）")
+    elif command == "remove" and len(args) >= 2:
+        reason = args[2] if len(args) > 2 else OPTED_OUT
+        suppression_index.discard(args[1], reason)
+        print(f"✅ 取り消しました: {profile_key(args[1])}（{reason}）")
+    elif command == "check" and len(args) >= 2:
+        reason = suppression_index.reason(args[1])
+        print(f"{profile_key(args[1], register=False)}: {reason or '除外対象外'}")
+    elif command == "import":
+        import_logs()
+    else:
+        print("使い方: python3 aiagent/suppression.py add|remove <URL> [理由] / check <URL> / import")
+        sys.exit(1)
+
+    print(f"🚫 {SUPPRESSION_FILE}: {suppression_index.counts()}")
@@ -10,6 +10,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from aiagent.linkedin_search import search_candidates
 from aiagent.linkedin_scorer import score_all_candidates
 from aiagent.linkedin_pipeline_improved import manual_login, send_requests
+from aiagent.llm_client import require_api_key
 
 def main():
     """
@@ -116,4 +117,5 @@ def main():
     print()
 
 if __name__ == "__main__":
+    require_api_key()
     main()
@@ -0,0 +1,201 @@
+# tests/conftest.py
+# テスト共通の設定（aiagent の読み込み、データ保存先の一時ディレクトリ化、ローカルのモックOpenAIサーバー、別名表）
+
+import os
+import re
+import sys
+import json
+import atexit
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# aiagent を読み込む前に、データの保存先を一時ディレクトリに向ける（data/ の本番データに触れない）
+TEST_DATA_DIR = tempfile.mkdtemp(prefix="aiagent-test-")
+atexit.register(shutil.rmtree, TEST_DATA_DIR, ignore_errors=True)
+os.environ["AIAGENT_DATA_DIR"] = TEST_DATA_DIR
+
+# .env の設定に左右されないよう、テストが前提とする値に固定する
+os.environ.update({
+    "MIN_SCORE": "60",
+    "MAX_AGE": "40",
+    "AGE_BASE_YEAR": "2025",
+    "SCORING_CASCADE_MODEL": "",
+    "LLM_PROVIDERS": "openai",
+    "LLM_CASSETTE": "off",
+    "PARQUET_SNAPSHOTS": "off",
+})
+
+# aiagent をモジュールとして読み込めるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# ==============================
+# モックOpenAIサーバー
+# ==============================
+SCORE_REPLY = {
+    "estimated_age": 30, "age_reasoning": "2017年卒", "age_score": 25, "it_experience_score": 30,
+    "position_score": 20, "excluded": False, "total_score": 75, "decision": "send", "reason": "",
+}
+
+
+def chat_completion(model, content, prompt_tokens=100, completion_tokens=20):
+    """chat.completions の応答本文"""
+    return {
+        "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+class MockOpenAI(ThreadingHTTPServer):
+    """
+    OpenAI API のローカル代替（chat.completions・Files・Batches）
+
+    - chat.completions は scripted に積んだ (ステータス, 本文, ヘッダー) を先頭から返し、なくなれば reply() の結果を返す
+    - 既定の reply() はユーザーメッセージの「名前: 」を reason に入れたスコアを返す（順序の確認用）
+    - delay 秒待ってから応答し、同時に処理中のリクエスト数の最大値を max_active に記録する
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _MockHandler)
+        self.scripted = []
+        self.requests = []
+        self.delay = 0.0
+        self.active = 0
+        self.max_active = 0
+        self.files = {}
+        self.batches = {}
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def chat_requests(self):
+        return [body for method, path, body in self.requests if path == "/v1/chat/completions"]
+
+    def reply(self, body):
+        user = next((m["content"] for m in body["messages"] if m["role"] == "user"), "")
+        name = re.search(r"名前: (.*)", user)
+        return 200, chat_completion(body["model"], json.dumps({**SCORE_REPLY, "reason": name.group(1) if name else ""}))
+
+    def add_file(self, content):
+        with self._lock:
+            file_id = f"file-{len(self.files) + 1}"
+            self.files[file_id] = content
+        return file_id
+
+    def handle_api(self, method, path, raw):
+        if path == "/v1/chat/completions":
+            body = json.loads(raw)
+            with self._lock:
+                self.requests.append((method, path, body))
+                scripted = self.scripted.pop(0) if self.scripted else None
+            return scripted or self.reply(body)
+        with self._lock:
+            self.requests.append((method, path, raw))
+        if method == "POST" and path == "/v1/files":
+            # multipart の中身からJSONL部分（1行1リクエスト）だけを取り出す
+            lines = [line for line in raw.decode("utf-8").splitlines() if line.startswith('{"custom_id"')]
+            file_id = self.add_file("\n".join(lines) + "\n")
+            return 200, {"id": file_id, "object": "file", "bytes": len(raw), "created_at": 0,
+                         "filename": "requests.jsonl", "purpose": "batch", "status": "processed"}
+        if method == "POST" and path == "/v1/batches":
+            body = json.loads(raw)
+            batch_id = f"batch-{len(self.batches) + 1}"
+            self.batches[batch_id] = {
+                "id": batch_id, "object": "batch", "endpoint": body["endpoint"], "input_file_id": body["input_file_id"],
+                "completion_window": body["completion_window"], "status": "validating", "created_at": 0,
+                "metadata": body.get("metadata"), "output_file_id": None, "error_file_id": None,
+            }
+            return 200, self.batches[batch_id]
+        match = re.fullmatch(r"/v1/batches/([^/]+)", path)
+        if method == "GET" and match and match.group(1) in self.batches:
+            return 200, self.batches[match.group(1)]
+        match = re.fullmatch(r"/v1/files/([^/]+)/content", path)
+        if method == "GET" and match and match.group(1) in self.files:
+            return 200, self.files[match.group(1)]
+        return 404, {"error": {"message": f"not found: {method} {path}", "type": "invalid_request_error"}}
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _handle(self, method):
+        server = self.server
+        raw = self.rfile.read(int(self.headers.get("content-length") or 0))
+        with server._lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            if server.delay:
+                threading.Event().wait(server.delay)
+            response = server.handle_api(method, self.path.split("?")[0], raw)
+        finally:
+            with server._lock:
+                server.active -= 1
+        status, body, headers = (response + ({},))[:3]
+        data = body.encode("utf-8") if isinstance(body, str) else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+@pytest.fixture
+def mock_openai(monkeypatch, tmp_path):
+    """
+    llm_client をモックOpenAIサーバーに向ける
+
+    リトライの待機は短くし、使用量の記録とレート制御は一時的なものに差し替える。
+    """
+    pytest.importorskip("openai")
+    from aiagent import llm_client
+
+    server = MockOpenAI()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+
+    monkeypatch.setattr(llm_client, "OPENAI_BASE_URL", server.base_url)
+    monkeypatch.setattr(llm_client, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(llm_client, "_client", None)
+    monkeypatch.setattr(llm_client, "RETRY_BASE_DELAY", 0.01)
+    monkeypatch.setattr(llm_client, "RETRY_MAX_DELAY", 0.05)
+    monkeypatch.setattr(llm_client, "llm_metrics", llm_client.LLMMetrics(path=str(tmp_path / "llm_metrics.jsonl")))
+    monkeypatch.setattr(llm_client, "rate_limiter", llm_client.RateLimiter())
+    monkeypatch.setattr(llm_client.router.providers[0], "limiter", llm_client.rate_limiter)
+    yield server
+    server.shutdown()
+    server.server_close()
+    llm_client._client = None
+
+# ==============================
+# 別名表
+# ==============================
+@pytest.fixture
+def identity(tmp_path, monkeypatch):
+    """一時ファイルの別名表（読み込み済みの suppression・candidate_store も同じ別名表を使う）"""
+    from aiagent import profile_identity
+
+    index = profile_identity.IdentityIndex(str(tmp_path / "aliases.sqlite3"))
+    monkeypatch.setattr(profile_identity, "identity_index", index)
+    for name in ("aiagent.suppression", "aiagent.candidate_store"):
+        if name in sys.modules:
+            monkeypatch.setattr(sys.modules[name], "identity_index", index)
+    return index
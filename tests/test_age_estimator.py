@@ -0,0 +1,46 @@
+# tests/test_age_estimator.py
+
+import pytest
+
+from aiagent.age_estimator import AGE_BASE_YEAR, extract_graduation_year, age_score, age_facts, estimate_ages_frame
+
+EDUCATION = "\n".join([
+    "東京大学大学院 情報理工学 (2009 - 2011)",
+    "東京大学 工学部 (2005年 - 2009年)",
+    "開成高等学校 (2002 - 2005)",
+])
+
+
+def test_graduation_year_uses_earliest_non_high_school_end():
+    assert extract_graduation_year(EDUCATION) == 2009
+    assert extract_graduation_year("") is None
+    assert extract_graduation_year("開成高校 (2002 - 2005)") is None
+
+
+def test_open_ended_entries_are_ignored():
+    # 在学中・現在までの学歴は卒業年として扱わない（開始年を卒業年と誤認しない）
+    assert extract_graduation_year("慶應義塾大学 MBA (2012年 - 現在)") is None
+    assert extract_graduation_year("MIT (2020 - Present)\n早稲田大学 (2003 - 2007)") == 2007
+
+
+def test_base_year_defaults_to_rubric_year():
+    assert AGE_BASE_YEAR == 2025
+    facts = age_facts("早稲田大学 (2003 - 2007)")
+    assert facts == {"graduation_year": 2007, "estimated_age": 40, "age_score": 15, "excluded": False}
+    assert age_facts("早稲田大学 (2003 - 2007)", base_year=2026)["excluded"] is True
+
+
+@pytest.mark.parametrize("age, score", [(None, None), (24, None), (25, 25), (41, 0)])
+def test_age_score_bands(age, score):
+    assert age_score(age) == score
+
+
+def test_frame_matches_row_by_row():
+    pd = pytest.importorskip("pandas")
+    educations = [EDUCATION, "", None, "慶應義塾大学 MBA (2012年 - 現在)", "MIT (2020 - Present)\n早稲田大学 (2003 - 2007)"]
+    frame = estimate_ages_frame(pd.DataFrame({"education": educations}))
+    for education, (_, row) in zip(educations, frame.iterrows()):
+        facts = age_facts(education)
+        expected = facts["graduation_year"]
+        assert (None if pd.isna(row["graduation_year"]) else int(row["graduation_year"])) == expected
+        assert (None if pd.isna(row["age_score"]) else int(row["age_score"])) == facts["age_score"]
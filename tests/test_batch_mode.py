@@ -0,0 +1,130 @@
+# tests/test_batch_mode.py
+
+import csv
+import json
+import os
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("dotenv")
+pytest.importorskip("scipy")
+from aiagent import batch_jobs
+from aiagent import linkedin_scorer_v2 as scorer
+from aiagent.candidate_store import CandidateStore
+from aiagent.score_cache import ScoreCache
+from aiagent.suppression import SuppressionIndex
+from conftest import SCORE_REPLY, chat_completion
+
+FIELDS = ["name", "profile_url", "headline", "location", "is_premium", "experiences", "education", "skills"]
+
+
+def _candidate(i, headline="バックエンドエンジニア"):
+    return {
+        "name": f"候補者{i}", "profile_url": f"https://www.linkedin.com/in/user{i}/", "headline": headline,
+        "location": "東京", "is_premium": "False", "experiences": f"エンジニア @ {i}社 (2017年 - 現在)",
+        "education": "東京大学 (2013 - 2017)", "skills": "Python",
+    }
+
+
+@pytest.fixture
+def batch_env(mock_openai, monkeypatch, tmp_path):
+    """入出力・ジョブ状態・キャッシュ・ストアを一時ディレクトリに向ける"""
+    for name, filename in [("INPUT_FILE", "profile_details.csv"), ("OUTPUT_FILE", "candidates_scored_v2.csv"),
+                           ("MESSAGES_FILE", "messages_v2.csv"), ("CHECKPOINT_FILE", "scored.checkpoint.jsonl"),
+                           ("BATCH_REQUESTS_FILE", "batch/requests.jsonl"), ("BATCH_JOB_FILE", "batch/job.json")]:
+        monkeypatch.setattr(scorer, name, str(tmp_path / filename))
+    monkeypatch.setattr(scorer, "score_cache", ScoreCache(path=str(tmp_path / "cache.sqlite3")))
+    monkeypatch.setattr(scorer, "candidate_store", CandidateStore(str(tmp_path / "candidates.sqlite3")))
+    monkeypatch.setattr(scorer, "suppression_index", SuppressionIndex(str(tmp_path / "suppression.sqlite3")))
+
+    candidates = [_candidate(i) for i in range(4)] + [_candidate(9, headline="代表取締役")]
+    with open(scorer.INPUT_FILE, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(candidates)
+    return mock_openai
+
+
+def _submitted(server):
+    """投入されたリクエスト（custom_id → 候補者名）"""
+    job = batch_jobs.load_job(scorer.BATCH_JOB_FILE)
+    input_file_id = server.batches[job["batch_id"]]["input_file_id"]
+    requests = [json.loads(line) for line in server.files[input_file_id].splitlines() if line.strip()]
+    return job, {r["custom_id"]: r["body"]["messages"][1]["content"].split("名前: ")[1].split("\n")[0] for r in requests}
+
+
+def _complete(server, batch_id, outputs, errors=()):
+    """バッチを完了状態にし、結果ファイル・エラーファイルを用意する"""
+    batch = server.batches[batch_id]
+    batch["status"] = "completed"
+    batch["output_file_id"] = server.add_file("".join(json.dumps(line) + "\n" for line in outputs))
+    batch["error_file_id"] = server.add_file("".join(json.dumps(line) + "\n" for line in errors)) if errors else None
+
+
+def _output(custom_id, content):
+    return {"custom_id": custom_id, "response": {"status_code": 200, "body": chat_completion("gpt-4o-mini", content)}}
+
+
+def _results():
+    with open(scorer.OUTPUT_FILE, encoding="utf-8") as f:
+        return {row["name"]: row for row in csv.DictReader(f)}
+
+
+def test_submit_skips_prefiltered_and_cached_candidates(batch_env):
+    job = scorer.batch_submit()
+
+    _, submitted = _submitted(batch_env)
+    assert job["request_count"] == 4
+    assert sorted(submitted.values()) == [f"候補者{i}" for i in range(4)]
+    assert not batch_env.chat_requests()
+
+    # 結果を取り込む前は次のジョブを投入しない
+    assert scorer.batch_submit()["batch_id"] == job["batch_id"]
+    assert len(batch_env.batches) == 1
+
+
+def test_merge_rescores_missing_failed_and_invalid_items_live(batch_env):
+    scorer.batch_submit()
+    job, submitted = _submitted(batch_env)
+    ids = {name: custom_id for custom_id, name in submitted.items()}
+
+    _complete(batch_env, job["batch_id"], outputs=[
+        _output(ids["候補者0"], json.dumps({**SCORE_REPLY, "reason": "バッチ結果"})),
+        _output(ids["候補者1"], '{"total_score": "高い"}'),  # スキーマ不一致
+    ], errors=[
+        {"custom_id": ids["候補者2"], "response": {"status_code": 500, "body": {"error": {"message": "server error"}}}},
+    ])  # 候補者3 は結果なし
+
+    scorer.batch_merge()
+
+    assert len(batch_env.chat_requests()) == 3
+    results = _results()
+    assert len(results) == 5
+    assert results["候補者0"]["reason"] == "バッチ結果"
+    assert [results[f"候補者{i}"]["reason"] for i in (1, 2, 3)] == ["候補者1", "候補者2", "候補者3"]
+    assert results["候補者9"]["reason"].startswith("ルール除外")
+    assert not os.path.exists(scorer.BATCH_JOB_FILE)
+
+
+def test_merge_ignores_results_from_a_different_prompt_version(batch_env):
+    scorer.batch_submit()
+    job, submitted = _submitted(batch_env)
+    _complete(batch_env, job["batch_id"], outputs=[
+        _output(custom_id, json.dumps({**SCORE_REPLY, "reason": "バッチ結果"})) for custom_id in submitted
+    ])
+    batch_jobs.save_job(scorer.BATCH_JOB_FILE, {**job, "prompt_version": "v-old"})
+
+    scorer.batch_merge()
+
+    assert len(batch_env.chat_requests()) == 4
+    assert all(row["reason"] != "バッチ結果" for row in _results().values())
+
+
+def test_merge_waits_for_terminal_status(batch_env):
+    scorer.batch_submit()
+    job, _ = _submitted(batch_env)
+
+    assert scorer.batch_merge() is None
+    assert batch_jobs.load_job(scorer.BATCH_JOB_FILE)["status"] == "validating"
+    assert not os.path.exists(scorer.OUTPUT_FILE)
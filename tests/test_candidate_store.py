@@ -0,0 +1,108 @@
+# tests/test_candidate_store.py
+
+import sqlite3
+
+import pytest
+
+from aiagent import candidate_store
+from aiagent.candidate_store import CandidateStore
+from aiagent.snapshots import SnapshotWriter
+
+MEMBER_ID = "ACoAABWBi7YBm8O9tTIJ3vmi_cW0vu3wfI0hhZU"
+MEMBER_URL = f"https://www.linkedin.com/in/{MEMBER_ID}/"
+
+
+@pytest.fixture
+def store(tmp_path, identity, monkeypatch):
+    monkeypatch.setattr(candidate_store, "snapshot_writer", SnapshotWriter(root=str(tmp_path / "snapshots"), mode="off"))
+    store = CandidateStore(str(tmp_path / "candidates.sqlite3"), enabled=True)
+    yield store
+    store.close()
+
+
+def _rows(store, table):
+    return store._conn.execute(f"SELECT profile_url FROM {table}").fetchall()
+
+
+def _scores(store):
+    return sorted(store._conn.execute("SELECT profile_url, scorer, total_score FROM scores").fetchall())
+
+
+def test_urls_are_normalized(store):
+    store.upsert_candidates([{"url": "https://www.linkedin.com/in/Taro?trk=x", "name": "Taro"}], source="search")
+    store.add_message("Taro", "https://www.linkedin.com/in/taro/", "success")
+    assert _rows(store, "candidates") == [("https://www.linkedin.com/in/taro/",)]
+    assert store.is_messaged("https://www.linkedin.com/in/TARO")
+
+
+def test_v1_and_v2_scores_for_one_url_both_survive(store, tmp_path):
+    url = "https://www.linkedin.com/in/taro/"
+    store.upsert_score({"url": url, "name": "Taro", "score": 55, "decision": "skip"}, scorer="v1")
+    store.upsert_score({"profile_url": url, "name": "Taro", "total_score": 70, "decision": "send"}, scorer="v2")
+    store.upsert_score({"profile_url": url, "name": "Taro", "total_score": 80, "decision": "send"}, scorer="v2")
+
+    assert _scores(store) == [(url, "v1", 55), (url, "v2", 80)]
+    assert store.export_csv("candidates_scored.csv", str(tmp_path)) == 1
+    assert store.export_csv("candidates_scored_v2.csv", str(tmp_path)) == 1
+    assert store.export_csv("messages_v2.csv", str(tmp_path)) == 1
+
+
+def test_old_scores_table_is_migrated(tmp_path, identity, monkeypatch):
+    monkeypatch.setattr(candidate_store, "snapshot_writer", SnapshotWriter(root=str(tmp_path / "snapshots"), mode="off"))
+    path = str(tmp_path / "candidates.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE scores (
+            profile_url TEXT PRIMARY KEY, name TEXT, scorer TEXT NOT NULL, estimated_age INTEGER,
+            age_reasoning TEXT, age_score INTEGER, it_experience_score INTEGER, position_score INTEGER,
+            total_score INTEGER, decision TEXT, reason TEXT, fingerprint TEXT, scored_at TEXT NOT NULL
+        );
+        INSERT INTO scores (profile_url, name, scorer, total_score, decision, scored_at)
+        VALUES ('https://www.linkedin.com/in/taro/', 'Taro', 'v2', 70, 'send', '2025-01-01 00:00:00');
+    """)
+    conn.close()
+
+    store = CandidateStore(path, enabled=True)
+    store.upsert_score({"url": "https://www.linkedin.com/in/taro/", "score": 55}, scorer="v1")
+
+    assert _scores(store) == [("https://www.linkedin.com/in/taro/", "v1", 55), ("https://www.linkedin.com/in/taro/", "v2", 70)]
+    pk = [row[1] for row in store._conn.execute("PRAGMA table_info(scores)") if row[5]]
+    assert sorted(pk) == ["profile_url", "scorer"]
+    store.close()
+
+
+def test_rows_are_rekeyed_when_aliases_merge(store, identity, tmp_path):
+    store.upsert_candidates([{"url": "https://www.linkedin.com/in/taro", "name": "Taro", "headline": "SRE"}], source="search")
+    store.upsert_profile({"profile_url": "https://www.linkedin.com/in/taro", "name": "Taro"})
+    store.add_message("Taro", "https://www.linkedin.com/in/taro", "success")
+    store.upsert_candidates([{"profile_url": MEMBER_URL, "name": "Taro Y"}], source="connection")
+
+    # バニティ名とメンバーIDを結び付けるURLを観測すると、旧IDの行がメンバーIDのURLにまとまる
+    identity.resolve(f"https://www.linkedin.com/in/taro?miniProfileUrn={MEMBER_ID}")
+    for table in ("candidates", "profiles", "messages"):
+        assert _rows(store, table) == [(MEMBER_URL,)]
+    name, headline, searched_at, connected_at = store._conn.execute(
+        "SELECT name, headline, searched_at, connected_at FROM candidates"
+    ).fetchone()
+    assert (name, headline) == ("Taro Y", "SRE")
+    assert searched_at and connected_at
+    assert store.is_messaged("https://www.linkedin.com/in/taro")
+
+    # 再起動時は未反映の統合だけを適用する（同じ統合を2回適用しない）
+    reopened = CandidateStore(store.path, enabled=True)
+    assert reopened._merge_cursor == identity.merges()[-1][0]
+    assert _rows(reopened, "candidates") == [(MEMBER_URL,)]
+    reopened.close()
+
+
+def test_scores_are_merged_per_scorer_when_aliases_merge(store, identity):
+    vanity = "https://www.linkedin.com/in/taro"
+    store.upsert_score({"url": vanity, "score": 55}, scorer="v1")
+    store.upsert_score({"profile_url": vanity, "total_score": 70}, scorer="v2")
+    store.upsert_score({"profile_url": MEMBER_URL, "total_score": 80}, scorer="v2")
+    store._conn.execute("UPDATE scores SET scored_at = '2025-01-01 00:00:00' WHERE total_score = 70")
+
+    identity.resolve(f"{vanity}?miniProfileUrn={MEMBER_ID}")
+
+    # v1 はメンバーIDのURLに付け替え、v2 は評価日時が新しい方を残す
+    assert _scores(store) == [(MEMBER_URL, "v1", 55), (MEMBER_URL, "v2", 80)]
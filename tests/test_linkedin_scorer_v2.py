@@ -0,0 +1,152 @@
+# tests/test_linkedin_scorer_v2.py
+
+import random
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("dotenv")
+pytest.importorskip("scipy")
+from aiagent import linkedin_scorer_v2 as scorer
+from aiagent.score_cache import ScoreCache
+from conftest import chat_completion
+
+
+def _candidate(i):
+    return {
+        "name": f"候補者{i}", "profile_url": f"https://www.linkedin.com/in/user{i}/",
+        "headline": "バックエンドエンジニア", "location": "東京",
+        "is_premium": "False", "experiences": "エンジニア @ A社 (2017年 - 現在)",
+        "education": "東京大学 (2013 - 2017)", "skills": "Python",
+    }
+
+
+@pytest.fixture
+def no_cache(monkeypatch):
+    monkeypatch.setattr(scorer, "score_cache", ScoreCache(enabled=False))
+
+# ==============================
+# 並列実行・出力順
+# ==============================
+@pytest.mark.parametrize("batch_size", [1, 3])
+def test_score_in_order_bounds_concurrency_and_keeps_input_order(monkeypatch, batch_size):
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def fake_score(chunk):
+        nonlocal active, max_active
+        with lock:
+            active += 1
+            max_active = max(max_active, active)
+        time.sleep(random.uniform(0, 0.02))  # 完了順を入力順とずらす
+        with lock:
+            active -= 1
+        return [{"index": candidate["index"]} for candidate in chunk]
+
+    monkeypatch.setattr(scorer, "_score_chunk", fake_score)
+    monkeypatch.setattr(scorer, "score_batch", fake_score)
+
+    candidates = [{"index": i} for i in range(40)]
+    results = list(scorer.score_in_order(iter(candidates), concurrency=3, batch_size=batch_size))
+
+    assert [candidate["index"] for candidate, _ in results] == list(range(40))
+    assert [result["index"] for _, result in results] == list(range(40))
+    assert 1 < max_active <= 3
+
+
+def test_score_in_order_against_mock_server(mock_openai, no_cache):
+    mock_openai.delay = 0.05
+    candidates = [_candidate(i) for i in range(8)]
+
+    results = list(scorer.score_in_order(candidates, concurrency=2, batch_size=1))
+
+    assert len(mock_openai.chat_requests()) == 8
+    assert mock_openai.max_active == 2
+    # 応答の reason には候補者名が入る（入力順に並んでいることの確認）
+    assert [result["reason"] for _, result in results] == [c["name"] for c in candidates]
+    assert all(result["decision"] == "send" for _, result in results)
+
+# ==============================
+# リトライ・バックオフ
+# ==============================
+def test_retries_429_and_5xx_with_backoff(mock_openai, no_cache):
+    from aiagent import llm_client
+
+    mock_openai.scripted = [
+        (429, {"error": {"message": "rate limited", "type": "rate_limit_exceeded"}}, {"retry-after-ms": "20"}),
+        (500, {"error": {"message": "server error", "type": "server_error"}}),
+    ]
+    started = time.monotonic()
+    result = scorer.score_candidate(_candidate(1))
+
+    assert not result.get("error")
+    assert result["reason"] == "候補者1"
+    assert len(mock_openai.chat_requests()) == 3
+    assert time.monotonic() - started >= 0.02  # 429の retry-after-ms 分は待機する
+    assert llm_client.llm_metrics.stages["scoring"]["retries"] == 2
+
+
+def test_non_retryable_error_is_not_retried(mock_openai, no_cache):
+    mock_openai.scripted = [(400, {"error": {"message": "bad request", "type": "invalid_request_error"}})]
+
+    result = scorer.score_candidate(_candidate(1))
+
+    assert result["error"] and result["decision"] == "skip"
+    assert len(mock_openai.chat_requests()) == 1
+
+
+def test_schema_mismatch_is_rescored(mock_openai, no_cache):
+    mock_openai.scripted = [(200, chat_completion("gpt-4o-mini", '{"total_score": "高い"}'))]
+
+    result = scorer.score_candidate(_candidate(1))
+
+    assert not result.get("error")
+    assert len(mock_openai.chat_requests()) == 2
+
+# ==============================
+# スコアリング結果キャッシュ
+# ==============================
+def test_cache_hit_recomputes_decision_with_current_min_score(mock_openai, monkeypatch, tmp_path):
+    monkeypatch.setattr(scorer, "score_cache", ScoreCache(path=str(tmp_path / "cache.sqlite3")))
+    candidate = _candidate(1)
+
+    first = scorer.score_candidate(candidate)
+    assert (first["total_score"], first["decision"]) == (75, "send")
+
+    # 最低スコアだけを変えた再実行では、キャッシュの点数から判定をやり直す（APIは呼ばない）
+    monkeypatch.setattr(scorer, "MIN_SCORE", 80)
+    second = scorer.score_candidate(candidate)
+    assert second["cached"] and (second["total_score"], second["decision"]) == (75, "skip")
+    assert len(mock_openai.chat_requests()) == 1
+
+
+def test_cascade_counts_one_lookup_per_candidate(mock_openai, monkeypatch, tmp_path):
+    monkeypatch.setattr(scorer, "score_cache", ScoreCache(path=str(tmp_path / "cache.sqlite3")))
+    monkeypatch.setattr(scorer, "SCORING_CASCADE_MODEL", "gpt-4o-mini")
+    candidate = _candidate(1)
+
+    scorer.score_candidate(candidate)
+    assert (scorer.score_cache.hits, scorer.score_cache.misses) == (0, 1)
+
+    assert scorer.score_candidate(candidate)["cached"]
+    assert (scorer.score_cache.hits, scorer.score_cache.misses) == (1, 1)
+
+# ==============================
+# プロンプト
+# ==============================
+def test_prompt_decision_rule_follows_min_score(tmp_path):
+    import os
+    import subprocess
+    import sys
+
+    code = ("from aiagent import linkedin_scorer_v2 as s; "
+            "print(s.SCORING_PROMPT_VERSION); print('合計スコアが70点以上' in s.SCORING_SYSTEM_PROMPT)")
+    env = dict(os.environ, MIN_SCORE="70", AIAGENT_DATA_DIR=str(tmp_path))
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", code], env=env, cwd=root, capture_output=True, text=True, check=True)
+    version, contains = out.stdout.strip().splitlines()[-2:]
+    assert version.endswith("-min70") and contains == "True"
+    assert "合計スコアが60点以上" in scorer.SCORING_SYSTEM_PROMPT
@@ -0,0 +1,98 @@
+# tests/test_llm_cassette.py
+
+import json
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+from aiagent.llm_cassette import CassetteTransport, request_key
+
+URL = "https://api.openai.com/v1/chat/completions"
+BODY = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "こんにちは"}]}
+
+
+class Upstream:
+    """実APIの代わりに応答を返すトランスポート（呼ばれた回数を数える）"""
+
+    def __init__(self, status=200):
+        self.status = status
+        self.calls = 0
+
+    def transport(self):
+        def handler(request):
+            self.calls += 1
+            return httpx.Response(self.status, json={"id": f"resp-{self.calls}"}, headers={"x-request-id": "abc"})
+        return httpx.MockTransport(handler)
+
+
+def _post(transport, url=URL, body=BODY):
+    with httpx.Client(transport=transport) as client:
+        return client.post(url, json=body)
+
+
+def test_record_then_replay(tmp_path):
+    path = str(tmp_path / "cassette.jsonl")
+    upstream = Upstream()
+
+    recorder = CassetteTransport(path, mode="record", transport=upstream.transport())
+    assert _post(recorder).json() == {"id": "resp-1"}
+    assert recorder.recorded == 1
+
+    player = CassetteTransport(path, mode="replay", transport=upstream.transport())
+    response = _post(player)
+    assert response.status_code == 200
+    assert response.json() == {"id": "resp-1"}
+    assert response.headers["x-request-id"] == "abc"
+    assert player.hits == 1
+    assert upstream.calls == 1  # 再生時は実APIを呼ばない
+
+
+def test_replay_miss_returns_404_without_calling_api(tmp_path):
+    upstream = Upstream()
+    player = CassetteTransport(str(tmp_path / "cassette.jsonl"), mode="replay", transport=upstream.transport())
+
+    response = _post(player)
+
+    assert response.status_code == 404
+    assert response.json()["error"]["type"] == "cassette_miss"
+    assert player.misses == 1
+    assert upstream.calls == 0
+
+
+def test_auto_records_once_and_replays(tmp_path):
+    upstream = Upstream()
+    cassette = CassetteTransport(str(tmp_path / "cassette.jsonl"), mode="auto", transport=upstream.transport())
+
+    first, second = _post(cassette), _post(cassette)
+
+    assert first.json() == second.json() == {"id": "resp-1"}
+    assert upstream.calls == 1
+    assert (cassette.recorded, cassette.hits) == (1, 1)
+
+
+def test_error_responses_are_not_recorded(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    upstream = Upstream(status=500)
+    cassette = CassetteTransport(str(path), mode="auto", transport=upstream.transport())
+
+    assert _post(cassette).status_code == 500
+    assert _post(cassette).status_code == 500
+
+    assert upstream.calls == 2
+    assert cassette.recorded == 0
+    assert not path.exists() or path.read_text() == ""
+
+
+def test_request_key_ignores_json_key_order_and_host():
+    reordered = json.dumps({"messages": BODY["messages"], "model": BODY["model"]}).encode()
+    original = json.dumps(BODY).encode()
+
+    assert request_key("POST", URL, original) == request_key("post", URL, reordered)
+    assert request_key("POST", URL, original) == request_key("POST", "http://127.0.0.1:8080/v1/chat/completions", original)
+    assert request_key("POST", URL, original) != request_key("POST", "https://api.openai.com/v1/embeddings", original)
+    assert request_key("POST", URL, original) != request_key("POST", URL, json.dumps({**BODY, "temperature": 0}).encode())
+
+
+def test_off_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        CassetteTransport(str(tmp_path / "cassette.jsonl"), mode="off")
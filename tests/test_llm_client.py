@@ -0,0 +1,160 @@
+# tests/test_llm_client.py
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+from aiagent import llm_client
+from aiagent.llm_client import estimate_cost, _anthropic_model, _from_anthropic
+
+
+def test_cache_pricing_is_per_provider():
+    # gpt-4o-mini: 入力 $0.15 / 100万トークン、キャッシュ読み込み 0.5倍
+    assert estimate_cost("gpt-4o-mini", 1000, 0, cached_tokens=800) == pytest.approx((200 + 400) * 0.15 / 1e6)
+    # claude-3-5-haiku: 入力 $0.80、キャッシュ読み込み 0.1倍・書き込み 1.25倍
+    assert estimate_cost("claude-3-5-haiku-latest", 1000, 100, cached_tokens=800, cache_write_tokens=100) == \
+        pytest.approx(((100 + 80 + 125) * 0.80 + 100 * 4.00) / 1e6)
+    assert estimate_cost("unknown-model", 1000, 100) is None
+
+
+def test_anthropic_usage_keeps_cache_writes_separate():
+    message = SimpleNamespace(
+        model="claude-3-5-haiku-20241022", stop_reason="end_turn",
+        content=[SimpleNamespace(type="text", text="{}")],
+        usage=SimpleNamespace(input_tokens=100, output_tokens=10, cache_read_input_tokens=800, cache_creation_input_tokens=100),
+    )
+    usage = _from_anthropic(message).usage
+    assert usage.prompt_tokens == 1000
+    assert (usage.prompt_tokens_details.cached_tokens, usage.prompt_tokens_details.cache_write_tokens) == (800, 100)
+
+
+def test_requested_model_is_mapped(monkeypatch):
+    monkeypatch.setattr(llm_client, "ANTHROPIC_MODEL_MAP", {"gpt-4o-mini": "claude-3-5-haiku-latest"})
+    monkeypatch.setattr(llm_client, "ANTHROPIC_MODEL", "claude-sonnet-4-0")
+    assert _anthropic_model("gpt-4o-mini") == "claude-3-5-haiku-latest"
+    assert _anthropic_model("gpt-4o") == "claude-sonnet-4-0"
+    assert _anthropic_model("claude-opus-4-1") == "claude-opus-4-1"
+
+
+# ==============================
+# ルーティング・サーキットブレーカー・429
+# ==============================
+class FakeError(Exception):
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+class FakeProvider:
+    """スクリプト通りに応答・例外を返すプロバイダー"""
+
+    def __init__(self, name, script=(), limiter=None):
+        self.name = name
+        self.script = list(script)
+        self.limiter = limiter
+        self.calls = 0
+
+    def create(self, kwargs):
+        self.calls += 1
+        result = self.script.pop(0) if self.script else "ok"
+        if isinstance(result, Exception):
+            raise result
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=2, total_tokens=12, prompt_tokens_details=None)
+        return SimpleNamespace(model=kwargs["model"], usage=usage, answer=f"{self.name}:{result}"), {}
+
+    def limit_headers(self, headers):
+        return headers
+
+    def is_retryable(self, error):
+        return error.status == 429 or error.status >= 500
+
+    def is_rate_limited(self, error):
+        return error.status == 429
+
+
+@pytest.fixture
+def route(monkeypatch, tmp_path):
+    """フェイクのプロバイダーで router を差し替える"""
+    monkeypatch.setattr(llm_client, "llm_metrics", llm_client.LLMMetrics(str(tmp_path / "metrics.jsonl")))
+    monkeypatch.setattr(llm_client, "LLM_ROUTING_EXPLORE", 0)
+    monkeypatch.setattr(llm_client, "RETRY_BASE_DELAY", 0.01)
+    monkeypatch.setattr(llm_client, "RETRY_MAX_DELAY", 0.02)
+
+    def install(*providers):
+        router = llm_client.ProviderRouter(list(providers))
+        monkeypatch.setattr(llm_client, "router", router)
+        return router
+    return install
+
+
+def test_failover_to_next_provider_without_retry(route):
+    primary = FakeProvider("primary", [FakeError(503)])
+    secondary = FakeProvider("secondary")
+    router = route(primary, secondary)
+
+    response = llm_client.create_completion("scoring", model="gpt-4o-mini", messages=[])
+
+    assert response.answer == "secondary:ok"
+    assert (primary.calls, secondary.calls) == (1, 1)
+    assert router.stats["primary"]["errors"] == 1
+    assert llm_client.llm_metrics.totals()["retries"] == 0
+
+
+def test_non_retryable_error_is_raised_after_all_providers_fail(route):
+    route(FakeProvider("primary", [FakeError(400)]), FakeProvider("secondary", [FakeError(400)]))
+
+    with pytest.raises(FakeError):
+        llm_client.create_completion("scoring", model="gpt-4o-mini", messages=[])
+
+
+def test_circuit_opens_after_consecutive_errors_and_closes_after_cooldown(route, monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_CIRCUIT_ERRORS", 2)
+    monkeypatch.setattr(llm_client, "LLM_CIRCUIT_COOLDOWN", 0.2)
+    flaky = FakeProvider("flaky", [FakeError(500), FakeError(500)])
+    steady = FakeProvider("steady")
+    router = route(flaky, steady)
+
+    for _ in range(2):
+        assert llm_client.create_completion("scoring", model="gpt-4o-mini", messages=[]).answer == "steady:ok"
+    assert router.stats["flaky"]["open_until"] > 0
+    assert [p.name for p in router.ranked()] == ["steady", "flaky"]
+
+    # 後回しの間は steady だけが呼ばれる
+    llm_client.create_completion("scoring", model="gpt-4o-mini", messages=[])
+    assert flaky.calls == 2
+
+    time.sleep(0.25)
+    router.stats["steady"]["latency_ms"] = 1000  # 回復後は速い方から試す
+    router.stats["flaky"]["latency_ms"] = 1
+    assert llm_client.create_completion("scoring", model="gpt-4o-mini", messages=[]).answer == "flaky:ok"
+    assert router.stats["flaky"]["open_until"] == 0.0
+
+
+def test_rate_limit_pauses_shared_limiter(route):
+    limiter = llm_client.RateLimiter(rpm=6000, tpm=1000000)
+    provider = FakeProvider("openai", [FakeError(429, {"retry-after-ms": "150"})], limiter=limiter)
+    route(provider)
+
+    started = time.monotonic()
+    response = llm_client.create_completion("scoring", model="gpt-4o-mini", messages=[])
+
+    assert response.answer == "openai:ok"
+    assert provider.calls == 2
+    assert limiter.paused_until >= started + 0.15
+    assert time.monotonic() - started >= 0.15  # retry-after の間は acquire() で待機した
+    assert limiter.in_flight["requests"] == 0
+
+
+def test_penalize_blocks_acquire_until_pause_ends():
+    limiter = llm_client.RateLimiter(rpm=6000, tpm=1000000)
+    limiter.penalize(0.1)
+    limiter.penalize(0.01)  # 短い待機で上書きしない
+
+    started = time.monotonic()
+    limiter.release(limiter.acquire())
+
+    assert time.monotonic() - started >= 0.1
+    assert limiter.waited > 0
@@ -0,0 +1,38 @@
+# tests/test_log_writer.py
+
+import json
+
+from aiagent.log_writer import BufferedLogWriter, iter_log_rows, log_path
+
+FIELDS = ["date", "name", "profile_url", "result"]
+
+
+def _row(name):
+    return {"date": "2026-01-01 10:00:00", "name": name, "profile_url": f"https://www.linkedin.com/in/{name}", "result": "success"}
+
+
+def test_jsonl_uses_jsonl_path(tmp_path):
+    path = str(tmp_path / "message_logs.csv")
+    assert log_path(path, "csv") == path
+    assert log_path(path, "jsonl") == str(tmp_path / "message_logs.jsonl")
+
+    writer = BufferedLogWriter(path, FIELDS, fmt="jsonl", flush_rows=10)
+    writer.write(_row("a"))
+    writer.close()
+    assert writer.path == log_path(path, "jsonl")
+    assert [json.loads(line)["name"] for line in open(writer.path, encoding="utf-8")] == ["a"]
+
+
+def test_reads_rotated_files_in_both_formats(tmp_path):
+    path = str(tmp_path / "message_logs.csv")
+    writer = BufferedLogWriter(path, FIELDS, flush_rows=1, rotate_bytes=20)
+    for name in ("a", "b", "c"):
+        writer.write(_row(name))
+    writer.close()
+    jsonl = BufferedLogWriter(path, FIELDS, fmt="jsonl", flush_rows=1)
+    jsonl.write(_row("d"))
+    jsonl.close()
+    (tmp_path / "message_logs.jsonl").open("a", encoding="utf-8").write("{broken\n")
+
+    assert len(list(tmp_path.glob("message_logs.*.csv"))) >= 2
+    assert [row["name"] for row in iter_log_rows(path)] == ["a", "b", "c", "d"]
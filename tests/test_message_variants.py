@@ -0,0 +1,46 @@
+# tests/test_message_variants.py
+
+import json
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("dotenv")
+from aiagent.message_variants import MessageVariantPool
+
+TEMPLATE = "{name}さん\n\nはじめまして。IT業界の転職支援をしております。\nよろしくお願いいたします。"
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = MessageVariantPool(TEMPLATE, path=str(tmp_path / "variants.json"), size=2, model="gpt-4o-mini")
+    with open(pool.path, "w", encoding="utf-8") as f:
+        json.dump({pool.key: {"model": pool.model, "template": TEMPLATE, "variants": [
+            {"text": TEMPLATE, "uses": 0},
+            {"text": TEMPLATE.replace("はじめまして。", "突然のご連絡失礼します。"), "uses": 0},
+        ]}}, f, ensure_ascii=False)
+    return pool
+
+
+def _uses(path):
+    with open(path, encoding="utf-8") as f:
+        return [v["uses"] for v in next(iter(json.load(f).values()))["variants"]]
+
+
+def test_render_balances_variants_without_writing_each_time(pool):
+    texts = [pool.render(f"候補者{i}") for i in range(6)]
+
+    assert all(text.startswith(f"候補者{i}さん") for i, text in enumerate(texts))
+    assert sorted(v["uses"] for v in pool._variants) == [3, 3]
+    assert _uses(pool.path) == [0, 0]  # 送信ごとにはファイルを書き換えない
+
+    pool.flush()
+    assert _uses(pool.path) == [3, 3]
+
+
+def test_usage_counts_survive_restart(pool):
+    pool.render("候補者")
+    pool.flush()
+
+    reopened = MessageVariantPool(TEMPLATE, path=pool.path, size=2, model="gpt-4o-mini")
+    assert sorted(v["uses"] for v in reopened.ensure()) == [0, 1]
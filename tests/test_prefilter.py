@@ -0,0 +1,51 @@
+# tests/test_prefilter.py
+
+import pytest
+
+from aiagent.prefilter import check_exclusion, current_experiences, prefilter
+
+
+def _category(headline="", experiences="", education="", is_premium=False):
+    result = check_exclusion({"headline": headline, "experiences": experiences,
+                              "education": education, "is_premium": is_premium})
+    return result[0] if result else None
+
+
+@pytest.mark.parametrize("headline, category", [
+    ("代表取締役社長", "executive"),
+    ("社長室 エンジニア", None),
+    ("CTO at Example", "executive"),
+    ("Directory Engineer", None),
+    ("IT Recruiter", "hr"),
+    ("東京大学 学生", "student"),
+    ("大学院生 | 機械学習", "student"),
+    ("Student at Keio University", "student"),
+    ("Student Success Engineer", None),
+    ("大学生向けキャリア支援", None),
+    ("フューチャーアーキテクト株式会社 ITコンサルタント", "future"),
+    ("元フューチャーアーキテクト / フリーランス", None),
+    ("前株式会社フューチャー SE", None),
+    ("ex-Future Architect, Backend Engineer", None),
+    ("バックエンドエンジニア", None),
+])
+def test_headline_patterns(headline, category):
+    assert _category(headline) == category
+
+
+def test_premium_and_age():
+    assert _category(is_premium="True") == "premium"
+    assert _category(education="早稲田大学 (1995 - 1999)") == "age"
+    assert _category(education="早稲田大学 (2003 - 2007)") is None
+
+
+def test_only_current_experiences_are_checked():
+    experiences = "エンジニア @ A社 (2020年 - 現在)\n代表取締役 @ B社 (2015年 - 2019年)"
+    assert current_experiences(experiences) == ["エンジニア @ A社 (2020年 - 現在)"]
+    assert _category(experiences=experiences) is None
+    assert _category(experiences="代表取締役 @ B社") == "executive"
+
+
+def test_prefilter_result_is_zero_skip():
+    result = prefilter({"headline": "人材紹介 コンサルタント"})
+    assert result["total_score"] == 0 and result["decision"] == "skip" and result["prefiltered"]
+    assert prefilter({"headline": "SRE"}) is None
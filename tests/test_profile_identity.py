@@ -0,0 +1,50 @@
+# tests/test_profile_identity.py
+
+from aiagent.profile_identity import IdentityIndex, parse_profile_url, profile_forms, url_for
+
+MEMBER_ID = "ACoAABWBi7YBm8O9tTIJ3vmi_cW0vu3wfI0hhZU"
+
+
+def test_parse_vanity_and_member_id():
+    assert parse_profile_url("https://www.linkedin.com/in/Taro-Yamada/?trk=x") == ("taro-yamada", None)
+    assert parse_profile_url(f"https://www.linkedin.com/in/{MEMBER_ID}") == (None, MEMBER_ID)
+    assert parse_profile_url(
+        "https://www.linkedin.com/in/taro?miniProfileUrn=urn%3Ali%3Afs_miniProfile%3A" + MEMBER_ID
+    ) == ("taro", MEMBER_ID)
+    assert parse_profile_url("https://www.linkedin.com/in/%E5%B1%B1%E7%94%B0/") == ("山田", None)
+    assert parse_profile_url("https://example.com/company/x") == (None, None)
+    assert parse_profile_url(None) == (None, None)
+
+
+def test_forms_and_url():
+    assert profile_forms(f"https://www.linkedin.com/in/taro?profileUrn={MEMBER_ID}") == [f"id:{MEMBER_ID}", "in:taro"]
+    assert url_for("in:山田") == "https://www.linkedin.com/in/%E5%B1%B1%E7%94%B0/"
+
+
+def test_index_links_aliases_and_records_merges(tmp_path):
+    index = IdentityIndex(str(tmp_path / "aliases.sqlite3"))
+    merged = []
+    index.on_merge(lambda: merged.append(True))
+
+    assert index.resolve("https://www.linkedin.com/in/taro/") == "in:taro"
+    assert index.resolve(f"https://www.linkedin.com/in/{MEMBER_ID}") == f"id:{MEMBER_ID}"
+    assert not merged
+
+    # 同じURLにバニティ名とメンバーIDが含まれたら、メンバーID側にまとめる
+    linking = f"https://www.linkedin.com/in/taro?miniProfileUrn={MEMBER_ID}"
+    assert index.resolve(linking) == f"id:{MEMBER_ID}"
+    assert index.resolve("https://www.linkedin.com/in/TARO") == f"id:{MEMBER_ID}"
+    assert index.equivalents(f"id:{MEMBER_ID}") == [f"id:{MEMBER_ID}", "in:taro"]
+    assert merged == [True]
+    assert [(old, new) for _, old, new in index.merges()] == [("in:taro", f"id:{MEMBER_ID}")]
+
+    # 再起動後も同じ対応表を読み込む
+    reopened = IdentityIndex(str(tmp_path / "aliases.sqlite3"))
+    assert reopened.canonical_url("https://www.linkedin.com/in/taro") == url_for(f"id:{MEMBER_ID}")
+
+
+def test_resolve_without_register_does_not_store(tmp_path):
+    index = IdentityIndex(str(tmp_path / "aliases.sqlite3"))
+    assert index.resolve("https://www.linkedin.com/in/hanako", register=False) == "in:hanako"
+    assert index.equivalents("in:hanako") == ["in:hanako"]
+    assert index.resolve("not a profile") == ""
@@ -0,0 +1,55 @@
+# tests/test_score_cache.py
+
+import time
+
+from aiagent.score_cache import ScoreCache, make_key, normalize_text
+
+FIELDS = ["name", "headline"]
+
+
+def test_key_ignores_width_and_whitespace_differences():
+    assert normalize_text("ＡＷＳ　エンジニア \n\n  Python ") == "AWS エンジニア\nPython"
+    a = make_key("gpt-4o-mini", "v1", {"name": "山田", "headline": "ＡＷＳ  エンジニア"}, FIELDS)
+    b = make_key("gpt-4o-mini", "v1", {"name": "山田", "headline": "AWS エンジニア", "skills": "無関係"}, FIELDS)
+    assert a == b
+    assert a != make_key("gpt-4o", "v1", {"name": "山田", "headline": "AWS エンジニア"}, FIELDS)
+    assert a != make_key("gpt-4o-mini", "v2", {"name": "山田", "headline": "AWS エンジニア"}, FIELDS)
+
+
+def test_hit_miss_and_ttl(tmp_path):
+    cache = ScoreCache(path=str(tmp_path / "cache.sqlite3"), ttl_days=1, enabled=True)
+    cache.put("a", {"total_score": 70})
+    assert cache.get("a") == {"total_score": 70}
+    assert cache.get("b") is None
+
+    cache._conn.execute("UPDATE score_cache SET created_at = ?", (time.time() - 2 * 24 * 3600,))
+    assert cache.get("a") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+
+def test_get_first_counts_one_lookup(tmp_path):
+    cache = ScoreCache(path=str(tmp_path / "cache.sqlite3"), enabled=True)
+    cache.put("b", {"total_score": 70})
+    assert cache.get_first(["a", "b"]) == {"total_score": 70}
+    assert cache.get_first(["a", "c"]) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_lru_eviction_and_persistence(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ScoreCache(path=path, max_entries=2, enabled=True)
+    cache.put("a", {"n": 1})
+    cache.put("b", {"n": 2})
+    cache._conn.execute("UPDATE score_cache SET last_access = last_access - 10 WHERE key = 'b'")
+    cache.put("c", {"n": 3})
+    assert cache.evictions == 1 and cache.get("b") is None
+    cache.close()
+
+    reopened = ScoreCache(path=path, max_entries=2, enabled=True)
+    assert reopened.get("a") == {"n": 1} and reopened.get("c") == {"n": 3}
+
+
+def test_disabled_cache_never_hits(tmp_path):
+    cache = ScoreCache(path=str(tmp_path / "cache.sqlite3"), enabled=False)
+    cache.put("a", {"n": 1})
+    assert cache.get("a") is None
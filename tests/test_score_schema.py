@@ -0,0 +1,51 @@
+# tests/test_score_schema.py
+
+from aiagent.score_schema import SCORE_SCHEMA, response_format, validate_score, validate_batch_item, finalize_score
+
+
+def _score(**overrides):
+    item = {
+        "estimated_age": 30, "age_reasoning": "2017年卒", "age_score": 25, "it_experience_score": 30,
+        "position_score": 10, "excluded": False, "total_score": 65, "decision": "send", "reason": "",
+    }
+    item.update(overrides)
+    return item
+
+
+def test_valid_score_has_no_errors():
+    assert validate_score(_score()) == []
+    assert validate_score(_score(estimated_age=None)) == []
+
+
+def test_type_range_enum_and_required_errors():
+    assert validate_score(_score(age_score="25")) == ["$.age_score: integerではありません"]
+    assert validate_score(_score(age_score=True)) == ["$.age_score: integerではありません"]
+    assert validate_score(_score(it_experience_score=41)) == ["$.it_experience_score: 0〜40 の範囲外です（41）"]
+    assert validate_score(_score(decision="maybe")) == ["$.decision: ['send', 'skip'] のいずれでもありません"]
+
+    item = _score()
+    del item["reason"]
+    assert validate_score(item) == ["$.reason: 必須項目がありません"]
+    assert validate_score(_score(extra=1)) == ["$.extra: 未定義の項目です"]
+
+
+def test_batch_item_requires_profile_url():
+    assert validate_batch_item(_score()) == ["$.profile_url: 必須項目がありません"]
+    assert validate_batch_item(_score(profile_url="https://www.linkedin.com/in/a/")) == []
+
+
+def test_response_format_strips_ranges():
+    schema = response_format("score", SCORE_SCHEMA)["json_schema"]["schema"]
+    assert "minimum" not in schema["properties"]["age_score"]
+    assert response_format("score", SCORE_SCHEMA, mode="json_object") == {"type": "json_object"}
+
+
+def test_finalize_score_recomputes_total_and_decision():
+    result = finalize_score(_score(total_score=0, decision="skip"), min_score=60)
+    assert (result["total_score"], result["decision"]) == (65, "send")
+
+    result = finalize_score(_score(position_score=-10), min_score=60)
+    assert (result["total_score"], result["decision"]) == (45, "skip")
+
+    result = finalize_score(_score(excluded=True), min_score=60)
+    assert (result["total_score"], result["decision"]) == (0, "skip")
@@ -0,0 +1,28 @@
+# tests/test_snapshots.py
+
+import pytest
+
+pytest.importorskip("pyarrow")
+from aiagent import snapshots
+from aiagent.snapshots import SnapshotWriter, read_snapshot
+
+
+def test_import_logs_reads_connection_logs(tmp_path, monkeypatch):
+    (tmp_path / "connection_logs.csv").write_text(
+        "date,name,profile_url,result,error\n"
+        "2025-01-02 00:00:00,Taro,https://www.linkedin.com/in/taro/,success,\n",
+        encoding="utf-8"
+    )
+    (tmp_path / "logs.csv").write_text(
+        "date,name,url,result,error,details\n"
+        "2025-01-01 00:00:00,Jiro,https://www.linkedin.com/in/jiro/,success,,\n",
+        encoding="utf-8"
+    )
+    root = str(tmp_path / "snapshots")
+    monkeypatch.setattr(snapshots, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(snapshots, "snapshot_writer", SnapshotWriter(root=root, mode="on", flush_at_exit=False))
+
+    snapshots.import_logs()
+
+    df = read_snapshot("connection_requests", columns=["name", "profile_url", "result"], root=root)
+    assert sorted(df["profile_url"]) == ["https://www.linkedin.com/in/jiro/", "https://www.linkedin.com/in/taro/"]
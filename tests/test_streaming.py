@@ -0,0 +1,22 @@
+# tests/test_streaming.py
+
+from aiagent.streaming import TopK
+
+
+def test_keeps_top_k_with_ties_in_insertion_order():
+    top = TopK(3)
+    for score, name in [(50, "a"), (70, "b"), (70, "c"), (60, "d"), (70, "e"), (10, "f")]:
+        top.push(score, name)
+    assert top.sorted() == ["b", "c", "e"]
+    assert top.count == 6
+
+
+def test_fewer_than_k_and_zero_k():
+    top = TopK(5)
+    top.push(1, "a")
+    top.push(2, "b")
+    assert top.sorted() == ["b", "a"]
+
+    empty = TopK(0)
+    empty.push(1, "a")
+    assert empty.sorted() == [] and empty.count == 1
@@ -0,0 +1,107 @@
+# tests/test_suppression.py
+
+import time
+
+import pytest
+
+from aiagent import suppression
+from aiagent.log_writer import BufferedLogWriter
+from aiagent.suppression import (
+    BloomFilter, SuppressionIndex, CONNECTION_REQUESTED, MESSAGED, SCORED_SKIP, OPTED_OUT, PROFILE_REASONS
+)
+
+MEMBER_ID = "ACoAABWBi7YBm8O9tTIJ3vmi_cW0vu3wfI0hhZU"
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, fp_rate=0.01)
+    keys = [f"in:user{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"in:other{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_disk_set_confirms_bloom_hits(tmp_path, identity):
+    index = SuppressionIndex(str(tmp_path / "suppression.sqlite3"), enabled=True, capacity=10)
+    index.add("https://www.linkedin.com/in/taro/", MESSAGED)
+
+    assert index.reason("https://www.linkedin.com/in/TARO?trk=x") == MESSAGED
+    assert index.reason("https://www.linkedin.com/in/hanako") is None
+    assert index.disk_lookups == 1
+
+    # Bloomフィルタに残っていてもディスクの集合で取り消しを確認する
+    index.discard("https://www.linkedin.com/in/taro/", MESSAGED)
+    assert index.reason("https://www.linkedin.com/in/taro/") is None
+    assert index.disk_lookups == 2
+
+
+def test_grows_past_capacity_and_reloads(tmp_path, identity):
+    path = str(tmp_path / "suppression.sqlite3")
+    index = SuppressionIndex(path, enabled=True, capacity=2)
+    urls = [f"https://www.linkedin.com/in/user{i}" for i in range(10)]
+    for url in urls:
+        index.add(url, OPTED_OUT)
+    assert index._bloom.capacity >= 10
+    index.close()
+
+    reopened = SuppressionIndex(path, enabled=True, capacity=2)
+    assert all(reopened.reason(url) == OPTED_OUT for url in urls)
+    assert reopened.counts() == {OPTED_OUT: 10}
+
+
+def test_scored_skip_expires_and_follows_merges(tmp_path, identity):
+    index = SuppressionIndex(str(tmp_path / "suppression.sqlite3"), enabled=True, skip_ttl_days=1)
+    index.record_score("https://www.linkedin.com/in/taro", "skip")
+    assert index.reason("https://www.linkedin.com/in/taro", PROFILE_REASONS) == SCORED_SKIP
+    assert index.reason("https://www.linkedin.com/in/taro", (MESSAGED,)) is None
+
+    # 別名がまとめられた後もまとめる前のキーの理由を確認する
+    identity.resolve(f"https://www.linkedin.com/in/taro?miniProfileUrn={MEMBER_ID}")
+    assert index.reason(f"https://www.linkedin.com/in/{MEMBER_ID}") == SCORED_SKIP
+
+    index._conn.execute("UPDATE suppression SET added_at = ?", (time.time() - 2 * 24 * 3600,))
+    assert index.reason("https://www.linkedin.com/in/taro") is None
+
+    index.record_score("https://www.linkedin.com/in/taro", "send")
+    assert index.counts() == {}
+
+
+def test_disabled_index_never_suppresses(tmp_path, identity):
+    index = SuppressionIndex(str(tmp_path / "suppression.sqlite3"), enabled=False)
+    index.add("https://www.linkedin.com/in/taro", MESSAGED)
+    assert index.reason("https://www.linkedin.com/in/taro") is None
+    assert suppression.profile_key("https://www.linkedin.com/in/taro") == "in:taro"
+
+
+# ==============================
+# 既存ログからの取り込み
+# ==============================
+@pytest.fixture
+def old_connection_log(tmp_path):
+    """profile_url 列を追加する前の connection_logs.csv に、新しい列で1行追記したログ"""
+    path = tmp_path / "connection_logs.csv"
+    path.write_text("date,name,result,error\n2025-01-01 00:00:00,Jiro,success,\n", encoding="utf-8")
+    log = BufferedLogWriter(str(path), ["date", "name", "profile_url", "result", "error"], fmt="csv")
+    log.write({"date": "2025-01-02 00:00:00", "name": "Taro", "profile_url": "https://www.linkedin.com/in/taro", "result": "success"})
+    log.write({"date": "2025-01-02 00:00:01", "name": "Hanako", "profile_url": "https://www.linkedin.com/in/hanako", "result": "error"})
+    log.close()
+    return path
+
+
+def test_connection_log_header_change_rotates_old_file(old_connection_log, tmp_path):
+    assert old_connection_log.read_text(encoding="utf-8").splitlines()[0] == "date,name,profile_url,result,error"
+    assert len(list(tmp_path.glob("connection_logs.*.csv"))) == 1
+
+
+def test_import_logs_reads_connection_logs(old_connection_log, tmp_path, identity, monkeypatch):
+    index = SuppressionIndex(str(tmp_path / "suppression.sqlite3"), enabled=True)
+    monkeypatch.setattr(suppression, "suppression_index", index)
+    monkeypatch.setattr(suppression, "DATA_DIR", str(tmp_path))
+
+    suppression.import_logs()
+
+    assert index.reason("https://www.linkedin.com/in/taro/") == CONNECTION_REQUESTED
+    assert index.reason("https://www.linkedin.com/in/hanako/") is None
+    assert index.counts() == {CONNECTION_REQUESTED: 1}